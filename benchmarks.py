@@ -0,0 +1,691 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import contextlib
+import csv
+import difflib
+import glob
+import hashlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from . import utils
+from .decoding import iter_event_records
+from .exporters import export_format_of, write_event_logs_from_log_dic
+from .mock_node import MockEthereumNode, load_blocks_from_activity_transactions
+from .selector_registry import create_matcher
+from .xes_writer import write_xes_log_from_log_dic
+
+
+logger = logging.getLogger(__name__)
+
+
+def benchmark_concurrent_block_fetching(
+    activity_transactions,
+    max_in_flight_values=(1, 4, 16, 32),
+    latency=0.05):
+    '''
+        benchmark_concurrent_block_fetching serves the blocks embedded in activity_transactions from a
+        MockEthereumNode with the given latency and measures how long
+        get_activity_transactions_from_block_numbers takes for every value of max_in_flight.
+
+        Arguments:
+            activity_transactions (list): A list of activity transactions, e.g. loaded with
+                load_activity_transactions_from_pickle.
+            max_in_flight_values (tuple): The values of max_in_flight that are measured.
+            latency (float): The number of seconds the mock node delays every request.
+
+        Returns:
+            A list of dictionaries with the keys max_in_flight, blocks, seconds, and blocks_per_second.
+    '''
+    blocks = load_blocks_from_activity_transactions(activity_transactions)
+    block_numbers = sorted(blocks)
+    activities_dictionary = {
+        activity_transaction["transaction"]["input"][:10]: {}
+        for activity_transaction in activity_transactions}
+
+    results = []
+    with MockEthereumNode(blocks, latency=latency) as node:
+        http_provider = utils.connect_to_http_provider(node.url)
+
+        for max_in_flight in max_in_flight_values:
+            start = time.perf_counter()
+            utils.get_activity_transactions_from_block_numbers(
+                activities_dictionary=activities_dictionary,
+                block_numbers=block_numbers,
+                http_provider=http_provider,
+                max_in_flight=max_in_flight)
+            seconds = time.perf_counter() - start
+
+            results.append({
+                'max_in_flight': max_in_flight,
+                'blocks': len(block_numbers),
+                'seconds': seconds,
+                'blocks_per_second': len(block_numbers) / seconds
+            })
+
+    return results
+
+
+def benchmark_batched_block_fetching(
+    activity_transactions,
+    batch_sizes=(None, 10, 50, 100),
+    latency=0.05):
+    '''
+        benchmark_batched_block_fetching measures get_activity_transactions_from_block_numbers for every
+        batch size against a MockEthereumNode with the given latency (see
+        benchmark_concurrent_block_fetching). None measures the path without JSON-RPC batches.
+
+        Returns:
+            A list of dictionaries with the keys batch_size, blocks, requests, seconds, and blocks_per_second.
+    '''
+    blocks = load_blocks_from_activity_transactions(activity_transactions)
+    block_numbers = sorted(blocks)
+    activities_dictionary = {
+        activity_transaction["transaction"]["input"][:10]: {}
+        for activity_transaction in activity_transactions}
+
+    results = []
+    with MockEthereumNode(blocks, latency=latency) as node:
+        http_provider = utils.connect_to_http_provider(node.url)
+
+        for batch_size in batch_sizes:
+            node.reset_counters()
+            start = time.perf_counter()
+            utils.get_activity_transactions_from_block_numbers(
+                activities_dictionary=activities_dictionary,
+                block_numbers=block_numbers,
+                http_provider=http_provider,
+                batch_size=batch_size)
+            seconds = time.perf_counter() - start
+
+            results.append({
+                'batch_size': batch_size,
+                'blocks': len(block_numbers),
+                'requests': node.requests,
+                'seconds': seconds,
+                'blocks_per_second': len(block_numbers) / seconds
+            })
+
+    return results
+
+
+def benchmark_transaction_hash_extraction(activity_transactions, batch_size=100):
+    '''
+        benchmark_transaction_hash_extraction compares the bytes that are transferred from a MockEthereumNode
+        when the activity transactions are found by searching full blocks
+        (get_activity_transactions_from_block_numbers) with the bytes that are transferred when only the
+        transactions and their block headers are retrieved (get_activity_transactions_from_transaction_hashes).
+
+        Returns:
+            A list of dictionaries with the keys path, requests, bytes_sent, bytes_received, and seconds.
+    '''
+    blocks = load_blocks_from_activity_transactions(activity_transactions)
+    activities_dictionary = {
+        activity_transaction["transaction"]["input"][:10]: {}
+        for activity_transaction in activity_transactions}
+    block_numbers = [
+        activity_transaction["transaction"]["blockNumber"] for activity_transaction in activity_transactions]
+    transaction_hashes = [
+        '0x' + bytes(activity_transaction["transaction"]["hash"]).hex() for activity_transaction in activity_transactions]
+
+    results = []
+    with MockEthereumNode(blocks) as node:
+        http_provider = utils.connect_to_http_provider(node.url)
+
+        for path, extract in (
+            ('block scan', lambda: utils.get_activity_transactions_from_block_numbers(
+                activities_dictionary, block_numbers, http_provider, batch_size=batch_size)),
+            ('transaction hashes', lambda: utils.get_activity_transactions_from_transaction_hashes(
+                activities_dictionary, transaction_hashes, http_provider, batch_size=batch_size))):
+            node.reset_counters()
+            start = time.perf_counter()
+            extract()
+            seconds = time.perf_counter() - start
+
+            results.append({
+                'path': path,
+                'requests': node.requests,
+                'bytes_sent': node.bytes_sent,
+                'bytes_received': node.bytes_received,
+                'seconds': seconds
+            })
+
+    return results
+
+
+def create_scaled_log_dic(activity_transactions, copies=1):
+    '''
+        create_scaled_log_dic creates a log dictionary from activity_transactions with copies copies of every
+        trace, e.g. to measure the XES writers at several log sizes. The activities dictionary maps every
+        function selector to a generic activity.
+    '''
+    activities_dictionary = {
+        activity_transaction["transaction"]["input"][:10]: {
+            'activity_name': activity_transaction["transaction"]["input"][:10], 'resource': 'Resource'}
+        for activity_transaction in activity_transactions}
+    log_dic = utils.sort_log_dic_by_time(utils.create_log_dictionary_from_activity_transactions(
+        activity_transactions, activities_dictionary))
+
+    # The copies get their own activity instance ids, because an event id must be unique in an OCEL log.
+    return {
+        f'{trace_id}-{copy}' if copy else trace_id:
+            [dict(activity, instance_id=f'{activity["instance_id"]}-{copy}') for activity in activities] if copy else activities
+        for copy in range(copies) for trace_id, activities in log_dic.items()}
+
+
+def check_xes_writer_conformance(log_dic):
+    '''
+        check_xes_writer_conformance writes log_dic once with opyenxes (create_xes_log_from_log_dic and
+        write_xes_log_to_disc) and once with write_xes_log_from_log_dic, and diffs the two files. The order
+        of the extensions is ignored, because opyenxes keeps them in a set.
+
+        Returns:
+            A list with the lines of the unified diff. The list is empty if both files are identical.
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        path = directory + os.sep
+        utils.write_xes_log_to_disc(utils.create_xes_log_from_log_dic(log_dic), path=path, file_name='opyenxes')
+        write_xes_log_from_log_dic(log_dic, path=path, file_name='xes_writer')
+
+        files = []
+        for file_name in ('opyenxes', 'xes_writer'):
+            with open(f'{path}{file_name}.xes') as file:
+                lines = file.readlines()
+            extensions = sorted(line for line in lines if line.startswith('\t<extension '))
+            files.append(extensions + [line for line in lines if not line.startswith('\t<extension ')])
+
+    return list(difflib.unified_diff(files[0], files[1], 'opyenxes', 'xes_writer'))
+
+
+def benchmark_xes_writers(activity_transactions, copies_values=(1, 10, 100)):
+    '''
+        benchmark_xes_writers measures how long it takes to write the XES log with opyenxes and with
+        write_xes_log_from_log_dic (plain and gzip compressed) for logs of several sizes
+        (see create_scaled_log_dic).
+
+        Returns:
+            A list of dictionaries with the keys events, opyenxes_seconds, xes_writer_seconds,
+            xes_writer_gzip_seconds, and speedup.
+    '''
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = directory + os.sep
+        for copies in copies_values:
+            log_dic = create_scaled_log_dic(activity_transactions, copies)
+
+            start = time.perf_counter()
+            utils.write_xes_log_to_disc(utils.create_xes_log_from_log_dic(log_dic), path=path, file_name='opyenxes')
+            opyenxes_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            write_xes_log_from_log_dic(log_dic, path=path, file_name='xes_writer')
+            xes_writer_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            write_xes_log_from_log_dic(log_dic, path=path, file_name='xes_writer', compress=True)
+            xes_writer_gzip_seconds = time.perf_counter() - start
+
+            results.append({
+                'events': sum(len(activities) for activities in log_dic.values()),
+                'opyenxes_seconds': opyenxes_seconds,
+                'xes_writer_seconds': xes_writer_seconds,
+                'xes_writer_gzip_seconds': xes_writer_gzip_seconds,
+                'speedup': opyenxes_seconds / xes_writer_seconds
+            })
+
+    return results
+
+
+def benchmark_export_formats(activity_transactions, copies=100, extensions=('.xes', '.csv', '.parquet', '.jsonocel', '.sqlite')):
+    '''
+        benchmark_export_formats measures how long it takes to write a log (see create_scaled_log_dic) in every
+        export format of exporters.EventLogExporter, and how large the files are. Formats whose optional
+        dependency is missing, i.e. Parquet without pyarrow, are skipped.
+
+        Returns:
+            A list of dictionaries with the keys format, events, seconds, and bytes.
+    '''
+    log_dic = create_scaled_log_dic(activity_transactions, copies)
+    events = sum(len(activities) for activities in log_dic.values())
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in extensions:
+            file_path = os.path.join(directory, f'log{extension}')
+            start = time.perf_counter()
+            try:
+                write_event_logs_from_log_dic(log_dic, [file_path])
+            except ImportError as exception:
+                logger.warning(f'Skipping {extension}: {exception}')
+                continue
+            results.append({
+                'format': export_format_of(file_path),
+                'events': events,
+                'seconds': time.perf_counter() - start,
+                'bytes': os.path.getsize(file_path)
+            })
+
+    return results
+
+
+def benchmark_parallel_decoding(activity_transactions, processes_values=(0, 1, 2, 4), copies=10, filler_transactions=100):
+    '''
+        benchmark_parallel_decoding measures how fast a warm BlockCache is replayed into a log dictionary: once
+        with iter_blocks and get_activity_transactions_from_block, which decode every transaction of every block
+        in the main process, and once with iter_event_records for several numbers of worker processes. 0
+        processes decodes in the main process. The blocks are the blocks of activity_transactions, copies times
+        and with filler_transactions transactions without activity per block (see create_synthetic_blocks).
+
+        Returns:
+            A list of dictionaries with the keys path, processes, blocks, event_records, seconds,
+            blocks_per_second, and speedup (compared to iter_blocks).
+    '''
+    from .cache import BlockCache
+    from .formatters import format_block
+
+    activities_dictionary = {
+        activity_transaction["transaction"]["input"][:10]: {'activity_name': 'Activity', 'resource': 'Resource'}
+        for activity_transaction in activity_transactions}
+    blocks = create_synthetic_blocks(activity_transactions, copies, filler_transactions)
+    block_numbers = sorted(blocks)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        block_cache = BlockCache(os.path.join(directory, 'block_cache.sqlite'), max_bytes=2 ** 40, confirmation_depth=0)
+        for block in blocks.values():
+            block_cache.put(format_block(block), max(block_numbers))
+
+        start = time.perf_counter()
+        match = create_matcher(activities_dictionary)
+        event_records = sum(
+            len(utils.get_activity_transactions_from_block(activities_dictionary, block, match))
+            for _, block in utils.iter_blocks(block_numbers, None, block_cache=block_cache))
+        baseline_seconds = time.perf_counter() - start
+        results.append({
+            'path': 'iter_blocks',
+            'processes': None,
+            'blocks': len(block_numbers),
+            'event_records': event_records,
+            'seconds': baseline_seconds,
+            'blocks_per_second': len(block_numbers) / baseline_seconds,
+            'speedup': 1.0
+        })
+
+        for processes in processes_values:
+            start = time.perf_counter()
+            event_records = sum(1 for _ in iter_event_records(
+                block_cache.iter_payloads(block_numbers), activities_dictionary, processes=processes, compressed=True))
+            seconds = time.perf_counter() - start
+
+            results.append({
+                'path': 'iter_event_records',
+                'processes': processes,
+                'blocks': len(block_numbers),
+                'event_records': event_records,
+                'seconds': seconds,
+                'blocks_per_second': len(block_numbers) / seconds,
+                'speedup': baseline_seconds / seconds
+            })
+        block_cache.close()
+
+    return results
+
+
+# The pickle file and the Etherscan exports are stored next to the modules of the package.
+PACKAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+ACTIVITY_TRANSACTIONS_PATH = os.path.join(PACKAGE_DIRECTORY, 'activity_transactions.pickle')
+ETHERSCAN_CSV_PATTERN = os.path.join(PACKAGE_DIRECTORY, 'EX*.CSV')
+
+STAGES = ['fetch', 'create_log_dictionary', 'sort_log_dic_by_time', 'create_xes_log', 'write_xes_log', 'xes_writer']
+
+
+def load_etherscan_transactions(csv_paths):
+    '''
+        load_etherscan_transactions loads the transactions of Etherscan CSV exports (e.g. the EXPORT*.CSV files
+        of this repository) as JSON transactions. The exports do not contain the input data, so the transactions
+        are not associated to an activity, i.e. they can be used as filler transactions (see create_synthetic_blocks).
+    '''
+    transactions = []
+    for csv_path in csv_paths:
+        with open(csv_path, newline='') as file:
+            for row in csv.DictReader(file):
+                transactions.append({
+                    'hash': row['Txhash'],
+                    'from': row['From'],
+                    'to': row['To'] or None,
+                    'input': '0x',
+                    'gas': hex(21000),
+                    'gasPrice': hex(int(float(row['TxnFee(ETH)'] or 0) * 10 ** 18) // 21000),
+                    'value': hex(int(float(row['Value_IN(ETH)'] or 0) * 10 ** 18)),
+                    'nonce': '0x0'})
+    return transactions
+
+
+def create_synthetic_blocks(activity_transactions, copies=1, filler_transactions=0, csv_paths=()):
+    '''
+        create_synthetic_blocks scales the blocks embedded in activity_transactions up for benchmarks. Every copy
+        of the blocks follows the previous one on the chain, with new block numbers, hashes, and timestamps, and
+        new contract addresses, i.e. every copy adds new traces. The first copy equals the original blocks.
+
+        Arguments:
+            activity_transactions (list): A list of activity transactions, e.g. loaded with
+                load_activity_transactions_from_pickle.
+            copies (int): The number of copies of the blocks.
+            filler_transactions (int): The number of transactions without activity that are added to every block,
+                e.g. to benchmark blocks that are as full as on the main network today.
+            csv_paths (list): Etherscan CSV exports the filler transactions are taken from (see
+                load_etherscan_transactions). By default, the activity transactions without input data are used.
+
+        Returns:
+            A dictionary where the key is the block number and the value is the block as JSON.
+    '''
+    blocks = load_blocks_from_activity_transactions(activity_transactions)
+    span = max(blocks) - min(blocks) + 1
+    duration = int(blocks[max(blocks)]['timestamp'], 16) - int(blocks[min(blocks)]['timestamp'], 16) + 15
+
+    fillers = load_etherscan_transactions(csv_paths) or [
+        dict(transaction, input='0x') for block in blocks.values() for transaction in block['transactions']]
+
+    synthetic_blocks = {}
+    filler_index = 0
+    for copy in range(copies):
+        for block_number, block in blocks.items():
+            block_hash = _synthetic_hash(block['hash'], copy)
+            synthetic_block = dict(
+                block,
+                number=hex(block_number + copy * span),
+                hash=block_hash,
+                timestamp=hex(int(block['timestamp'], 16) + copy * duration))
+
+            transactions = []
+            for transaction in block['transactions']:
+                transactions.append(dict(
+                    transaction,
+                    hash=_synthetic_hash(transaction['hash'], copy),
+                    to=_synthetic_address(transaction['to'], copy)))
+            for _ in range(filler_transactions):
+                filler = fillers[filler_index % len(fillers)]
+                transactions.append(dict(filler, hash=_synthetic_hash(filler['hash'], filler_index + copies)))
+                filler_index += 1
+
+            for transaction_index, transaction in enumerate(transactions):
+                transaction.update(
+                    blockHash=block_hash, blockNumber=synthetic_block['number'], transactionIndex=hex(transaction_index))
+            synthetic_block['transactions'] = transactions
+            synthetic_blocks[block_number + copy * span] = synthetic_block
+
+    return synthetic_blocks
+
+
+def _synthetic_hash(value, copy):
+    if copy == 0:
+        return value
+    return '0x' + hashlib.sha256(f'{value}:{copy}'.encode()).hexdigest()
+
+
+def _synthetic_address(address, copy):
+    if copy == 0 or address is None:
+        return address
+    return '0x' + hashlib.sha256(f'{address}:{copy}'.encode()).hexdigest()[:40]
+
+
+def benchmark_cold_start(repeats=5):
+    '''
+        benchmark_cold_start measures how long a new Python process takes to import utils and to show the help of
+        the command line interface, i.e. the start-up cost of short batch jobs. The median of repeats runs is reported.
+
+        Returns:
+            A list of dictionaries with the keys command and seconds.
+    '''
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_parent, os.environ.get('PYTHONPATH')])))
+    commands = [
+        ['-c', f'import {__package__}.utils'],
+        ['-m', __package__, '--help'],
+    ]
+
+    results = []
+    for command in commands:
+        runs = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + command, env=environment, stdout=subprocess.DEVNULL, check=True)
+            runs.append(time.perf_counter() - start)
+        results.append({'command': 'python ' + ' '.join(command), 'seconds': sorted(runs)[len(runs) // 2]})
+    return results
+
+
+def run_benchmark_suite(
+    activity_transactions,
+    copies_values=(1, 10, 50),
+    filler_transactions=0,
+    csv_paths=(),
+    latency=0.0,
+    batch_size=100,
+    max_in_flight=1,
+    trace_memory=False):
+    '''
+        run_benchmark_suite replays synthetic blocks (see create_synthetic_blocks) of several sizes through a
+        MockEthereumNode and measures every stage of the extraction: fetch
+        (get_activity_transactions_from_block_numbers), create_log_dictionary_from_activity_transactions,
+        sort_log_dic_by_time, create_xes_log_from_log_dic, write_xes_log_to_disc, and xes_writer
+        (write_xes_log_from_log_dic).
+
+        Arguments:
+            activity_transactions (list): A list of activity transactions.
+            copies_values (tuple): The numbers of copies of the blocks, i.e. the log sizes.
+            filler_transactions, csv_paths: See create_synthetic_blocks.
+            latency (float): The number of seconds the mock node delays every request.
+            batch_size (int): The batch size of the fetch stage.
+            max_in_flight (int): The number of concurrent requests of the fetch stage.
+            trace_memory (bool): Whether every stage runs under tracemalloc, which records the peak of the memory
+                that the stage allocated on top of the memory in use when it started. Tracing slows the stages
+                down, i.e. only compare the seconds of results with the same trace_memory.
+
+        Returns:
+            A dictionary that can be serialized as JSON, with the environment, the parameters, and the results.
+            Every result has the keys copies, blocks, events, and stages. Every stage has the keys seconds,
+            blocks_per_second, and events_per_second, and peak_traced_bytes if trace_memory is set. The fetch stage
+            also has the keys requests, bytes_sent, and bytes_received.
+    '''
+    activities_dictionary = {
+        activity_transaction["transaction"]["input"][:10]: {
+            'activity_name': activity_transaction["transaction"]["input"][:10], 'resource': 'Resource'}
+        for activity_transaction in activity_transactions}
+
+    results = []
+    for copies in sorted(copies_values):
+        blocks = create_synthetic_blocks(activity_transactions, copies, filler_transactions, csv_paths)
+        block_numbers = sorted(blocks)
+        stages = {}
+
+        with MockEthereumNode(blocks, latency=latency) as node, tempfile.TemporaryDirectory() as directory:
+            path = directory + os.sep
+            http_provider = utils.connect_to_http_provider(node.url)
+            node.reset_counters()
+
+            measure = _StageTimer(stages, len(block_numbers), trace_memory)
+            with measure('fetch'):
+                synthetic_activity_transactions = utils.get_activity_transactions_from_block_numbers(
+                    activities_dictionary, block_numbers, http_provider,
+                    max_in_flight=max_in_flight, batch_size=batch_size)
+            stages['fetch'].update(
+                requests=node.requests, bytes_sent=node.bytes_sent, bytes_received=node.bytes_received)
+
+            measure.events = len(synthetic_activity_transactions)
+            with measure('create_log_dictionary'):
+                log_dic = utils.create_log_dictionary_from_activity_transactions(
+                    synthetic_activity_transactions, activities_dictionary)
+            with measure('sort_log_dic_by_time'):
+                log_dic = utils.sort_log_dic_by_time(log_dic)
+            with measure('create_xes_log'):
+                log_xes = utils.create_xes_log_from_log_dic(log_dic)
+            # opyenxes prints its log messages to stdout, which is reserved for the JSON result.
+            with measure('write_xes_log'), contextlib.redirect_stdout(sys.stderr):
+                utils.write_xes_log_to_disc(log_xes, path=path, file_name='opyenxes')
+            with measure('xes_writer'):
+                write_xes_log_from_log_dic(log_dic, path=path, file_name='xes_writer')
+            stages['write_xes_log']['bytes_written'] = os.path.getsize(f'{path}opyenxes.xes')
+            stages['xes_writer']['bytes_written'] = os.path.getsize(f'{path}xes_writer.xes')
+
+        results.append({
+            'copies': copies,
+            'blocks': len(block_numbers),
+            'events': measure.events,
+            'stages': stages
+        })
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'time': datetime.now().isoformat(timespec='seconds')
+        },
+        'parameters': {
+            'copies_values': list(copies_values),
+            'filler_transactions': filler_transactions,
+            'csv_paths': list(csv_paths),
+            'latency': latency,
+            'batch_size': batch_size,
+            'max_in_flight': max_in_flight,
+            'trace_memory': trace_memory
+        },
+        'results': results
+    }
+
+
+class _StageTimer(object):
+
+    def __init__(self, stages, blocks, trace_memory=False):
+        self.stages = stages
+        self.blocks = blocks
+        self.trace_memory = trace_memory
+        self.events = 0
+        self._stage = None
+
+    def __call__(self, stage):
+        self._stage = stage
+        return self
+
+    def __enter__(self):
+        if self.trace_memory:
+            # tracemalloc only sees the allocations after start, i.e. the peak is the one of this stage.
+            tracemalloc.start()
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self._start
+        self.stages[self._stage] = {
+            'seconds': seconds,
+            'blocks_per_second': self.blocks / seconds if seconds else None,
+            'events_per_second': self.events / seconds if seconds and self.events else None
+        }
+        if self.trace_memory:
+            self.stages[self._stage]['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+def compare_benchmark_results(baseline, current, tolerance=0.2):
+    '''
+        compare_benchmark_results compares two results of run_benchmark_suite, e.g. the result of the main
+        branch with the result of a change, and reports the stages that became slower by more than tolerance.
+
+        Returns:
+            A list of dictionaries with the keys copies, stage, baseline_seconds, current_seconds, and slowdown.
+    '''
+    baseline_results = {result['copies']: result for result in baseline['results']}
+
+    regressions = []
+    for result in current['results']:
+        baseline_result = baseline_results.get(result['copies'])
+        if baseline_result is None:
+            continue
+        for stage in STAGES:
+            if stage not in result['stages'] or stage not in baseline_result['stages']:
+                continue
+            baseline_seconds = baseline_result['stages'][stage]['seconds']
+            current_seconds = result['stages'][stage]['seconds']
+            if baseline_seconds and current_seconds > baseline_seconds * (1 + tolerance):
+                regressions.append({
+                    'copies': result['copies'],
+                    'stage': stage,
+                    'baseline_seconds': baseline_seconds,
+                    'current_seconds': current_seconds,
+                    'slowdown': current_seconds / baseline_seconds
+                })
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of the extraction from activity_transactions.pickle.')
+    parser.add_argument('--suite', action='store_true', help='run the per-stage benchmark suite and print JSON')
+    parser.add_argument('--copies', type=int, nargs='+', default=[1, 10, 50], help='the log sizes of the suite')
+    parser.add_argument('--filler-transactions', type=int, default=0, help='transactions without activity per block')
+    parser.add_argument('--csv', action='store_true', help='take the filler transactions from the EXPORT*.CSV files')
+    parser.add_argument('--latency', type=float, default=0.0, help='the latency of the mock node in seconds')
+    parser.add_argument('--trace-memory', action='store_true', help='record the peak memory of every stage')
+    parser.add_argument('--pickle', default=ACTIVITY_TRANSACTIONS_PATH, help='the pickle file of activity transactions')
+    parser.add_argument('--output', help='write the JSON result of the suite to this file')
+    parser.add_argument('--baseline', help='a previous JSON result of the suite to compare with')
+    arguments = parser.parse_args()
+
+    activity_transactions = utils.load_activity_transactions_from_pickle(arguments.pickle)
+
+    if arguments.suite:
+        suite_result = run_benchmark_suite(
+            activity_transactions, arguments.copies, arguments.filler_transactions,
+            sorted(glob.glob(ETHERSCAN_CSV_PATTERN)) if arguments.csv else (), arguments.latency,
+            trace_memory=arguments.trace_memory)
+        if arguments.baseline:
+            with open(arguments.baseline) as file:
+                suite_result['regressions'] = compare_benchmark_results(json.load(file), suite_result)
+
+        if arguments.output:
+            with open(arguments.output, 'w') as file:
+                json.dump(suite_result, file, indent=2)
+        else:
+            print(json.dumps(suite_result, indent=2))
+        sys.exit(1 if suite_result.get('regressions') else 0)
+
+    for result in benchmark_concurrent_block_fetching(activity_transactions):
+        print(f"max_in_flight={result['max_in_flight']:>3}: {result['blocks']} blocks in "
+              f"{result['seconds']:.2f}s ({result['blocks_per_second']:.1f} blocks/s)")
+
+    for result in benchmark_batched_block_fetching(activity_transactions):
+        print(f"batch_size={str(result['batch_size']):>4}: {result['blocks']} blocks in {result['requests']} requests, "
+              f"{result['seconds']:.2f}s ({result['blocks_per_second']:.1f} blocks/s)")
+
+    for result in benchmark_transaction_hash_extraction(activity_transactions):
+        print(f"{result['path']:>18}: {result['bytes_sent'] + result['bytes_received']} bytes on the wire "
+              f"in {result['requests']} requests, {result['seconds']:.2f}s")
+
+    for result in benchmark_parallel_decoding(activity_transactions):
+        print(f"{result['path']:>18} processes={str(result['processes']):>4}: {result['blocks']} cached blocks "
+              f"decoded in {result['seconds']:.2f}s ({result['blocks_per_second']:.0f} blocks/s, "
+              f"{result['speedup']:.1f}x)")
+
+    for result in benchmark_export_formats(activity_transactions):
+        print(f"{result['format']:>8}: {result['events']} events in {result['seconds']:.3f}s, {result['bytes']} bytes")
+
+    for result in benchmark_cold_start():
+        print(f"{result['command']}: {result['seconds'] * 1000:.0f}ms")
+
+    conformance_diff = check_xes_writer_conformance(create_scaled_log_dic(activity_transactions))
+    print(f"xes_writer conforms to opyenxes: {not conformance_diff}")
+    print("".join(conformance_diff[:20]), end="")
+
+    for result in benchmark_xes_writers(activity_transactions):
+        print(f"{result['events']:>8} events: opyenxes {result['opyenxes_seconds']:.2f}s, "
+              f"xes_writer {result['xes_writer_seconds']:.3f}s ({result['speedup']:.0f}x), "
+              f"gzip {result['xes_writer_gzip_seconds']:.3f}s")
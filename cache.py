@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from . import instrumentation
+from .formatters import block_to_json, format_block
+
+
+# The number of cache hits whose access times are kept in memory before they are written to the database.
+ACCESS_FLUSH_INTERVAL = 1000
+
+
+class BlockCache(object):
+    '''
+        BlockCache stores retrieved blocks with full transactions in a local SQLite database, so that
+        re-running an extraction does not download the same historical blocks again. Blocks are stored
+        as compressed JSON and can be looked up by block number or block hash.
+
+        Only blocks that are at least confirmation_depth blocks below the head of the chain are cached,
+        because more recent blocks can still be replaced by a reorganisation of the chain. If the cache
+        grows beyond max_bytes, the least recently used blocks are evicted. Several processes can share the
+        cache file; the size is read from the database before every eviction. The access times of cache hits
+        are written in batches, i.e. when a block is stored, every ACCESS_FLUSH_INTERVAL hits, and on close.
+
+        Example:
+            >> block_cache = BlockCache('block_cache.sqlite', max_bytes=2 * 1024 ** 3)
+            >> activity_transactions = get_activity_transactions_from_block_numbers(
+            ..     activities_dictionary, block_numbers, http_provider, block_cache=block_cache)
+    '''
+
+    def __init__(self, path='block_cache.sqlite', max_bytes=1024 ** 3, confirmation_depth=64):
+        '''
+            Arguments:
+                path (string): The path to the SQLite database. It is created if it does not exist.
+                max_bytes (int): The maximum size of the stored (compressed) blocks in bytes.
+                confirmation_depth (int): The number of blocks a block must be below the head of the chain
+                    before it is cached.
+        '''
+        self.path = path
+        self.max_bytes = max_bytes
+        self.confirmation_depth = confirmation_depth
+        self.hits = 0
+        self.misses = 0
+        self._accesses = {}
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS blocks ('
+            'number INTEGER PRIMARY KEY, hash TEXT NOT NULL, data BLOB NOT NULL, '
+            'size INTEGER NOT NULL, last_access REAL NOT NULL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS blocks_hash ON blocks (hash)')
+        # The index covers the eviction order and the sum of the sizes.
+        self._connection.execute('DROP INDEX IF EXISTS blocks_last_access')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS blocks_last_access_size ON blocks (last_access, size)')
+        self._connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM blocks').fetchone()[0]
+
+    @property
+    def size(self):
+        with self._lock:
+            return self._read_size()
+
+    def cached_block_numbers(self, block_numbers):
+        '''
+            Returns the subset of block_numbers that is in the cache as a set.
+        '''
+        block_numbers = list(block_numbers)
+        cached = set()
+        with self._lock:
+            for start in range(0, len(block_numbers), 500):
+                chunk = block_numbers[start:start + 500]
+                rows = self._connection.execute(
+                    f'SELECT number FROM blocks WHERE number IN ({",".join("?" * len(chunk))})', chunk)
+                cached.update(row[0] for row in rows)
+        return cached
+
+    def get(self, block_number):
+        '''
+            Returns the cached block with the given number, or None if it is not cached.
+        '''
+        return self._get('number', int(block_number))
+
+    def get_by_hash(self, block_hash):
+        '''
+            Returns the cached block with the given hash (a hex string or bytes), or None if it is not cached.
+        '''
+        if isinstance(block_hash, (bytes, bytearray)):
+            block_hash = '0x' + bytes(block_hash).hex()
+        return self._get('hash', block_hash.lower())
+
+    def iter_payloads(self, block_numbers=None):
+        '''
+            Yields the stored, zlib compressed JSON of the blocks with the given numbers (all blocks if
+            block_numbers is None) in ascending order without decoding them, e.g. as input of
+            decoding.iter_event_records with compressed=True. Blocks that are not cached are skipped.
+        '''
+        with self._lock:
+            if block_numbers is None:
+                rows = self._connection.execute('SELECT data FROM blocks ORDER BY number').fetchall()
+            else:
+                block_numbers = sorted(set(block_numbers))
+                rows = []
+                for start in range(0, len(block_numbers), 500):
+                    chunk = block_numbers[start:start + 500]
+                    rows.extend(self._connection.execute(
+                        f'SELECT data FROM blocks WHERE number IN ({",".join("?" * len(chunk))}) ORDER BY number',
+                        chunk))
+        for row in rows:
+            yield row[0]
+
+    def put(self, block, head_block_number):
+        '''
+            Stores block unless it is less than confirmation_depth blocks below head_block_number.
+
+            Arguments:
+                block (AttributeDict): A block with full transactions as returned by eth.getBlock.
+                head_block_number (int): The number of the latest block of the chain.
+
+            Returns:
+                True if the block was stored, False otherwise.
+        '''
+        if block["number"] is None or block["number"] > head_block_number - self.confirmation_depth:
+            return False
+
+        block_json = block_to_json(block)
+        data = zlib.compress(json.dumps(block_json, separators=(',', ':')).encode())
+
+        with self._lock:
+            self._write_accesses()
+            self._connection.execute(
+                'INSERT OR REPLACE INTO blocks (number, hash, data, size, last_access) VALUES (?, ?, ?, ?, ?)',
+                (block["number"], block_json["hash"].lower(), data, len(data), time.time()))
+            self._evict()
+            self._connection.commit()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._accesses.clear()
+            self._connection.execute('DELETE FROM blocks')
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._write_accesses()
+            self._connection.commit()
+        self._connection.close()
+
+    def _get(self, column, value):
+        with self._lock:
+            row = self._connection.execute(
+                f'SELECT number, data FROM blocks WHERE {column} = ?', (value,)).fetchone()
+            if row is None:
+                self.misses += 1
+                instrumentation.count('cache_misses')
+                return None
+            self.hits += 1
+            instrumentation.count('cache_hits')
+            self._accesses[row[0]] = time.time()
+            if len(self._accesses) >= ACCESS_FLUSH_INTERVAL:
+                self._write_accesses()
+                self._connection.commit()
+        return format_block(json.loads(zlib.decompress(row[1])))
+
+    def _write_accesses(self):
+        if self._accesses:
+            self._connection.executemany(
+                'UPDATE blocks SET last_access = ? WHERE number = ?',
+                [(last_access, number) for number, last_access in self._accesses.items()])
+            self._accesses.clear()
+
+    def _read_size(self):
+        return self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM blocks').fetchone()[0]
+
+    def _evict(self):
+        # The size is read from the database, because other processes may have stored or evicted blocks.
+        size = self._read_size()
+        while size > self.max_bytes:
+            rows = self._connection.execute(
+                'SELECT number, size FROM blocks ORDER BY last_access LIMIT 100').fetchall()
+            if not rows:
+                break
+            for number, block_size in rows:
+                if size <= self.max_bytes:
+                    break
+                self._connection.execute('DELETE FROM blocks WHERE number = ?', (number,))
+                size -= block_size
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import logging
+import sys
+import time
+
+# Only the standard library is imported here. The subcommands import what they need, i.e. build-log and export
+# run without web3, OpyenXES, and a node. build-log needs pycryptodome to hash the function signatures (see
+# utils.create_activities_dictionary), export needs none of them.
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_activities_dictionary(path, decode_arguments=False):
+    '''
+        load_activities_dictionary reads the activities of the process from the JSON file path, i.e. a list of
+        objects with the keys activity_name, function_signature, and resource:
+
+            [{"activity_name": "Ask 2nd level support", "function_signature": "Ask_2nd_level_support()",
+              "resource": "1st Level Support"}, ...]
+
+        Arguments:
+            path (string): The path to the JSON file.
+            decode_arguments (bool): Whether a SelectorRegistry is returned, so that the log contains the
+                decoded call arguments (see selector_registry.SelectorRegistry).
+
+        Returns:
+            An activities dictionary (see utils.create_activities_dictionary) or a SelectorRegistry.
+    '''
+    with open(path) as file:
+        activities = json.load(file)
+
+    activity_names = [activity["activity_name"] for activity in activities]
+    function_signatures = [activity["function_signature"] for activity in activities]
+    activity_resources = [activity["resource"] for activity in activities]
+
+    if decode_arguments:
+        from .selector_registry import SelectorRegistry
+        return SelectorRegistry.from_signatures(activity_names, function_signatures, activity_resources)
+
+    from .utils import create_activities_dictionary
+    return create_activities_dictionary(activity_names, function_signatures, activity_resources)
+
+
+def extract(args):
+    from . import utils
+
+    activities_dictionary = load_activities_dictionary(args.activities)
+    http_provider = utils.connect_to_http_provider(args.node[0] if len(args.node) == 1 else args.node)
+
+    block_cache = None
+    if args.block_cache:
+        from .cache import BlockCache
+        block_cache = BlockCache(args.block_cache)
+
+    errors = []
+    activity_transactions = utils.get_activity_transactions_from_block_numbers(
+        activities_dictionary,
+        range(args.from_block, args.to_block + 1),
+        http_provider,
+        max_in_flight=args.max_in_flight,
+        batch_size=args.batch_size,
+        errors=errors,
+        block_cache=block_cache,
+        receipts=args.receipts)
+    utils.save_activity_transactions_to_pickle(activity_transactions, args.output)
+    logger.info(f'Wrote {len(activity_transactions)} activity transactions to {args.output}.')
+
+    for parameter, exception in errors:
+        logger.error(f'{parameter}: {exception}')
+    return 1 if errors else 0
+
+
+def build_log(args):
+    from . import utils
+
+    activities_dictionary = load_activities_dictionary(args.activities, args.decode_arguments)
+    activity_transactions = utils.load_activity_transactions_from_pickle(args.input, web3_types=False)
+    if args.remove_reverted:
+        activity_transactions = utils.remove_reverted_activity_transactions(activity_transactions)
+
+    log_dic = utils.sort_log_dic_by_time(
+        utils.create_log_dictionary_from_activity_transactions(activity_transactions, activities_dictionary))
+    utils.write_log_dic_to_json_lines(log_dic, args.output)
+    logger.info(f'Wrote {len(log_dic)} traces to {args.output}.')
+    return 0
+
+
+def export(args):
+    from .exporters import write_event_logs_from_log_dic
+    from .utils import load_log_dic_from_json_lines
+
+    log_dic = load_log_dic_from_json_lines(args.input)
+    traces = write_event_logs_from_log_dic(log_dic, args.output, args.process_name)
+    logger.info(f'Wrote {traces} traces to {", ".join(args.output)}.')
+    return 0
+
+
+def index(args):
+    from .log_index import LogIndex
+    from .utils import load_log_dic_from_json_lines
+
+    log_index = LogIndex(args.output)
+    events = log_index.add_log_dic(load_log_dic_from_json_lines(args.input))
+    logger.info(f'Added {events} events to {args.output}, which has {len(log_index)} events.')
+    log_index.close()
+    return 0
+
+
+def query(args):
+    from .log_index import LogIndex
+
+    log_index = LogIndex(args.index)
+    filters = {
+        name: getattr(args, name)
+        for name in ('activities', 'resources', 'senders', 'trace_ids', 'from_block', 'to_block')
+        if getattr(args, name) is not None}
+
+    if args.output:
+        from .exporters import write_event_logs_from_log_dic
+        traces = write_event_logs_from_log_dic(log_index.sub_log(not args.matching_events, **filters), args.output)
+        logger.info(f'Wrote {traces} traces to {", ".join(args.output)}.')
+    elif args.variants:
+        print(json.dumps([{'activities': list(activities), 'traces': traces}
+                          for activities, traces in log_index.variants(**filters)], indent=2))
+    elif args.durations:
+        print(json.dumps(log_index.durations(*args.durations, **filters), indent=2))
+    elif args.activity_counts:
+        print(json.dumps(log_index.activity_counts(**filters), indent=2))
+    else:
+        print("\n".join(log_index.query_traces(**filters)))
+    return 0
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m extracting_event_logs_blockchain',
+        description='Extracts event logs from the transactions of a blockchain.')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log progress and timings to stderr')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = subparsers.add_parser(
+        'extract', help='retrieve the activity transactions of a block range and store them as pickle')
+    extract_parser.add_argument('--node', action='append', required=True,
+                                help='the URL of a node; repeat it to distribute the requests over several nodes')
+    extract_parser.add_argument('--activities', required=True, help='the JSON file with the activities')
+    extract_parser.add_argument('--from-block', type=int, required=True)
+    extract_parser.add_argument('--to-block', type=int, required=True)
+    extract_parser.add_argument('--batch-size', type=int, help='the number of blocks per JSON-RPC batch')
+    extract_parser.add_argument('--max-in-flight', type=int, default=1, help='the number of concurrent requests')
+    extract_parser.add_argument('--receipts', action='store_true', help='retrieve the transaction receipts')
+    extract_parser.add_argument('--block-cache', help='the SQLite file of a block cache')
+    extract_parser.add_argument('--output', default='activity_transactions.pickle')
+    extract_parser.set_defaults(function=extract)
+
+    build_log_parser = subparsers.add_parser(
+        'build-log', help='build the log dictionary from stored activity transactions, without a node')
+    build_log_parser.add_argument('--activities', required=True, help='the JSON file with the activities')
+    build_log_parser.add_argument('--input', default='activity_transactions.pickle')
+    build_log_parser.add_argument('--decode-arguments', action='store_true', help='add the decoded call arguments')
+    build_log_parser.add_argument('--remove-reverted', action='store_true', help='drop reverted transactions')
+    build_log_parser.add_argument('--output', default='automatic_incident_management.jsonl.gz')
+    build_log_parser.set_defaults(function=build_log)
+
+    export_parser = subparsers.add_parser(
+        'export', help='write a log dictionary built with build-log as XES, CSV, Parquet, or OCEL 2.0')
+    export_parser.add_argument('--input', default='automatic_incident_management.jsonl.gz')
+    export_parser.add_argument('--output', nargs='+', default=['automatic_incident_management.xes'],
+                               help='the files; the format is chosen by the extension (.xes, .csv, .parquet, '
+                                    '.jsonocel, or .sqlite), and .gz compresses the text formats')
+    export_parser.add_argument('--process-name', default="Incident Management Process")
+    export_parser.set_defaults(function=export)
+
+    index_parser = subparsers.add_parser('index', help='add a log dictionary built with build-log to a log index')
+    index_parser.add_argument('--input', default='automatic_incident_management.jsonl.gz')
+    index_parser.add_argument('--output', default='log.index.sqlite', help='the SQLite file of the log index')
+    index_parser.set_defaults(function=index)
+
+    query_parser = subparsers.add_parser(
+        'query', help='list the matching traces of a log index, or their variants, activity counts, durations, or '
+                      'sub-log')
+    query_parser.add_argument('--index', default='log.index.sqlite', help='the SQLite file of the log index')
+    query_parser.add_argument('--activities', nargs='+', help='activity names or function selectors')
+    query_parser.add_argument('--resources', nargs='+')
+    query_parser.add_argument('--senders', nargs='+', help='the addresses that sent the transactions')
+    query_parser.add_argument('--trace-ids', nargs='+', help='"i" followed by the address of the process instance')
+    query_parser.add_argument('--from-block', type=int)
+    query_parser.add_argument('--to-block', type=int)
+    query_parser.add_argument('--variants', action='store_true', help='print the trace variants as JSON')
+    query_parser.add_argument('--activity-counts', action='store_true', help='print the events per activity as JSON')
+    query_parser.add_argument('--durations', nargs=2, metavar=('FROM_ACTIVITY', 'TO_ACTIVITY'),
+                              help='print the seconds between two activities per trace as JSON')
+    query_parser.add_argument('--output', nargs='+', help='export the sub-log to these files (see export)')
+    query_parser.add_argument('--matching-events', action='store_true',
+                              help='export only the matching events instead of the whole traces')
+    query_parser.set_defaults(function=query)
+
+    return parser
+
+
+def main(argv=None):
+    start = time.perf_counter()
+    args = create_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr)
+
+    exit_code = args.function(args)
+    logger.info(f'{args.command} finished in {time.perf_counter() - start:.3f}s.')
+    return exit_code
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from web3 import Web3
+
+from .selector_registry import SelectorRegistry, create_matcher
+from .utils import add_decoded_arguments
+
+
+EventRecord = namedtuple('EventRecord', [
+    'function_selector', 'to', 'from_address', 'block_number', 'time_stamp', 'transaction_index',
+    'transaction_hash', 'gas', 'gas_price', 'input'])
+
+# The matcher of the worker process, set once by _initialize_worker.
+_match = None
+
+
+def decode_block_payload(payload, match, compressed=False):
+    '''
+        decode_block_payload parses one block as it is returned by eth_getBlockByNumber with full transactions
+        in JSON, and returns an EventRecord for every transaction that match associates to an activity. Only
+        the matched transactions are converted, i.e. their quantities become integers and their addresses are
+        checksummed like in the blocks returned by eth.getBlock.
+
+        Arguments:
+            payload (string or bytes): The block as JSON.
+            match (callable): The matcher of the activities dictionary (see selector_registry.create_matcher).
+            compressed (bool): Whether payload is compressed with zlib, as in BlockCache.
+
+        Returns:
+            A list of EventRecords in the order of the transactions in the block.
+    '''
+    if compressed:
+        payload = zlib.decompress(payload)
+    block = json.loads(payload)
+
+    event_records = []
+    time_stamp = None
+    for transaction in block["transactions"]:
+        if not match(transaction["input"]):
+            continue
+
+        if time_stamp is None:
+            time_stamp = int(block["timestamp"], 16)
+        event_records.append(EventRecord(
+            transaction["input"][:10],
+            Web3.toChecksumAddress(transaction["to"]),
+            Web3.toChecksumAddress(transaction["from"]),
+            int(transaction["blockNumber"], 16),
+            time_stamp,
+            int(transaction["transactionIndex"], 16),
+            transaction["hash"],
+            int(transaction["gas"], 16),
+            int(transaction["gasPrice"], 16),
+            transaction["input"]))
+
+    return event_records
+
+
+def iter_event_records(payloads, activities_dictionary, processes=None, chunk_size=64, compressed=False):
+    '''
+        iter_event_records decodes raw block payloads (see decode_block_payload) in a pool of worker
+        processes, i.e. parsing the JSON and matching the function selectors scale with the number of cores.
+        The workers return compact EventRecords instead of whole blocks, so little data is sent back to the
+        main process. Payloads are sent to the workers in chunks of chunk_size blocks, and at most two chunks
+        per worker are in flight, i.e. payloads can be an arbitrarily long iterable.
+
+        It replays blocks that are already stored, e.g. a warm BlockCache. The functions that retrieve blocks
+        from a node (e.g. iter_blocks) decode the responses in the main process and do not use the pool. Even
+        with processes=0, replaying a cache with iter_event_records is much faster than with iter_blocks,
+        because only the matched transactions are converted (see benchmarks.benchmark_parallel_decoding).
+
+        Arguments:
+            payloads (iterable): The blocks as JSON, e.g. from BlockCache.iter_payloads.
+            activities_dictionary (dictionary): A dictionary where the keys are function selectors.
+            processes (int): The number of worker processes. None uses one per core, 0 decodes in this process.
+            chunk_size (int): The number of payloads per task.
+            compressed (bool): Whether the payloads are compressed with zlib, as in BlockCache.
+
+        Returns:
+            A generator over EventRecords in the order of the payloads.
+
+        Example:
+            >> block_cache = BlockCache('block_cache.sqlite')
+            >> event_records = iter_event_records(
+            ..     block_cache.iter_payloads(block_numbers), activities_dictionary, compressed=True)
+            >> log_dic = create_log_dictionary_from_event_records(event_records, activities_dictionary)
+    '''
+    match = create_matcher(activities_dictionary)
+    payloads = iter(payloads)
+    chunks = iter(lambda: list(islice(payloads, chunk_size)), [])
+
+    if processes == 0:
+        for chunk in chunks:
+            for payload in chunk:
+                yield from decode_block_payload(payload, match, compressed)
+        return
+
+    processes = processes or os.cpu_count()
+    with ProcessPoolExecutor(
+            max_workers=processes, initializer=_initialize_worker, initargs=(match,)) as executor:
+        max_in_flight = 2 * processes
+        in_flight = deque()
+        for chunk in chunks:
+            if len(in_flight) >= max_in_flight:
+                yield from in_flight.popleft().result()
+            in_flight.append(executor.submit(_decode_block_payloads, chunk, compressed))
+
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def _initialize_worker(match):
+    global _match
+    _match = match
+
+
+def _decode_block_payloads(payloads, compressed):
+    event_records = []
+    for payload in payloads:
+        event_records.extend(decode_block_payload(payload, _match, compressed))
+    return event_records
+
+
+def create_activity_from_event_record(event_record, activities_dictionary, decode_arguments=True):
+    '''
+        create_activity_from_event_record creates the same (trace_id, activity) tuple as
+        create_activity_from_activity_transaction from an EventRecord.
+    '''
+    activity = activities_dictionary[event_record.function_selector]
+    activity_dictionary = {
+        "id": event_record.function_selector,
+        "name": activity["activity_name"],
+        "name_resource": activity["resource"],
+        "instance_id": "i" + event_record.transaction_hash,
+        "instance_id_time_stamp": datetime.fromtimestamp(event_record.time_stamp),
+        "instance_id_block_no": event_record.block_number,
+        "instance_id_from": event_record.from_address,
+        "instance_id_txh_gas": event_record.gas,
+        "instance_id_txh_gas_price": event_record.gas_price,
+        "instance_id_transaction_data": event_record.input
+    }
+    if decode_arguments and isinstance(activities_dictionary, SelectorRegistry):
+        activity_dictionary["arguments"] = activities_dictionary.decode_arguments(event_record.input)
+    return "i" + event_record.to, activity_dictionary
+
+
+def create_log_dictionary_from_event_records(event_records, activities_dictionary):
+    '''
+        create_log_dictionary_from_event_records creates the same log dictionary as
+        create_log_dictionary_from_activity_transactions from EventRecords.
+    '''
+    log_dic = {}
+    activities = []
+    for event_record in event_records:
+        trace_id, activity = create_activity_from_event_record(
+            event_record, activities_dictionary, decode_arguments=False)
+        log_dic.setdefault(trace_id, []).append(activity)
+        activities.append(activity)
+
+    add_decoded_arguments(activities, activities_dictionary)
+    return log_dic
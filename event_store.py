@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from . import utils
+
+
+EVENT_COLUMNS = [
+    'trace_codes', 'selector_codes', 'from_codes', 'block_codes', 'transaction_indices',
+    'transaction_hashes', 'gas', 'gas_prices', 'input_offsets']
+BLOCK_COLUMNS = ['block_numbers', 'block_timestamps', 'block_hashes']
+
+
+class EventStore(object):
+    '''
+        EventStore holds the activity transactions in a compact columnar form, i.e. one NumPy array per field
+        that create_log_dictionary_from_activity_transactions uses. Trace ids (the contract addresses),
+        function selectors, and sender addresses are dictionary encoded, and every block is stored once.
+        The input data of all transactions is concatenated into one byte array.
+
+        A store is saved as a directory of .npy files and a dictionaries.json file, and load_event_store
+        memory-maps the arrays, i.e. loading takes milliseconds regardless of the size of the store.
+
+        Example:
+            >> event_store = EventStore.from_activity_transactions(activity_transactions)
+            >> save_event_store(event_store, 'activity_transactions.events')
+            >> log_dic = create_log_dictionary_from_event_store(
+            ..     load_event_store('activity_transactions.events'), activities_dictionary)
+    '''
+
+    def __init__(self, traces, selectors, senders, columns):
+        '''
+            Arguments:
+                traces (list): The contract addresses that trace_codes refer to.
+                selectors (list): The function selectors that selector_codes refer to.
+                senders (list): The sender addresses that from_codes refer to.
+                columns (dictionary): The arrays of EVENT_COLUMNS, BLOCK_COLUMNS, and input_data.
+        '''
+        self.traces = traces
+        self.selectors = selectors
+        self.senders = senders
+        for name, column in columns.items():
+            setattr(self, name, column)
+
+    def __len__(self):
+        return len(self.trace_codes)
+
+    @property
+    def columns(self):
+        return {name: getattr(self, name) for name in EVENT_COLUMNS + BLOCK_COLUMNS + ['input_data']}
+
+    @property
+    def time_stamps(self):
+        return self.block_timestamps[self.block_codes]
+
+    @property
+    def event_block_numbers(self):
+        return self.block_numbers[self.block_codes]
+
+    def transaction_input(self, index):
+        start, end = self.input_offsets[index], self.input_offsets[index + 1]
+        return '0x' + self.input_data[start:end].tobytes().hex()
+
+    @classmethod
+    def from_activity_transactions(cls, activity_transactions):
+        '''
+            Creates an EventStore from activity transactions as they are returned by
+            get_activity_transactions_from_block_numbers or load_activity_transactions_from_pickle.
+        '''
+        traces, selectors, senders, blocks = {}, {}, {}, {}
+        trace_codes, selector_codes, from_codes, block_codes = [], [], [], []
+        transaction_indices, transaction_hashes, gas, gas_prices = [], [], [], []
+        input_data, input_offsets = bytearray(), [0]
+
+        for activity_transaction in activity_transactions:
+            transaction = activity_transaction["transaction"]
+            block = activity_transaction["block"]
+
+            trace_codes.append(traces.setdefault(transaction["to"], len(traces)))
+            selector_codes.append(selectors.setdefault(transaction["input"][:10], len(selectors)))
+            from_codes.append(senders.setdefault(transaction["from"], len(senders)))
+            if transaction["blockNumber"] not in blocks:
+                blocks[transaction["blockNumber"]] = (len(blocks), block["timestamp"], bytes(block["hash"]))
+            block_codes.append(blocks[transaction["blockNumber"]][0])
+
+            transaction_indices.append(transaction["transactionIndex"])
+            transaction_hashes.append(bytes(transaction["hash"]))
+            gas.append(transaction["gas"])
+            gas_prices.append(transaction["gasPrice"])
+            input_data.extend(bytes.fromhex(transaction["input"][2:]))
+            input_offsets.append(len(input_data))
+
+        columns = {
+            'trace_codes': np.array(trace_codes, dtype=np.int32),
+            'selector_codes': np.array(selector_codes, dtype=np.int32),
+            'from_codes': np.array(from_codes, dtype=np.int32),
+            'block_codes': np.array(block_codes, dtype=np.int32),
+            'transaction_indices': np.array(transaction_indices, dtype=np.int32),
+            'transaction_hashes': _hashes_to_array(transaction_hashes),
+            'gas': np.array(gas, dtype=np.uint64),
+            'gas_prices': np.array(gas_prices, dtype=np.uint64),
+            'input_offsets': np.array(input_offsets, dtype=np.int64),
+            'input_data': np.frombuffer(bytes(input_data), dtype=np.uint8),
+            'block_numbers': np.array(list(blocks), dtype=np.int64),
+            'block_timestamps': np.array([timestamp for _, timestamp, _ in blocks.values()], dtype=np.int64),
+            'block_hashes': _hashes_to_array([block_hash for _, _, block_hash in blocks.values()]),
+        }
+        return cls(list(traces), list(selectors), list(senders), columns)
+
+
+def _hashes_to_array(hashes):
+    # A (n, 32) uint8 array instead of the S32 dtype, because NumPy strips trailing zero bytes from S32 values.
+    return np.frombuffer(b''.join(hashes), dtype=np.uint8).reshape(len(hashes), 32)
+
+
+def save_event_store(event_store, path):
+    '''
+        save_event_store writes event_store to the directory path (see EventStore).
+    '''
+    os.makedirs(path, exist_ok=True)
+    for name, column in event_store.columns.items():
+        np.save(os.path.join(path, f'{name}.npy'), column)
+    with open(os.path.join(path, 'dictionaries.json'), 'w') as file:
+        json.dump({
+            'traces': event_store.traces,
+            'selectors': event_store.selectors,
+            'senders': event_store.senders}, file)
+
+
+def load_event_store(path, mmap_mode='r'):
+    '''
+        load_event_store loads the EventStore saved in the directory path.
+
+        Arguments:
+            path (string): The directory of the store.
+            mmap_mode (string): The mmap_mode of numpy.load. 'r' memory-maps the arrays read-only,
+                None reads them into memory.
+
+        Returns:
+            An EventStore.
+    '''
+    with open(os.path.join(path, 'dictionaries.json')) as file:
+        dictionaries = json.load(file)
+    columns = {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in EVENT_COLUMNS + BLOCK_COLUMNS + ['input_data']}
+    return EventStore(dictionaries['traces'], dictionaries['selectors'], dictionaries['senders'], columns)
+
+
+def sort_event_store(event_store):
+    '''
+        sort_event_store orders the events of event_store by trace, and within a trace by timestamp, block number,
+        and position in the block, with one vectorized lexsort. Unlike sort_log_dic_by_time, events within the
+        same second are ordered deterministically by their position on the chain. The traces keep the order
+        in which they first occur.
+
+        Argument:
+            event_store (EventStore): The activity transactions.
+
+        Returns:
+            A tuple of the event indices in sorted order and the start position of every trace in that order.
+    '''
+    order = np.lexsort((
+        event_store.transaction_indices, event_store.event_block_numbers, event_store.time_stamps,
+        event_store.trace_codes))
+
+    trace_codes = event_store.trace_codes[order]
+    trace_starts = np.flatnonzero(np.diff(trace_codes, prepend=-1)) if len(order) else np.array([], dtype=np.int64)
+    return order, trace_starts
+
+
+def iter_traces(event_store, order=None, trace_starts=None):
+    '''
+        iter_traces yields the traces of event_store as (trace_code, event indices) tuples. By default the
+        events are sorted with sort_event_store.
+    '''
+    if order is None:
+        order, trace_starts = sort_event_store(event_store)
+
+    trace_ends = np.append(trace_starts[1:], len(order))
+    for start, end in zip(trace_starts.tolist(), trace_ends.tolist()):
+        yield int(event_store.trace_codes[order[start]]), order[start:end]
+
+
+def create_log_dictionary_from_event_store(event_store, activities_dictionary, sort=False):
+    '''
+        create_log_dictionary_from_event_store creates the same log dictionary as
+        create_log_dictionary_from_activity_transactions from an EventStore.
+
+        Arguments:
+            event_store (EventStore): The activity transactions.
+            activities_dictionary (dictionary): A dictionary where the keys are function selectors.
+            sort (bool): Whether the activities of every trace are sorted with sort_event_store, i.e. the
+                result equals sort_log_dic_by_time(create_log_dictionary_from_activity_transactions(...)) except
+                that events within the same second are in chain order.
+
+        Returns:
+            A dictionary where the keys are the trace ids and the value is a list of activities.
+    '''
+    if sort:
+        traces = iter_traces(event_store)
+    else:
+        traces = _iter_traces_in_input_order(event_store)
+
+    # Every block is converted to a datetime once.
+    block_time_stamps = [datetime.fromtimestamp(time_stamp) for time_stamp in event_store.block_timestamps.tolist()]
+    block_numbers = event_store.block_numbers.tolist()
+    block_codes = event_store.block_codes.tolist()
+    selector_codes = event_store.selector_codes.tolist()
+    from_codes = event_store.from_codes.tolist()
+    gas = event_store.gas.tolist()
+    gas_prices = event_store.gas_prices.tolist()
+    input_offsets = event_store.input_offsets.tolist()
+    input_data = event_store.input_data.tobytes()
+    transaction_hashes = event_store.transaction_hashes.tobytes()
+
+    activities = [
+        (event_store.selectors[selector_code], activities_dictionary[event_store.selectors[selector_code]])
+        for selector_code in range(len(event_store.selectors))]
+
+    log_dic = {}
+    all_activities = []
+    for trace_code, indices in traces:
+        trace_activities = log_dic.setdefault("i" + event_store.traces[trace_code], [])
+
+        for index in indices.tolist():
+            function_selector, activity_description = activities[selector_codes[index]]
+            block_code = block_codes[index]
+
+            activity = {
+                "id": function_selector,
+                "name": activity_description["activity_name"],
+                "name_resource": activity_description["resource"],
+                "instance_id": "i0x" + transaction_hashes[32 * index:32 * index + 32].hex(),
+                "instance_id_time_stamp": block_time_stamps[block_code],
+                "instance_id_block_no": block_numbers[block_code],
+                "instance_id_from": event_store.senders[from_codes[index]],
+                "instance_id_txh_gas": gas[index],
+                "instance_id_txh_gas_price": gas_prices[index],
+                "instance_id_transaction_data": "0x" + input_data[input_offsets[index]:input_offsets[index + 1]].hex()
+            }
+            trace_activities.append(activity)
+            all_activities.append(activity)
+
+    utils.add_decoded_arguments(all_activities, activities_dictionary)
+    return log_dic
+
+
+def _iter_traces_in_input_order(event_store):
+    # One stable argsort groups the events by trace and keeps the input order within every trace.
+    order = np.argsort(event_store.trace_codes, kind='stable')
+    trace_codes = event_store.trace_codes[order]
+    trace_starts = np.flatnonzero(np.diff(trace_codes, prepend=-1)) if len(order) else np.array([], dtype=np.int64)
+    trace_ends = np.append(trace_starts[1:], len(order))
+
+    # The traces are yielded in the order of their first event, like create_log_dictionary_from_activity_transactions.
+    for trace in np.argsort(order[trace_starts], kind='stable').tolist():
+        start, end = int(trace_starts[trace]), int(trace_ends[trace])
+        yield int(trace_codes[start]), order[start:end]
+
+
+def migrate_activity_transactions_pickle(pickle_path='activity_transactions.pickle', path='activity_transactions.events'):
+    '''
+        migrate_activity_transactions_pickle converts a pickle of activity transactions, e.g.
+        activity_transactions.pickle, into an EventStore saved in the directory path.
+
+        Returns:
+            The EventStore.
+    '''
+    event_store = EventStore.from_activity_transactions(utils.load_activity_transactions_from_pickle(pickle_path))
+    save_event_store(event_store, path)
+    return event_store
+
+
+if __name__ == '__main__':
+    migrate_activity_transactions_pickle(*sys.argv[1:3])
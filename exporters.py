@@ -0,0 +1,479 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import contextlib
+import csv
+import json
+import os
+import sqlite3
+
+from . import instrumentation
+from .xes_writer import XesWriter, _lifecycle_transition, format_timestamp, open_xes_file
+
+
+# The columns of the flat event table (CSV and Parquet). The names are the XES attribute keys; the decoded call
+# arguments are one JSON object, because their keys differ between the activities.
+EVENT_COLUMNS = [
+    "case:concept:name", "id", "activity_id", "concept:name", "time:timestamp", "org:resource",
+    "lifecycle:transition", "blockNo", "from", "transactionData", "gasUsed", "cost:total", "cost:currency",
+    "arguments"]
+
+# The file extensions of the export formats (see EventLogExporter).
+EXPORT_FORMATS = {
+    '.xes': 'xes', '.xes.gz': 'xes',
+    '.csv': 'csv', '.csv.gz': 'csv',
+    '.parquet': 'parquet',
+    '.jsonocel': 'jsonocel', '.jsonocel.gz': 'jsonocel', '.ocel.json': 'jsonocel',
+    '.sqlite': 'sqlite', '.sqlite3': 'sqlite', '.ocel.sqlite': 'sqlite',
+}
+
+
+# The OCEL object types and the qualifiers of the relationships between the events and the objects.
+PROCESS_INSTANCE_OBJECT_TYPE = "process instance"
+ACCOUNT_OBJECT_TYPE = "account"
+PROCESS_INSTANCE_QUALIFIER = "process instance"
+SENDER_QUALIFIER = "sender"
+
+_OCEL_TYPES = {"int": "integer", "float": "float", "boolean": "boolean", "string": "string"}
+_SQLITE_TYPES = {"int": "INTEGER", "float": "REAL", "boolean": "BOOLEAN", "string": "TEXT"}
+
+
+def event_row(trace_id, activity):
+    '''
+        event_row returns the row of the flat event table (see EVENT_COLUMNS) for one activity of the trace
+        trace_id. The time stamp stays a datetime, and gasUsed, cost:total, and cost:currency are None if the
+        activity has no receipt.
+    '''
+    has_receipt = "instance_id_gas_used" in activity
+    arguments = activity.get("arguments")
+    return (
+        trace_id,
+        activity["instance_id"],
+        activity["id"],
+        activity["name"],
+        activity["instance_id_time_stamp"],
+        activity["name_resource"],
+        _lifecycle_transition(activity),
+        int(activity["instance_id_block_no"]),
+        activity["instance_id_from"],
+        activity["instance_id_transaction_data"],
+        int(activity["instance_id_gas_used"]) if has_receipt else None,
+        activity["instance_id_cost"] / 10 ** 18 if has_receipt else None,
+        "ETH" if has_receipt else None,
+        json.dumps({key: value for key, _, value in arguments}) if arguments else None)
+
+
+def event_attributes(activity):
+    '''
+        event_attributes returns the attributes of the event of activity as (key, XES type, value) tuples, i.e. the
+        attributes of the XES event apart from id, concept:name, and time:timestamp.
+    '''
+    attributes = [
+        ("activity_id", "string", activity["id"]),
+        ("org:resource", "string", activity["name_resource"]),
+        ("lifecycle:transition", "string", _lifecycle_transition(activity)),
+        ("blockNo", "int", int(activity["instance_id_block_no"])),
+        ("from", "string", activity["instance_id_from"]),
+        ("transactionData", "string", activity["instance_id_transaction_data"])]
+    if "instance_id_gas_used" in activity:
+        attributes.append(("gasUsed", "int", int(activity["instance_id_gas_used"])))
+        attributes.append(("cost:total", "float", activity["instance_id_cost"] / 10 ** 18))
+        attributes.append(("cost:currency", "string", "ETH"))
+    attributes.extend(tuple(argument) for argument in activity.get("arguments", ()))
+    return attributes
+
+
+def event_objects(trace_id, activity):
+    '''
+        event_objects returns the objects of the event of activity as (object id, object type, qualifier) tuples,
+        i.e. the process instance contract (the trace id) and the account that sent the transaction.
+    '''
+    return [
+        (trace_id, PROCESS_INSTANCE_OBJECT_TYPE, PROCESS_INSTANCE_QUALIFIER),
+        (activity["instance_id_from"], ACCOUNT_OBJECT_TYPE, SENDER_QUALIFIER)]
+
+
+class CsvWriter(object):
+    '''
+        CsvWriter writes the activities as flat event table with one row per event (see EVENT_COLUMNS). It has the
+        interface of xes_writer.XesWriter, i.e. the traces are written one after the other.
+
+        Example:
+            >> with open_xes_file('log.csv.gz') as file, CsvWriter(file) as writer:
+            ..     writer.write_log_dic(log_dic)
+    '''
+
+    def __init__(self, file):
+        self.file = file
+        self.traces = 0
+        self.events = 0
+        self._writer = csv.writer(file, lineterminator="\n")
+
+    def __enter__(self):
+        self.write_header()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write_header(self):
+        self._writer.writerow(EVENT_COLUMNS)
+
+    def write_trace(self, trace_id, activities):
+        rows = []
+        for activity in activities:
+            row = list(event_row(trace_id, activity))
+            row[4] = format_timestamp(row[4])
+            rows.append(row)
+        self._writer.writerows(rows)
+        self.traces += 1
+        self.events += len(activities)
+        instrumentation.count('events_serialized', len(activities))
+
+    def write_log_dic(self, log_dic):
+        for trace_id, activities in log_dic.items():
+            self.write_trace(trace_id, activities)
+
+    def close(self):
+        self.file.flush()
+
+
+class ParquetWriter(object):
+    '''
+        ParquetWriter writes the activities as flat event table (see EVENT_COLUMNS) to a Parquet file, in row
+        groups of row_group_size events. time:timestamp is a timestamp column, and blockNo and gasUsed are
+        integer columns. It needs pyarrow (pip install pyarrow).
+    '''
+
+    def __init__(self, path, row_group_size=100000, compression='snappy'):
+        pyarrow = _import_pyarrow()
+
+        self.path = path
+        self.row_group_size = row_group_size
+        self.traces = 0
+        self.events = 0
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([
+            (column, pyarrow.timestamp('ms') if column == "time:timestamp"
+             else pyarrow.int64() if column in ("blockNo", "gasUsed")
+             else pyarrow.float64() if column == "cost:total"
+             else pyarrow.string())
+            for column in EVENT_COLUMNS])
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema, compression=compression)
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write_trace(self, trace_id, activities):
+        self._rows.extend(event_row(trace_id, activity) for activity in activities)
+        if len(self._rows) >= self.row_group_size:
+            self._write_row_group()
+        self.traces += 1
+        self.events += len(activities)
+        instrumentation.count('events_serialized', len(activities))
+
+    def write_log_dic(self, log_dic):
+        for trace_id, activities in log_dic.items():
+            self.write_trace(trace_id, activities)
+
+    def close(self):
+        self._write_row_group()
+        self._writer.close()
+
+    def _write_row_group(self):
+        if not self._rows:
+            return
+        columns = zip(*self._rows)
+        self._writer.write_table(self._pyarrow.Table.from_pydict(
+            {column: list(values) for column, values in zip(EVENT_COLUMNS, columns)}, schema=self._schema))
+        self._rows = []
+
+
+class OcelJsonWriter(object):
+    '''
+        OcelJsonWriter writes the activities as object-centric event log in the OCEL 2.0 JSON format. Every
+        activity is an event whose type is the activity name. It is related to two objects: the process instance
+        contract, i.e. the trace id, and the account that sent the transaction. The events are written one after
+        the other; the objects and the types are written when the writer is closed.
+    '''
+
+    def __init__(self, file):
+        self.file = file
+        self.traces = 0
+        self.events = 0
+        self._objects = {}
+        self._event_types = {}
+
+    def __enter__(self):
+        self.file.write('{"events": [')
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write_trace(self, trace_id, activities):
+        events = []
+        for activity in activities:
+            attributes = event_attributes(activity)
+            event_type = self._event_types.setdefault(activity["name"], {})
+            for key, attribute_type, _ in attributes:
+                event_type.setdefault(key, _OCEL_TYPES[attribute_type])
+
+            relationships = []
+            for object_id, object_type, qualifier in event_objects(trace_id, activity):
+                self._objects.setdefault(object_id, object_type)
+                relationships.append({"objectId": object_id, "qualifier": qualifier})
+
+            events.append(json.dumps({
+                "id": activity["instance_id"],
+                "type": activity["name"],
+                "time": format_timestamp(activity["instance_id_time_stamp"]),
+                "attributes": [{"name": key, "value": value} for key, _, value in attributes],
+                "relationships": relationships}))
+
+        if events:
+            self.file.write(("\n" if self.events == 0 else ",\n") + ",\n".join(events))
+        self.traces += 1
+        self.events += len(activities)
+        instrumentation.count('events_serialized', len(activities))
+
+    def write_log_dic(self, log_dic):
+        for trace_id, activities in log_dic.items():
+            self.write_trace(trace_id, activities)
+
+    def close(self):
+        objects = ",\n".join(
+            json.dumps({"id": object_id, "type": object_type, "attributes": [], "relationships": []})
+            for object_id, object_type in self._objects.items())
+        object_types = [
+            {"name": object_type, "attributes": []}
+            for object_type in (PROCESS_INSTANCE_OBJECT_TYPE, ACCOUNT_OBJECT_TYPE)]
+        event_types = [
+            {"name": name, "attributes": [{"name": key, "type": value_type} for key, value_type in attributes.items()]}
+            for name, attributes in self._event_types.items()]
+
+        self.file.write(
+            f'\n],\n"objects": [\n{objects}\n],\n'
+            f'"objectTypes": {json.dumps(object_types)},\n"eventTypes": {json.dumps(event_types)}}}\n')
+        self.file.flush()
+
+
+class OcelSqliteWriter(object):
+    '''
+        OcelSqliteWriter writes the activities as object-centric event log in the OCEL 2.0 SQLite format, with the
+        events and objects of OcelJsonWriter. Every event type gets its own table event_<type> whose columns are
+        the attributes of the type; attributes that appear later, e.g. other call arguments, are added as columns.
+        An existing file at path is replaced.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.traces = 0
+        self.events = 0
+        self._event_tables = {}
+        self._object_tables = {}
+        self._object_ids = set()
+
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('PRAGMA synchronous=OFF')
+        self._connection.executescript(
+            'CREATE TABLE event (ocel_id TEXT PRIMARY KEY, ocel_type TEXT);'
+            'CREATE TABLE event_map_type (ocel_type TEXT PRIMARY KEY, ocel_type_map TEXT);'
+            'CREATE TABLE object (ocel_id TEXT PRIMARY KEY, ocel_type TEXT);'
+            'CREATE TABLE object_map_type (ocel_type TEXT PRIMARY KEY, ocel_type_map TEXT);'
+            'CREATE TABLE event_object (ocel_event_id TEXT, ocel_object_id TEXT, ocel_qualifier TEXT, '
+            'PRIMARY KEY (ocel_event_id, ocel_object_id, ocel_qualifier));'
+            'CREATE TABLE object_object (ocel_source_id TEXT, ocel_target_id TEXT, ocel_qualifier TEXT, '
+            'PRIMARY KEY (ocel_source_id, ocel_target_id, ocel_qualifier));')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write_trace(self, trace_id, activities):
+        # The rows of a trace are inserted with one executemany per table.
+        event_rows, event_object_rows, object_rows, type_rows = [], [], {}, {}
+        for activity in activities:
+            attributes = event_attributes(activity)
+            table = self._event_table(activity["name"], attributes)
+            event_rows.append((activity["instance_id"], activity["name"]))
+            type_rows.setdefault((table, tuple(key for key, _, _ in attributes)), []).append(
+                [activity["instance_id"], format_timestamp(activity["instance_id_time_stamp"])]
+                + [value for _, _, value in attributes])
+
+            for object_id, object_type, qualifier in event_objects(trace_id, activity):
+                if object_id not in self._object_ids:
+                    self._object_ids.add(object_id)
+                    object_rows.setdefault(object_type, []).append(object_id)
+                event_object_rows.append((activity["instance_id"], object_id, qualifier))
+
+        connection = self._connection
+        connection.executemany('INSERT INTO event (ocel_id, ocel_type) VALUES (?, ?)', event_rows)
+        for (table, keys), rows in type_rows.items():
+            connection.executemany(
+                f'INSERT INTO "{table}" (ocel_id, ocel_time, {", ".join(_quote(key) for key in keys)}) '
+                f'VALUES ({", ".join("?" * (len(keys) + 2))})', rows)
+        for object_type, object_ids in object_rows.items():
+            connection.executemany('INSERT INTO object (ocel_id, ocel_type) VALUES (?, ?)',
+                                   [(object_id, object_type) for object_id in object_ids])
+            connection.executemany(
+                f'INSERT INTO "{self._object_table(object_type)}" (ocel_id, ocel_time, ocel_changed_field) '
+                'VALUES (?, ?, NULL)', [(object_id, "1970-01-01T00:00:00.000Z") for object_id in object_ids])
+        connection.executemany(
+            'INSERT OR IGNORE INTO event_object (ocel_event_id, ocel_object_id, ocel_qualifier) VALUES (?, ?, ?)',
+            event_object_rows)
+
+        self.traces += 1
+        self.events += len(activities)
+        instrumentation.count('events_serialized', len(activities))
+
+    def write_log_dic(self, log_dic):
+        for trace_id, activities in log_dic.items():
+            self.write_trace(trace_id, activities)
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+    def _event_table(self, event_type, attributes):
+        if event_type not in self._event_tables:
+            table = f'event_{self._map_type("event_map_type", event_type)}'
+            self._connection.execute(f'CREATE TABLE "{table}" (ocel_id TEXT PRIMARY KEY, ocel_time TIMESTAMP)')
+            self._event_tables[event_type] = (table, set())
+
+        table, columns = self._event_tables[event_type]
+        for key, attribute_type, _ in attributes:
+            if key not in columns:
+                self._connection.execute(f'ALTER TABLE "{table}" ADD COLUMN {_quote(key)} {_SQLITE_TYPES[attribute_type]}')
+                columns.add(key)
+        return table
+
+    def _object_table(self, object_type):
+        if object_type not in self._object_tables:
+            table = f'object_{self._map_type("object_map_type", object_type)}'
+            self._connection.execute(
+                f'CREATE TABLE "{table}" (ocel_id TEXT, ocel_time TIMESTAMP, ocel_changed_field TEXT)')
+            self._object_tables[object_type] = table
+        return self._object_tables[object_type]
+
+    def _map_type(self, map_table, type_name):
+        # OCEL 2.0 names the tables of a type after its name without spaces and special characters.
+        type_map = "".join(character for character in type_name.title() if character.isalnum()) or "Type"
+        existing = {row[0] for row in self._connection.execute(f'SELECT ocel_type_map FROM {map_table}')}
+        unique_type_map, suffix = type_map, 1
+        while unique_type_map in existing:
+            suffix += 1
+            unique_type_map = f'{type_map}{suffix}'
+        self._connection.execute(f'INSERT INTO {map_table} (ocel_type, ocel_type_map) VALUES (?, ?)',
+                                 (type_name, unique_type_map))
+        return unique_type_map
+
+
+class EventLogExporter(object):
+    '''
+        EventLogExporter writes the same traces to several files in one pass. The format of every file is chosen by
+        its extension (see EXPORT_FORMATS): .xes, .csv, .parquet, .jsonocel, and .sqlite, and .xes.gz, .csv.gz, and
+        .jsonocel.gz for gzip compressed text formats.
+
+        Example:
+            >> with EventLogExporter(['log.xes.gz', 'log.parquet', 'log.jsonocel', 'log.sqlite']) as exporter:
+            ..     for trace_id, activities in assemble_traces(activities):
+            ..         exporter.write_trace(trace_id, activities)
+    '''
+
+    def __init__(self, file_paths, process_name="Incident Management Process"):
+        '''
+            Arguments:
+                file_paths (list): The paths of the files.
+                process_name (string): The name of the process, i.e. the concept:name of the XES log.
+        '''
+        self.file_paths = list(file_paths)
+        self.process_name = process_name
+        self.writers = []
+        self._exit_stack = contextlib.ExitStack()
+
+    def __enter__(self):
+        # All formats and their dependencies are checked before the first file is opened, so that an unknown
+        # extension or a missing pyarrow does not leave the earlier files truncated.
+        export_formats = [export_format_of(file_path) for file_path in self.file_paths]
+        if 'parquet' in export_formats:
+            _import_pyarrow()
+
+        with self._exit_stack as exit_stack:
+            for file_path, export_format in zip(self.file_paths, export_formats):
+                if export_format == 'xes':
+                    writer = XesWriter(exit_stack.enter_context(open_xes_file(file_path)), self.process_name)
+                elif export_format == 'csv':
+                    writer = CsvWriter(exit_stack.enter_context(open_xes_file(file_path)))
+                elif export_format == 'jsonocel':
+                    writer = OcelJsonWriter(exit_stack.enter_context(open_xes_file(file_path)))
+                elif export_format == 'parquet':
+                    writer = ParquetWriter(file_path)
+                else:
+                    writer = OcelSqliteWriter(file_path)
+                self.writers.append(exit_stack.enter_context(writer))
+            # The writers are closed by close, unless one of them could not be created.
+            self._exit_stack = exit_stack.pop_all()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def traces(self):
+        return self.writers[0].traces if self.writers else 0
+
+    def write_trace(self, trace_id, activities):
+        for writer in self.writers:
+            writer.write_trace(trace_id, activities)
+
+    def write_log_dic(self, log_dic):
+        for trace_id, activities in log_dic.items():
+            self.write_trace(trace_id, activities)
+
+    def close(self):
+        self._exit_stack.close()
+
+
+def export_format_of(file_path):
+    '''
+        export_format_of returns the format of file_path by its extension (see EXPORT_FORMATS), e.g. 'parquet'.
+        An exception is raised for an unknown extension.
+    '''
+    for extension, export_format in sorted(EXPORT_FORMATS.items(), key=lambda item: -len(item[0])):
+        if file_path.endswith(extension):
+            return export_format
+    raise Exception(f'Unknown export format of {file_path}, use one of {", ".join(EXPORT_FORMATS)}!')
+
+
+def write_event_logs_from_log_dic(log_dic, file_paths, process_name="Incident Management Process"):
+    '''
+        write_event_logs_from_log_dic writes log_dic to every file in file_paths in one pass (see EventLogExporter).
+
+        Returns:
+            The number of written traces.
+    '''
+    with EventLogExporter(file_paths, process_name) as exporter:
+        exporter.write_log_dic(log_dic)
+    return exporter.traces
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('ParquetWriter needs pyarrow, install it with: pip install pyarrow')
+    return pyarrow
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
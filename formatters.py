@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+
+
+BLOCK_QUANTITIES = {
+    'baseFeePerGas', 'difficulty', 'gasLimit', 'gasUsed', 'number', 'size', 'timestamp', 'totalDifficulty'}
+BLOCK_BYTES = {
+    'extraData', 'hash', 'logsBloom', 'mixHash', 'nonce', 'parentHash', 'receiptsRoot', 'sha3Uncles',
+    'stateRoot', 'transactionsRoot'}
+BLOCK_ADDRESSES = {'miner'}
+
+TRANSACTION_QUANTITIES = {
+    'blockNumber', 'chainId', 'gas', 'gasPrice', 'maxFeePerGas', 'maxPriorityFeePerGas', 'nonce',
+    'transactionIndex', 'type', 'v', 'value'}
+TRANSACTION_BYTES = {'blockHash', 'hash', 'r', 's'}
+TRANSACTION_ADDRESSES = {'from', 'to'}
+
+RECEIPT_QUANTITIES = {
+    'blockNumber', 'cumulativeGasUsed', 'effectiveGasPrice', 'gasUsed', 'status', 'transactionIndex', 'type'}
+RECEIPT_BYTES = {'blockHash', 'logsBloom', 'root', 'transactionHash'}
+RECEIPT_ADDRESSES = {'contractAddress', 'from', 'to'}
+
+
+def format_block(block):
+    '''
+        format_block converts a block as it is returned by an Ethereum node in JSON into the
+        representation of web3, i.e. quantities become integers, hashes become HexBytes, and addresses
+        are checksummed. This is the inverse of block_to_json, and allows raw JSON-RPC responses to be
+        processed by the same functions as the blocks returned by eth.getBlock.
+
+        Argument:
+            block (dictionary): A block as JSON, with or without full transactions.
+
+        Returns:
+            An AttributeDict that describes the block, or None if block is None.
+    '''
+    if block is None:
+        return None
+
+    formatted_block = _format(block, BLOCK_QUANTITIES, BLOCK_BYTES, BLOCK_ADDRESSES)
+    formatted_block['uncles'] = [HexBytes(uncle) for uncle in block.get('uncles', [])]
+    formatted_block['transactions'] = [
+        format_transaction(transaction) if isinstance(transaction, dict) else HexBytes(transaction)
+        for transaction in block.get('transactions', [])]
+    return AttributeDict(formatted_block)
+
+
+def format_transaction(transaction):
+    '''
+        format_transaction converts a transaction as it is returned by an Ethereum node in JSON into the
+        representation of web3 (see format_block).
+
+        Argument:
+            transaction (dictionary): A transaction as JSON.
+
+        Returns:
+            An AttributeDict that describes the transaction, or None if transaction is None.
+    '''
+    if transaction is None:
+        return None
+    return AttributeDict(_format(transaction, TRANSACTION_QUANTITIES, TRANSACTION_BYTES, TRANSACTION_ADDRESSES))
+
+
+def format_receipt(receipt):
+    '''
+        format_receipt converts a transaction receipt as it is returned by an Ethereum node in JSON into the
+        representation of web3 (see format_block). The logs are kept as JSON.
+
+        Argument:
+            receipt (dictionary): A transaction receipt as JSON.
+
+        Returns:
+            An AttributeDict that describes the receipt, or None if receipt is None.
+    '''
+    if receipt is None:
+        return None
+    return AttributeDict(_format(receipt, RECEIPT_QUANTITIES, RECEIPT_BYTES, RECEIPT_ADDRESSES))
+
+
+def _format(value, quantities, byte_strings, addresses):
+    formatted = {}
+    for key, item in value.items():
+        if item is None:
+            formatted[key] = None
+        elif key in quantities:
+            formatted[key] = int(item, 16)
+        elif key in byte_strings:
+            formatted[key] = HexBytes(item)
+        elif key in addresses:
+            formatted[key] = Web3.toChecksumAddress(item)
+        else:
+            formatted[key] = item
+    return formatted
+
+
+def block_to_json(block):
+    '''
+        block_to_json converts a block as it is returned by web3 (an AttributeDict with integers and
+        HexBytes) into the plain JSON representation that an Ethereum node returns for
+        eth_getBlockByNumber, i.e. integers become hex encoded quantities and bytes become hex strings.
+
+        Argument:
+            block (AttributeDict): A block, with or without full transactions.
+
+        Returns:
+            A dictionary that can be serialized with json.dumps.
+
+        Example:
+            >> block_to_json({'number': 1196605, 'hash': HexBytes('0xada5...')})
+            {'number': '0x12423d', 'hash': '0xada5...'}
+    '''
+    return _to_json(block)
+
+
+def _to_json(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return hex(value)
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    if hasattr(value, 'items'):
+        return {key: _to_json(item) for key, item in value.items()}
+    return value
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import time
+
+from . import utils
+from .selector_registry import create_matcher
+from .xes_writer import XesWriter, open_xes_file
+
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointedExtractor(object):
+    '''
+        CheckpointedExtractor extracts the log from a block range in chunks and saves a checkpoint after every
+        chunk. The activities of every chunk are appended to a JSON lines file next to the checkpoint, and the
+        checkpoint itself only holds the number of the next block to process, the hashes of the most recent
+        blocks, and the length of the activities file. Saving a checkpoint therefore costs the same at block
+        80,000 as at block 1,000. A new extractor with the same checkpoint_path resumes exactly where the
+        previous one stopped, e.g. after a failure on block 80,000 of 100,000.
+
+        A block that cannot be retrieved is never skipped: the checkpoint stays at the first failed block,
+        so the next run or poll retrieves it again.
+
+        follow keeps the log current: it polls the node for new blocks, appends only the new activities,
+        and rolls back the activities of blocks that were orphaned by a reorganisation of the chain.
+
+        Example:
+            >> extractor = CheckpointedExtractor(activities_dictionary, http_provider, 'extraction.json')
+            >> extractor.run(from_block=1196000, to_block=1300000)
+            >> extractor.follow(poll_interval=15, on_new_activities=print)
+    '''
+
+    def __init__(
+        self,
+        activities_dictionary,
+        http_provider,
+        checkpoint_path='extraction_checkpoint.json',
+        reorg_depth=64,
+        chunk_size=1000,
+        **fetch_kwargs):
+        '''
+            Arguments:
+                activities_dictionary (dictionary): A dictionary where the keys are function selectors.
+                http_provider (w3 object): A w3 object that has established a connection to a blockchain node.
+                checkpoint_path (string): The path to the checkpoint file. It is loaded if it exists. The
+                    activities are stored in the file checkpoint_path with the extension .activities.jsonl.
+                reorg_depth (int): The number of most recent blocks whose hashes are kept to detect reorganisations.
+                chunk_size (int): The number of blocks that are processed between two checkpoints.
+                fetch_kwargs: max_in_flight, batch_size, errors, and block_cache (see
+                    get_activity_transactions_from_block_numbers). If errors is a list, the blocks that could
+                    not be retrieved are appended and run stops before the first of them. Otherwise, the
+                    error is raised.
+        '''
+        self.activities_dictionary = activities_dictionary
+        self.http_provider = http_provider
+        self.checkpoint_path = checkpoint_path
+        self.activities_path = os.path.splitext(checkpoint_path)[0] + '.activities.jsonl'
+        self.reorg_depth = reorg_depth
+        self.chunk_size = chunk_size
+        self.errors = fetch_kwargs.pop('errors', None)
+        self.fetch_kwargs = fetch_kwargs
+
+        self.next_block = None
+        self.block_hashes = {}
+        # The length of the activities file before the activities of each of the most recent blocks, i.e. a
+        # rollback truncates the file instead of rewriting it.
+        self.block_offsets = {}
+        self.activities_size = 0
+        self.log_dic = {}
+
+        if os.path.exists(checkpoint_path):
+            self.load_checkpoint()
+
+    def run(self, from_block, to_block, on_new_activities=None):
+        '''
+            Processes the blocks from from_block (or the block after the checkpoint, whichever is later) to
+            to_block, and saves a checkpoint after every chunk. If a block cannot be retrieved, the blocks
+            before it are saved, and run stops (errors given) or raises the error.
+
+            Arguments:
+                from_block (int): The first block of the range. Ignored if a checkpoint exists.
+                to_block (int): The last block of the range.
+                on_new_activities (callable): Called with the list of new (trace_id, activity) tuples of every chunk.
+
+            Returns:
+                The number of new activities.
+        '''
+        if self.next_block is None:
+            self.next_block = from_block
+
+        new_activities = 0
+        while self.next_block <= to_block:
+            chunk_end = min(self.next_block + self.chunk_size - 1, to_block)
+            blocks, errors = self._process_blocks(range(self.next_block, chunk_end + 1))
+            failed_block = min(block_number for block_number, _ in errors) if errors else None
+
+            # The blocks from the first failed block onwards are processed again with the next run.
+            blocks = [block for block in blocks if failed_block is None or block[0] < failed_block]
+            activities = self._append_blocks(blocks)
+            self.next_block = chunk_end + 1 if failed_block is None else failed_block
+            self.save_checkpoint()
+            logger.info(f'Processed blocks up to {self.next_block - 1}, {len(activities)} new activities.')
+
+            new_activities += len(activities)
+            if activities and on_new_activities:
+                on_new_activities(activities)
+
+            if errors:
+                if self.errors is None:
+                    raise errors[0][1]
+                self.errors.extend(errors)
+                logger.warning(f'Block {failed_block} could not be retrieved, the extraction stops before it.')
+                break
+
+        return new_activities
+
+    def follow(self, poll_interval=15, confirmations=0, on_new_activities=None, on_rollback=None, max_polls=None):
+        '''
+            Polls the node every poll_interval seconds for new blocks and processes them (see run). Before new
+            blocks are processed, the hashes of the most recent processed blocks are compared with the chain;
+            if they differ, the activities from the first orphaned block onwards are rolled back and
+            the blocks are processed again.
+
+            Arguments:
+                poll_interval (float): The number of seconds between two polls.
+                confirmations (int): The number of blocks a block must be below the head before it is processed.
+                on_new_activities (callable): Called with the list of new (trace_id, activity) tuples.
+                on_rollback (callable): Called with the number of the first orphaned block.
+                max_polls (int): Stop after max_polls polls. None follows the chain forever.
+        '''
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            fork_block = self.find_fork_block()
+            if fork_block is not None:
+                self.rollback(fork_block)
+                if on_rollback:
+                    on_rollback(fork_block)
+
+            head = self.http_provider.eth.blockNumber - confirmations
+            if self.next_block is None:
+                self.next_block = head
+            self.run(self.next_block, head, on_new_activities)
+
+            polls += 1
+            if max_polls is None or polls < max_polls:
+                time.sleep(poll_interval)
+
+    def find_fork_block(self):
+        '''
+            Returns the number of the first processed block whose hash differs from the hash on the chain,
+            or None if the recent blocks are unchanged. A block that is no longer on the chain, e.g. because
+            the new chain is shorter, is orphaned as well.
+
+            Raises:
+                The JsonRpcError of the first header that could not be retrieved, if no earlier block differs.
+        '''
+        if not self.block_hashes:
+            return None
+
+        block_numbers = sorted(self.block_hashes)
+        rpc_client = utils.create_rpc_batch_client(self.http_provider, batch_size=len(block_numbers))
+        headers = rpc_client.batch_call(
+            'eth_getBlockByNumber', [[hex(block_number), False] for block_number in block_numbers])
+        for block_number, header in zip(block_numbers, headers):
+            if isinstance(header, Exception):
+                # A failed request says nothing about the chain, so it must not trigger a rollback.
+                raise header
+            if header is None or header["hash"] != self.block_hashes[block_number]:
+                return block_number
+        return None
+
+    def rollback(self, fork_block):
+        '''
+            Removes the activities of the blocks from fork_block onwards, and processes them again with the next run.
+        '''
+        logger.warning(f'Reorganisation detected, rolling back to block {fork_block}.')
+        for trace_id in list(self.log_dic):
+            self.log_dic[trace_id] = [
+                activity for activity in self.log_dic[trace_id] if activity["instance_id_block_no"] < fork_block]
+            if not self.log_dic[trace_id]:
+                del self.log_dic[trace_id]
+
+        # The activities are appended in block order, so the ones of the orphaned blocks are the end of the file.
+        self.activities_size = self.block_offsets.get(fork_block, self.activities_size)
+        self.block_hashes = {
+            block_number: block_hash for block_number, block_hash in self.block_hashes.items()
+            if block_number < fork_block}
+        self.block_offsets = {
+            block_number: offset for block_number, offset in self.block_offsets.items() if block_number < fork_block}
+        self.next_block = min(self.next_block, fork_block)
+        self.save_checkpoint()
+
+    def write_xes_log(self, path='./', file_name='automatic_incident_management',
+                      process_name="Incident Management Process", compress=False):
+        '''
+            Writes the activities extracted so far as XES log (see xes_writer.write_xes_log_from_log_dic).
+        '''
+        file_path = f'{path}{file_name}.xes' + ('.gz' if compress else '')
+        with open_xes_file(file_path) as file, XesWriter(file, process_name) as writer:
+            writer.write_log_dic(utils.sort_log_dic_by_time(self.log_dic))
+        return file_path
+
+    def save_checkpoint(self):
+        checkpoint = {
+            'next_block': self.next_block,
+            'block_hashes': self.block_hashes,
+            'block_offsets': self.block_offsets,
+            'activities_size': self.activities_size,
+        }
+
+        # Replace the checkpoint atomically, so that a crash while writing keeps the previous checkpoint.
+        temporary_path = f'{self.checkpoint_path}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def load_checkpoint(self):
+        with open(self.checkpoint_path) as file:
+            checkpoint = json.load(file)
+
+        self.next_block = checkpoint['next_block']
+        self.block_hashes = {
+            int(block_number): block_hash for block_number, block_hash in checkpoint['block_hashes'].items()}
+        self.block_offsets = {
+            int(block_number): offset for block_number, offset in checkpoint['block_offsets'].items()}
+        self.activities_size = checkpoint['activities_size']
+
+        # Activities that were appended after the checkpoint, i.e. before a crash, are ignored.
+        self.log_dic = {}
+        if self.activities_size:
+            with open(self.activities_path, 'rb') as file:
+                lines = file.read(self.activities_size).splitlines()
+            for line in lines:
+                trace_id, activity = json.loads(line)
+                self.log_dic.setdefault(trace_id, []).append(utils.activity_from_json(activity))
+
+    def _process_blocks(self, block_numbers):
+        errors = []
+        blocks = []
+        match = create_matcher(self.activities_dictionary)
+        for block_number, block in utils.iter_blocks(
+                block_numbers, self.http_provider, errors=errors, **self.fetch_kwargs):
+            activities = [
+                utils.create_activity_from_activity_transaction(
+                    activity_transaction, self.activities_dictionary, decode_arguments=False)
+                for activity_transaction in utils.get_activity_transactions_from_block(
+                    self.activities_dictionary, block, match)]
+            utils.add_decoded_arguments([activity for _, activity in activities], self.activities_dictionary)
+            blocks.append((block_number, _hash_to_hex(block["hash"]), activities))
+        return blocks, errors
+
+    def _append_blocks(self, blocks):
+        activities = []
+        with open(self.activities_path, 'ab') as file:
+            # Drops the activities that were appended after the last checkpoint.
+            file.truncate(self.activities_size)
+            for block_number, block_hash, block_activities in blocks:
+                self.block_hashes[block_number] = block_hash
+                self.block_offsets[block_number] = self.activities_size
+                lines = b''.join(
+                    json.dumps([trace_id, utils.activity_to_json(activity)]).encode() + b'\n'
+                    for trace_id, activity in block_activities)
+                file.write(lines)
+                self.activities_size += len(lines)
+
+                for trace_id, activity in block_activities:
+                    self.log_dic.setdefault(trace_id, []).append(activity)
+                activities.extend(block_activities)
+
+        for block_number in sorted(self.block_hashes)[:-self.reorg_depth or None]:
+            del self.block_hashes[block_number]
+            self.block_offsets.pop(block_number, None)
+        return activities
+
+
+def _hash_to_hex(block_hash):
+    return '0x' + bytes(block_hash).hex()
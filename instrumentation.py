@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import contextlib
+import cProfile
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+logger = logging.getLogger(__name__)
+
+# The listeners that receive the counts and the stage timings. Without listeners, count and stage return
+# immediately, i.e. the instrumentation costs one function call and one check.
+_listeners = []
+# The stages that are profiled, mapped to the profile settings (see capture_profile).
+_profiled_stages = {}
+_null_context = contextlib.nullcontext()
+
+
+def add_listener(listener):
+    '''
+        add_listener registers listener, i.e. an object with the methods count(name, value) and
+        timing(name, seconds), e.g. Metrics, ProgressReporter, or JsonLinesExporter.
+
+        Returns:
+            The listener.
+    '''
+    _listeners.append(listener)
+    return listener
+
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def count(name, value=1):
+    '''
+        count increases the counter name by value, e.g. count('rpc_bytes_received', len(response.content)).
+    '''
+    if not _listeners:
+        return
+    for listener in _listeners:
+        listener.count(name, value)
+
+
+def stage(name):
+    '''
+        stage returns a context manager that measures the duration of the stage name, and profiles it if
+        capture_profile was called for the stage.
+
+        Example:
+            >> with instrumentation.stage('create_log_dictionary'):
+            ..     log_dic = create_log_dictionary_from_activity_transactions(...)
+    '''
+    if not _listeners and not _profiled_stages:
+        return _null_context
+    return _Stage(name)
+
+
+def staged(name):
+    '''
+        staged is a decorator that runs the decorated function as the stage name (see stage).
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _Stage(object):
+
+    def __init__(self, name):
+        self.name = name
+        self._profile = None
+        self._settings = None
+
+    def __enter__(self):
+        # The settings are kept until __exit__, because stop_profile may be called while the stage runs.
+        self._settings = settings = _profiled_stages.get(self.name)
+        if settings is not None:
+            if settings['profile_path']:
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+            if settings['trace_memory']:
+                tracemalloc.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self._start
+        for listener in _listeners:
+            listener.timing(self.name, seconds)
+
+        settings = self._settings
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(settings['profile_path'])
+            logger.info(f'Profile of stage {self.name} written to {settings["profile_path"]}.')
+        if settings is not None and settings['trace_memory'] and tracemalloc.is_tracing():
+            settings['memory_peak'] = tracemalloc.get_traced_memory()[1]
+            settings['memory_statistics'] = tracemalloc.take_snapshot().statistics('lineno')[:settings['top']]
+            tracemalloc.stop()
+            logger.info(f'Peak memory of stage {self.name}: {settings["memory_peak"]} bytes.')
+
+
+def capture_profile(stage_name, profile_path=None, trace_memory=False, top=20):
+    '''
+        capture_profile profiles the next runs of the stage stage_name, e.g. 'write_xes_log'. With profile_path,
+        the stage runs under cProfile and the statistics are written to profile_path (read them with pstats).
+        With trace_memory, the allocations are traced with tracemalloc; the peak and the top allocation
+        sites are available from the returned dictionary after the stage.
+
+        Returns:
+            A dictionary with the settings, and after the stage the keys memory_peak and memory_statistics.
+            Call stop_profile(stage_name) to stop profiling.
+    '''
+    settings = {'profile_path': profile_path, 'trace_memory': trace_memory, 'top': top}
+    _profiled_stages[stage_name] = settings
+    return settings
+
+
+def stop_profile(stage_name):
+    _profiled_stages.pop(stage_name, None)
+
+
+class Metrics(object):
+    '''
+        Metrics collects the counters and the stage timings, and exports them in the Prometheus text format or
+        as dictionary. The counters include:
+            rpc_requests, rpc_calls, rpc_retries, rpc_throttled, rpc_bytes_sent, rpc_bytes_received,
+            cache_hits, cache_misses, blocks_scanned, transactions_scanned, transactions_matched, events_serialized.
+
+        Example:
+            >> metrics = instrumentation.add_listener(instrumentation.Metrics())
+            >> activity_transactions = get_activity_transactions_from_block_numbers(...)
+            >> print(metrics.to_prometheus())
+    '''
+
+    def __init__(self, prefix='event_log_extraction'):
+        self.prefix = prefix
+        self.counters = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def timing(self, name, seconds):
+        with self._lock:
+            total, runs = self.timings.get(name, (0.0, 0))
+            self.timings[name] = (total + seconds, runs + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'stages': {name: {'seconds': total, 'runs': runs} for name, (total, runs) in self.timings.items()}
+            }
+
+    def to_prometheus(self):
+        lines = []
+        snapshot = self.snapshot()
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE {self.prefix}_{name}_total counter')
+            lines.append(f'{self.prefix}_{name}_total {value}')
+        lines.append(f'# TYPE {self.prefix}_stage_seconds_total counter')
+        for name, stage_timing in sorted(snapshot['stages'].items()):
+            lines.append(f'{self.prefix}_stage_seconds_total{{stage="{name}"}} {stage_timing["seconds"]}')
+        lines.append(f'# TYPE {self.prefix}_stage_runs_total counter')
+        for name, stage_timing in sorted(snapshot['stages'].items()):
+            lines.append(f'{self.prefix}_stage_runs_total{{stage="{name}"}} {stage_timing["runs"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        '''
+            Writes the metrics to path, e.g. for the textfile collector of the Prometheus node exporter.
+        '''
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w') as file:
+            file.write(self.to_prometheus())
+        os.replace(temporary_path, path)
+
+
+class JsonLinesExporter(object):
+    '''
+        JsonLinesExporter writes a snapshot of metrics (see Metrics) as one JSON line to file every interval
+        seconds and at the end of every stage, e.g. to track a long extraction with jq or a log collector.
+    '''
+
+    def __init__(self, metrics, file=sys.stderr, interval=10):
+        self.metrics = metrics
+        self.file = file
+        self.interval = interval
+        self._last_export = time.monotonic()
+
+    def count(self, name, value):
+        if time.monotonic() - self._last_export >= self.interval:
+            self.export()
+
+    def timing(self, name, seconds):
+        self.export(stage=name)
+
+    def export(self, **fields):
+        self._last_export = time.monotonic()
+        self.file.write(json.dumps(dict(time=time.time(), **fields, **self.metrics.snapshot())) + "\n")
+        self.file.flush()
+
+
+class ProgressReporter(object):
+    '''
+        ProgressReporter prints the progress of an extraction, i.e. the scanned blocks, the rate, the estimated
+        time of arrival, the matched transactions, and the RPC requests, at most every interval seconds.
+
+        Example:
+            >> instrumentation.add_listener(instrumentation.ProgressReporter(total_blocks=len(block_numbers)))
+            >> activity_transactions = get_activity_transactions_from_block_numbers(...)
+            blocks 1200/224000 (0.5%), 240.1 blocks/s, ETA 0:15:28, 36 matched, 13 requests, 0 retries
+    '''
+
+    def __init__(self, total_blocks=None, interval=5, file=sys.stderr):
+        self.total_blocks = total_blocks
+        self.interval = interval
+        self.file = file
+        self.counters = {}
+        self._start = time.monotonic()
+        self._last_report = self._start
+        self._lock = threading.Lock()
+
+    def count(self, name, value):
+        now = time.monotonic()
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            if now - self._last_report < self.interval:
+                return
+            self._last_report = now
+        self.report(now)
+
+    def timing(self, name, seconds):
+        pass
+
+    def report(self, now=None):
+        now = now or time.monotonic()
+        with self._lock:
+            counters = dict(self.counters)
+        blocks = counters.get('blocks_scanned', 0)
+        rate = blocks / max(now - self._start, 1e-9)
+
+        progress = f'blocks {blocks}'
+        if self.total_blocks:
+            progress += f'/{self.total_blocks} ({100 * blocks / self.total_blocks:.1f}%)'
+        progress += f', {rate:.1f} blocks/s'
+        if self.total_blocks and rate > 0:
+            remaining_seconds = int((self.total_blocks - blocks) / rate)
+            progress += f', ETA {remaining_seconds // 3600}:{remaining_seconds // 60 % 60:02}:{remaining_seconds % 60:02}'
+        progress += (f', {counters.get("transactions_matched", 0)} matched'
+                     f', {counters.get("rpc_requests", 0)} requests'
+                     f', {counters.get("rpc_retries", 0)} retries')
+        if counters.get('rpc_throttled'):
+            progress += f', {counters["rpc_throttled"]} throttled'
+        self.file.write(progress + "\n")
+        self.file.flush()
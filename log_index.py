@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import sqlite3
+from datetime import datetime
+
+from .utils import activity_from_json, activity_to_json
+
+
+# The indexes of the events table. They are dropped during bulk loads (see LogIndex.add_log_dic).
+EVENT_INDEXES = {
+    'events_trace': 'events (trace_key, time, block)',
+    'events_activity': 'events (activity_key, block)',
+    # Covers the durations between activities.
+    'events_activity_trace': 'events (activity_key, trace_key, time)',
+    'events_sender': 'events (sender_key, block)',
+    'events_block': 'events (block)',
+    'events_time': 'events (time)',
+}
+
+
+class LogIndex(object):
+    '''
+        LogIndex stores the events of log dictionaries in a local SQLite database with indexes on the trace id,
+        the activity (function selector and name), the resource, the sender, the block number, and the time stamp.
+        Questions about an extracted log, e.g. which traces a resource touched between two blocks, are then
+        answered by index lookups instead of loading and scanning the whole log. The trace variants are computed
+        when the events are added, so variant queries only group the traces.
+
+        All queries take the same filters (see query_traces): activities (names or function selectors), resources,
+        senders, trace_ids, from_block, to_block, from_time, and to_time.
+
+        Example:
+            >> log_index = LogIndex('log.index.sqlite')
+            >> log_index.add_log_dic(log_dic)
+            >> log_index.query_traces(resources=['2nd Level Support'], from_block=1196184, to_block=1196500)
+            >> log_index.variants(trace_ids=['i0x00040F28dAE5496E2Aa7069Ee522291454f9428F'])
+            >> write_event_logs_from_log_dic(log_index.sub_log(senders=[address]), ['sub_log.xes'])
+    '''
+
+    def __init__(self, path='log.index.sqlite', cache_kilobytes=256 * 1024):
+        '''
+            Arguments:
+                path (string): The path to the SQLite database. It is created if it does not exist.
+                cache_kilobytes (int): The size of the SQLite page cache in kilobytes.
+        '''
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(f'PRAGMA cache_size={-cache_kilobytes}')
+        self._connection.executescript(
+            'CREATE TABLE IF NOT EXISTS activities ('
+            'activity_key INTEGER PRIMARY KEY, selector TEXT NOT NULL, name TEXT NOT NULL, resource TEXT NOT NULL, '
+            'UNIQUE (selector, name, resource));'
+            'CREATE TABLE IF NOT EXISTS senders (sender_key INTEGER PRIMARY KEY, address TEXT NOT NULL UNIQUE);'
+            'CREATE TABLE IF NOT EXISTS variants (variant_key INTEGER PRIMARY KEY, activity_keys TEXT NOT NULL UNIQUE);'
+            'CREATE TABLE IF NOT EXISTS traces ('
+            'trace_key INTEGER PRIMARY KEY, trace_id TEXT NOT NULL UNIQUE, variant_key INTEGER, '
+            'events INTEGER, start_time REAL, end_time REAL, start_block INTEGER, end_block INTEGER);'
+            'CREATE TABLE IF NOT EXISTS events ('
+            'event_key INTEGER PRIMARY KEY, instance_id TEXT NOT NULL UNIQUE, trace_key INTEGER NOT NULL, '
+            'activity_key INTEGER NOT NULL, sender_key INTEGER NOT NULL, time REAL NOT NULL, block INTEGER NOT NULL, '
+            'activity TEXT NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS activities_name ON activities (name);'
+            'CREATE INDEX IF NOT EXISTS activities_resource ON activities (resource);'
+            'CREATE INDEX IF NOT EXISTS traces_variant ON traces (variant_key);')
+        self._create_event_indexes()
+        self._connection.commit()
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+    def add_log_dic(self, log_dic):
+        '''
+            Adds the events of log_dic (see create_log_dictionary_from_activity_transactions). Events that are already
+            in the index, i.e. with the same instance id, are skipped, and the activities of a trace that is already in
+            the index are added to it, e.g. when the log of the next block range is added. Several LogIndex objects,
+            e.g. in several processes, can add to the same database.
+
+            Returns:
+                The number of added events.
+        '''
+        connection = self._connection
+        events_before = len(self)
+        touched_trace_keys = []
+        # The keys are only cached during one call, because another LogIndex on the same database may add rows.
+        # Rows are never deleted, so a key stays valid while the call runs.
+        activity_keys, sender_keys = {}, {}
+
+        # Building the indexes once after a bulk load is much faster than updating them for every event.
+        bulk_load = sum(len(activities) for activities in log_dic.values()) > events_before
+        with connection:
+            if bulk_load:
+                for index in EVENT_INDEXES:
+                    connection.execute(f'DROP INDEX IF EXISTS {index}')
+            for trace_id, activities in log_dic.items():
+                trace_key = self._insert_key('traces', 'trace_key', ('trace_id',), (trace_id,))
+                touched_trace_keys.append(trace_key)
+
+                connection.executemany(
+                    'INSERT OR IGNORE INTO events (instance_id, trace_key, activity_key, sender_key, time, block, activity) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(activity["instance_id"], trace_key, self._activity_key(activity, activity_keys),
+                      self._sender_key(activity["instance_id_from"], sender_keys), activity["instance_id_time_stamp"].timestamp(),
+                      int(activity["instance_id_block_no"]), json.dumps(activity_to_json(activity)))
+                     for activity in activities])
+
+            if bulk_load:
+                self._create_event_indexes()
+            self._update_traces(touched_trace_keys)
+
+        return len(self) - events_before
+
+    def query_traces(self, **filters):
+        '''
+            Returns the ids of the traces with at least one event that matches all filters, ordered by the start of
+            the trace.
+
+            Arguments:
+                activities (list): Activity names or function selectors.
+                resources (list): Resources of the activities.
+                senders (list): Addresses that sent the transactions.
+                trace_ids (list): Trace ids, i.e. "i" followed by the address of the process instance contract.
+                from_block, to_block (int): The block range, including both ends.
+                from_time, to_time (datetime or float): The time range as datetimes or POSIX timestamps, including
+                    both ends.
+        '''
+        where, parameters = self._where(filters)
+        return [row[0] for row in self._connection.execute(
+            f'SELECT trace_id FROM traces WHERE trace_key IN (SELECT trace_key FROM events WHERE {where}) '
+            'ORDER BY start_time, trace_key', parameters)]
+
+    def sub_log(self, whole_traces=True, **filters):
+        '''
+            Returns the sub-log that matches filters (see query_traces) as log dictionary, e.g. to write it with
+            exporters.write_event_logs_from_log_dic.
+
+            Arguments:
+                whole_traces (bool): Whether the traces of the matching events are returned with all their events.
+                    Otherwise, only the matching events are returned.
+
+            Returns:
+                A dictionary where the keys are the trace ids and the value is a list of activities sorted by time.
+        '''
+        where, parameters = self._where(filters)
+        if whole_traces:
+            where = f'events.trace_key IN (SELECT trace_key FROM events WHERE {where})'
+
+        log_dic = {}
+        for trace_id, activity in self._connection.execute(
+                'SELECT traces.trace_id, events.activity FROM events JOIN traces ON traces.trace_key = events.trace_key '
+                f'WHERE {where} ORDER BY traces.start_time, traces.trace_key, events.time, events.block, events.event_key',
+                parameters):
+            log_dic.setdefault(trace_id, []).append(activity_from_json(json.loads(activity)))
+        return log_dic
+
+    def variants(self, **filters):
+        '''
+            Returns the trace variants of the traces that match filters (see query_traces), i.e. the distinct
+            sequences of activity names, with the number of traces of each variant, the most frequent first.
+
+            Returns:
+                A list of (activity names tuple, number of traces) tuples.
+        '''
+        names = dict(self._connection.execute('SELECT activity_key, name FROM activities'))
+        trace_filter, parameters = '', []
+        if filters:
+            where, parameters = self._where(filters)
+            trace_filter = f'WHERE traces.trace_key IN (SELECT trace_key FROM events WHERE {where}) '
+
+        return [
+            (tuple(names[int(activity_key)] for activity_key in activity_keys.split(',')), traces)
+            for activity_keys, traces in self._connection.execute(
+                'SELECT variants.activity_keys, COUNT(*) AS traces FROM traces '
+                f'JOIN variants ON variants.variant_key = traces.variant_key {trace_filter}'
+                'GROUP BY traces.variant_key ORDER BY traces DESC, variants.variant_key', parameters)]
+
+    def activity_counts(self, **filters):
+        '''
+            Returns the number of events of every activity that match filters (see query_traces).
+
+            Returns:
+                A dictionary where the keys are the activity names and the values are the numbers of events,
+                the most frequent first.
+        '''
+        where, parameters = self._where(filters)
+        return dict(self._connection.execute(
+            'SELECT activities.name, COUNT(*) AS events FROM events '
+            'JOIN activities ON activities.activity_key = events.activity_key '
+            f'WHERE {where} GROUP BY activities.name ORDER BY events DESC, activities.name', parameters))
+
+    def durations(self, from_activity, to_activity, **filters):
+        '''
+            Returns for every trace the time from its first event of from_activity to the first event of to_activity
+            that is not earlier. Traces without such a pair are left out. The filters (see query_traces) select
+            the traces.
+
+            Arguments:
+                from_activity, to_activity (string): Activity names or function selectors.
+
+            Returns:
+                A dictionary where the keys are the trace ids and the values are the durations in seconds.
+        '''
+        from_keys = self._activity_keys_of([from_activity])
+        to_keys = self._activity_keys_of([to_activity])
+        trace_filter, parameters = '', []
+        if filters:
+            where, parameters = self._where(filters)
+            trace_filter = f'AND trace_key IN (SELECT trace_key FROM events WHERE {where}) '
+
+        return dict(self._connection.execute(
+            'SELECT traces.trace_id, MIN(events.time) - starts.time FROM ('
+            f'SELECT trace_key, MIN(time) AS time FROM events WHERE activity_key IN ({_placeholders(from_keys)}) '
+            f'{trace_filter}GROUP BY trace_key) AS starts '
+            'JOIN events ON events.trace_key = starts.trace_key AND events.time >= starts.time '
+            f'AND events.activity_key IN ({_placeholders(to_keys)}) '
+            'JOIN traces ON traces.trace_key = starts.trace_key '
+            'GROUP BY starts.trace_key ORDER BY traces.start_time, starts.trace_key',
+            from_keys + parameters + to_keys))
+
+    def _create_event_indexes(self):
+        for index, columns in EVENT_INDEXES.items():
+            self._connection.execute(f'CREATE INDEX IF NOT EXISTS {index} ON {columns}')
+
+    def _activity_key(self, activity, activity_keys):
+        key = (activity["id"], activity["name"], activity["name_resource"])
+        activity_key = activity_keys.get(key)
+        if activity_key is None:
+            activity_key = activity_keys[key] = self._insert_key(
+                'activities', 'activity_key', ('selector', 'name', 'resource'), key)
+        return activity_key
+
+    def _sender_key(self, address, sender_keys):
+        sender_key = sender_keys.get(address)
+        if sender_key is None:
+            sender_key = sender_keys[address] = self._insert_key('senders', 'sender_key', ('address',), (address,))
+        return sender_key
+
+    def _insert_key(self, table, key_column, columns, values):
+        # INSERT OR IGNORE followed by SELECT also returns the key of a row that another LogIndex inserted.
+        self._connection.execute(
+            f'INSERT OR IGNORE INTO {table} ({", ".join(columns)}) VALUES ({_placeholders(values)})', values)
+        return self._connection.execute(
+            f'SELECT {key_column} FROM {table} WHERE {" AND ".join(f"{column} = ?" for column in columns)}',
+            values).fetchone()[0]
+
+    def _activity_keys_of(self, activities):
+        activities = list(activities)
+        return [row[0] for row in self._connection.execute(
+            f'SELECT activity_key FROM activities WHERE selector IN ({_placeholders(activities)}) '
+            f'OR name IN ({_placeholders(activities)})', activities + activities)]
+
+    def _update_traces(self, trace_keys):
+        # The variant and the range of a trace change if events were added to it.
+        for start in range(0, len(trace_keys), 500):
+            chunk = trace_keys[start:start + 500]
+            sequences = {}
+            for trace_key, activity_key in self._connection.execute(
+                    f'SELECT trace_key, activity_key FROM events WHERE trace_key IN ({_placeholders(chunk)}) '
+                    'ORDER BY trace_key, time, block, event_key', chunk):
+                sequences.setdefault(trace_key, []).append(str(activity_key))
+
+            variant_keys = []
+            for trace_key, sequence in sequences.items():
+                variant_key = self._insert_key('variants', 'variant_key', ('activity_keys',), (",".join(sequence),))
+                variant_keys.append((variant_key, trace_key))
+
+            self._connection.executemany('UPDATE traces SET variant_key = ? WHERE trace_key = ?', variant_keys)
+            self._connection.execute(
+                'UPDATE traces SET (events, start_time, end_time, start_block, end_block) = ('
+                'SELECT COUNT(*), MIN(time), MAX(time), MIN(block), MAX(block) FROM events '
+                f'WHERE events.trace_key = traces.trace_key) WHERE trace_key IN ({_placeholders(chunk)})', chunk)
+
+    def _where(self, filters):
+        '''
+            Returns the condition on the events table for filters (see query_traces) and its parameters.
+        '''
+        conditions, parameters = ['1'], []
+
+        unknown = set(filters) - {
+            'activities', 'resources', 'senders', 'trace_ids', 'from_block', 'to_block', 'from_time', 'to_time'}
+        if unknown:
+            raise Exception(f'Unknown filters {", ".join(sorted(unknown))}!')
+
+        # The keys are looked up in the database, so the filters see the rows that another LogIndex added.
+        if filters.get('activities') is not None:
+            activities = list(filters['activities'])
+            conditions.append(
+                'events.activity_key IN (SELECT activity_key FROM activities '
+                f'WHERE selector IN ({_placeholders(activities)}) OR name IN ({_placeholders(activities)}))')
+            parameters.extend(activities + activities)
+        for name, condition in (
+                ('resources', 'events.activity_key IN (SELECT activity_key FROM activities WHERE resource IN ({}))'),
+                ('senders', 'events.sender_key IN (SELECT sender_key FROM senders WHERE address IN ({}))'),
+                ('trace_ids', 'events.trace_key IN (SELECT trace_key FROM traces WHERE trace_id IN ({}))')):
+            values = filters.get(name)
+            if values is not None:
+                values = list(values)
+                conditions.append(condition.format(_placeholders(values)))
+                parameters.extend(values)
+
+        for name, condition in (
+                ('from_block', 'events.block >= ?'), ('to_block', 'events.block <= ?'),
+                ('from_time', 'events.time >= ?'), ('to_time', 'events.time <= ?')):
+            value = filters.get(name)
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value.timestamp() if isinstance(value, datetime) else value)
+
+        return " AND ".join(conditions), parameters
+
+
+def create_log_index(log_dic, path='log.index.sqlite'):
+    '''
+        create_log_index creates a LogIndex at path and adds log_dic to it.
+
+        Returns:
+            The LogIndex.
+    '''
+    log_index = LogIndex(path)
+    log_index.add_log_dic(log_dic)
+    return log_index
+
+
+def _placeholders(values):
+    # An empty IN () is valid in SQLite and matches nothing.
+    return ", ".join("?" * len(values))
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .formatters import block_to_json
+
+
+# The topic of the event that every contract of the mock node emits when it is called successfully, i.e. the
+# keccak hash of ActivityExecuted(bytes4). The data of the event is the function selector of the call.
+ACTIVITY_EVENT_TOPIC = '0x' + 'a1' * 32
+
+
+def load_blocks_from_activity_transactions(activity_transactions):
+    '''
+        load_blocks_from_activity_transactions collects the blocks that are embedded in the activity
+        transactions (for example the ones stored in activity_transactions.pickle) and converts them
+        into the JSON representation that is served by MockEthereumNode.
+
+        Argument:
+            activity_transactions (list): A list of activity transactions as returned by
+                get_activity_transactions_from_block_numbers or load_activity_transactions_from_pickle.
+
+        Returns:
+            A dictionary where the key is the block number and the value is the block as JSON.
+    '''
+    blocks = {}
+    for activity_transaction in activity_transactions:
+        block = activity_transaction["block"]
+        if block["number"] not in blocks:
+            blocks[block["number"]] = block_to_json(block)
+    return blocks
+
+
+class MockEthereumNode(object):
+    '''
+        MockEthereumNode is a local stand-in for an Ethereum JSON-RPC node. It serves the given blocks
+        over HTTP and sleeps latency seconds before answering a request, so that the extraction
+        functions can be benchmarked without a connection to a real node.
+
+        Every contract emits one event (see ACTIVITY_EVENT_TOPIC) per successful call, which is returned
+        by eth_getLogs and in the receipts. A transaction without recipient creates a contract whose
+        address is the last 20 bytes of the transaction hash.
+
+        Example:
+            >> with MockEthereumNode(blocks, latency=0.05) as node:
+            ..     http_provider = connect_to_http_provider(node.url)
+    '''
+
+    def __init__(
+        self,
+        blocks,
+        latency=0.0,
+        host='127.0.0.1',
+        port=0,
+        reverted_transactions=(),
+        byzantium_block=4370000,
+        block_receipts=True,
+        error_rate=0.0,
+        rate_limit=None,
+        latency_jitter=0.0,
+        seed=None):
+        '''
+            Arguments:
+                blocks (dictionary): A dictionary where the key is the block number and the value is
+                    the block with full transactions as JSON, e.g. from load_blocks_from_activity_transactions.
+                latency (float): The number of seconds that every HTTP request is delayed.
+                host (string): The interface the server binds to.
+                port (int): The port the server binds to. 0 picks a free port.
+                reverted_transactions (iterable): The hashes of the transactions whose receipts report a failure.
+                byzantium_block (int): Receipts of earlier blocks have a state root instead of a status, and a
+                    failed transaction uses all its gas.
+                block_receipts (bool): Whether eth_getBlockReceipts is available.
+                error_rate (float): The probability that a request fails with HTTP status 500.
+                rate_limit (float): The maximum number of requests per second. Excess requests fail with
+                    HTTP status 429 and a Retry-After header. None does not limit the requests.
+                latency_jitter (float): A random delay of up to latency_jitter seconds is added to latency.
+                seed (int): The seed of the random failures and delays.
+        '''
+        self.blocks = blocks
+        self.transactions = {
+            transaction['hash']: transaction
+            for block in blocks.values() for transaction in block['transactions']}
+        self.reverted_transactions = set(reverted_transactions)
+        self.byzantium_block = byzantium_block
+        self.block_receipts = block_receipts
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.latency_jitter = latency_jitter
+        self.failed_requests = 0
+        self.throttled_requests = 0
+        self._random = random.Random(seed)
+        self._request_times = []
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.calls = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}'
+
+    def start(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                status = node.inject_failure()
+                if status is not None:
+                    response = b'{}'
+                    self.send_response(status)
+                    if status == 429:
+                        self.send_header('Retry-After', '1')
+                else:
+                    response = node.handle(body)
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.calls = {}
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.failed_requests = 0
+            self.throttled_requests = 0
+
+    def inject_failure(self):
+        '''
+            Returns the HTTP status of an injected failure (see error_rate and rate_limit), or None.
+        '''
+        with self._lock:
+            now = time.monotonic()
+            if self.rate_limit is not None:
+                self._request_times = [
+                    request_time for request_time in self._request_times if request_time > now - 1]
+                if len(self._request_times) >= self.rate_limit:
+                    self.throttled_requests += 1
+                    return 429
+                self._request_times.append(now)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.failed_requests += 1
+                return 500
+        return None
+
+    def handle(self, body):
+        latency = self.latency
+        if self.latency_jitter:
+            with self._lock:
+                latency += self._random.uniform(0, self.latency_jitter)
+        if latency:
+            time.sleep(latency)
+
+        payload = json.loads(body)
+        if isinstance(payload, list):
+            response = [self.call(request) for request in payload]
+        else:
+            response = self.call(payload)
+        response = json.dumps(response).encode()
+
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += len(body)
+            self.bytes_sent += len(response)
+        return response
+
+    def call(self, request):
+        method = request['method']
+        params = request.get('params', [])
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        if (method.split('_')[0] not in ('eth', 'net', 'web3', 'trace') or not hasattr(self, method)
+                or (method == 'eth_getBlockReceipts' and not self.block_receipts)):
+            return {'jsonrpc': '2.0', 'id': request.get('id'),
+                    'error': {'code': -32601, 'message': f'the method {method} does not exist/is not available'}}
+        result = getattr(self, method)(*params)
+        return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+
+    def web3_clientVersion(self):
+        return 'MockEthereumNode/v1.0'
+
+    def net_version(self):
+        return '1'
+
+    def eth_chainId(self):
+        return '0x1'
+
+    def eth_blockNumber(self):
+        return hex(max(self.blocks)) if self.blocks else '0x0'
+
+    def eth_getBlockByNumber(self, block_number, full_transactions):
+        block = self.blocks.get(int(block_number, 16))
+        if block is None or full_transactions:
+            return block
+        block = dict(block)
+        block['transactions'] = [transaction['hash'] for transaction in block['transactions']]
+        return block
+
+    def eth_getTransactionByHash(self, transaction_hash):
+        return self.transactions.get(transaction_hash)
+
+    def eth_getTransactionReceipt(self, transaction_hash):
+        transaction = self.transactions.get(transaction_hash)
+        if transaction is None:
+            return None
+
+        block = self.blocks[int(transaction['blockNumber'], 16)]
+        cumulative_gas_used = 0
+        for block_transaction in block['transactions']:
+            gas_used = self._gas_used(block_transaction)
+            cumulative_gas_used += gas_used
+            if block_transaction['hash'] == transaction_hash:
+                break
+
+        receipt = {
+            'blockHash': transaction['blockHash'],
+            'blockNumber': transaction['blockNumber'],
+            'contractAddress': _created_contract_address(transaction),
+            'cumulativeGasUsed': hex(cumulative_gas_used),
+            'from': transaction['from'],
+            'gasUsed': hex(gas_used),
+            'logs': self._logs(transaction),
+            'logsBloom': '0x' + '00' * 256,
+            'to': transaction['to'],
+            'transactionHash': transaction_hash,
+            'transactionIndex': transaction['transactionIndex']}
+        if int(transaction['blockNumber'], 16) >= self.byzantium_block:
+            receipt['status'] = '0x0' if transaction_hash in self.reverted_transactions else '0x1'
+            receipt['effectiveGasPrice'] = transaction['gasPrice']
+        else:
+            receipt['root'] = block['stateRoot']
+        return receipt
+
+    def eth_getBlockReceipts(self, block_number):
+        block = self.blocks.get(int(block_number, 16))
+        if block is None:
+            return None
+        return [self.eth_getTransactionReceipt(transaction['hash']) for transaction in block['transactions']]
+
+    def _gas_used(self, transaction):
+        gas = int(transaction['gas'], 16)
+        if transaction['hash'] in self.reverted_transactions and int(transaction['blockNumber'], 16) < self.byzantium_block:
+            return gas
+        return min(gas, 21000 + 16 * (len(transaction['input']) - 2) // 2)
+
+    def eth_getLogs(self, log_filter):
+        addresses = log_filter.get('address') or []
+        addresses = {address.lower() for address in ([addresses] if isinstance(addresses, str) else addresses)}
+        topics = log_filter.get('topics') or []
+        from_block, to_block = self._block_range(log_filter)
+
+        logs = []
+        for block_number in sorted(self.blocks):
+            if not from_block <= block_number <= to_block:
+                continue
+            for transaction in self.blocks[block_number]['transactions']:
+                for log in self._logs(transaction):
+                    if addresses and log['address'].lower() not in addresses:
+                        continue
+                    if topics and topics[0] is not None and log['topics'][0] not in (
+                            [topics[0]] if isinstance(topics[0], str) else topics[0]):
+                        continue
+                    logs.append(log)
+        return logs
+
+    def trace_filter(self, trace_filter):
+        to_addresses = {address.lower() for address in trace_filter.get('toAddress', [])}
+        from_addresses = {address.lower() for address in trace_filter.get('fromAddress', [])}
+        from_block, to_block = self._block_range(trace_filter)
+
+        traces = []
+        for block_number in sorted(self.blocks):
+            if not from_block <= block_number <= to_block:
+                continue
+            for transaction in self.blocks[block_number]['transactions']:
+                if to_addresses and (transaction['to'] or '').lower() not in to_addresses:
+                    continue
+                if from_addresses and transaction['from'].lower() not in from_addresses:
+                    continue
+                traces.append({
+                    'action': {
+                        'callType': 'call', 'from': transaction['from'], 'to': transaction['to'],
+                        'gas': transaction['gas'], 'input': transaction['input'], 'value': transaction['value']},
+                    'blockHash': transaction['blockHash'],
+                    'blockNumber': block_number,
+                    'result': {'gasUsed': transaction['gas'], 'output': '0x'} if transaction['to'] else {
+                        'gasUsed': transaction['gas'], 'code': '0x', 'address': _created_contract_address(transaction)},
+                    'subtraces': 0,
+                    'traceAddress': [],
+                    'transactionHash': transaction['hash'],
+                    'transactionPosition': int(transaction['transactionIndex'], 16),
+                    'type': 'call' if transaction['to'] else 'create'})
+        return traces
+
+    def _block_range(self, block_filter):
+        head = max(self.blocks) if self.blocks else 0
+        return tuple(
+            head if block_filter.get(key, 'latest') in ('latest', 'pending')
+            else 0 if block_filter[key] == 'earliest' else int(block_filter[key], 16)
+            for key in ('fromBlock', 'toBlock'))
+
+    def _logs(self, transaction):
+        if transaction['to'] is None or transaction['hash'] in self.reverted_transactions:
+            return []
+        # One event per transaction, so the position of the transaction is a unique log index within the block.
+        return [{
+            'address': transaction['to'],
+            'topics': [ACTIVITY_EVENT_TOPIC],
+            'data': '0x' + transaction['input'][2:10].ljust(64, '0'),
+            'blockHash': transaction['blockHash'],
+            'blockNumber': transaction['blockNumber'],
+            'transactionHash': transaction['hash'],
+            'transactionIndex': transaction['transactionIndex'],
+            'logIndex': transaction['transactionIndex'],
+            'removed': False}]
+
+
+def _created_contract_address(transaction):
+    if transaction['to'] is not None:
+        return None
+    # A stand-in for the address that is derived from the sender and its nonce.
+    return '0x' + transaction['hash'][-40:]
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+from itertools import islice
+
+from . import instrumentation, utils
+from .selector_registry import create_matcher
+from .xes_writer import XesWriter, open_xes_file
+
+
+logger = logging.getLogger(__name__)
+
+# The default of max_open_traces, i.e. the open traces that assemble_traces holds in memory at most.
+MAX_OPEN_TRACES = 10000
+
+
+def iter_activity_transactions(
+    activities_dictionary,
+    block_numbers,
+    http_provider,
+    chunk_size=1000,
+    receipts=False,
+    block_receipts=False,
+    **fetch_kwargs):
+    '''
+        iter_activity_transactions is the generator version of get_activity_transactions_from_block_numbers.
+        The block numbers are consumed in chunks of chunk_size, so block_numbers can be an arbitrarily long
+        iterable, e.g. range(from_block, to_block + 1), and only one chunk of blocks is held in memory.
+
+        Arguments:
+            activities_dictionary (dictionary): A dictionary where the keys are function selectors.
+            block_numbers (iterable): The block numbers in ascending order.
+            http_provider (w3 object): A w3 object that has established a connection to a blockchain node.
+            chunk_size (int): The number of block numbers that are planned and retrieved together.
+            receipts, block_receipts: Whether the transaction receipts are retrieved as well (see
+                iter_activity_transactions_with_receipts).
+            fetch_kwargs: max_in_flight, batch_size, errors, and block_cache (see
+                get_activity_transactions_from_block_numbers).
+
+        Returns:
+            A generator over activity transactions in block order.
+    '''
+    activity_transactions = _iter_activity_transactions(
+        activities_dictionary, block_numbers, http_provider, chunk_size, **fetch_kwargs)
+    if receipts:
+        activity_transactions = utils.iter_activity_transactions_with_receipts(
+            activity_transactions, http_provider, fetch_kwargs.get('batch_size') or 100, block_receipts,
+            fetch_kwargs.get('errors'))
+    return activity_transactions
+
+
+def _iter_activity_transactions(activities_dictionary, block_numbers, http_provider, chunk_size, **fetch_kwargs):
+    match = create_matcher(activities_dictionary)
+    block_numbers = iter(block_numbers)
+    while True:
+        chunk = list(islice(block_numbers, chunk_size))
+        if not chunk:
+            return
+
+        plan = utils.plan_block_fetches(chunk)
+        for _, block in utils.iter_blocks(plan.block_numbers, http_provider, **fetch_kwargs):
+            yield from utils.get_activity_transactions_from_block(activities_dictionary, block, match)
+
+
+def iter_activities(activity_transactions, activities_dictionary, chunk_size=1000):
+    '''
+        iter_activities is the generator version of create_log_dictionary_from_activity_transactions. The call
+        arguments of a SelectorRegistry are decoded in batches of chunk_size activities (see
+        utils.add_decoded_arguments).
+
+        Returns:
+            A generator over (trace_id, activity) tuples.
+    '''
+    activity_transactions = iter(activity_transactions)
+    while True:
+        activities = [
+            utils.create_activity_from_activity_transaction(
+                activity_transaction, activities_dictionary, decode_arguments=False)
+            for activity_transaction in islice(activity_transactions, chunk_size)]
+        if not activities:
+            return
+
+        utils.add_decoded_arguments([activity for _, activity in activities], activities_dictionary)
+        yield from activities
+
+
+def assemble_traces(activities, idle_blocks=None, idle_seconds=None, max_open_traces=MAX_OPEN_TRACES,
+                    late_activities=None):
+    '''
+        assemble_traces groups a stream of activities in block order into traces and yields every trace as
+        soon as it is complete, so that only the open traces are held in memory. A trace is complete if
+        its last activity is more than idle_blocks blocks (block height watermark) or idle_seconds seconds
+        (block timestamps) behind the latest activity of the stream. If there are more than max_open_traces
+        open traces, the trace that has been idle the longest is completed. All remaining traces are
+        completed at the end of the stream.
+
+        Every trace id is yielded once. An activity of a trace that was already completed (a late activity)
+        is not added to the log, because the trace has been written; it is logged, counted as late_activities
+        (see instrumentation), and appended to late_activities if a list is given. Choose the policy
+        generously for processes with long pauses.
+
+        Arguments:
+            activities (iterable): (trace_id, activity) tuples in block order, e.g. from iter_activities.
+            idle_blocks (int): The block height watermark policy. None disables it.
+            idle_seconds (int): The idle timeout policy. None disables it.
+            max_open_traces (int): The maximum number of open traces. None means no limit, i.e. no trace is
+                completed before the end of the stream unless idle_blocks or idle_seconds is given.
+            late_activities (list): If a list is given, the late activities are appended as (trace_id,
+                activity) tuples.
+
+        Returns:
+            A generator over (trace_id, activities) tuples. The activities of a trace are sorted by time.
+    '''
+    open_traces = {}
+    completed_trace_ids = set()
+
+    for trace_id, activity in activities:
+        if trace_id in completed_trace_ids:
+            logger.warning(f'The activity {activity["instance_id"]} of the completed trace {trace_id} is left out.')
+            instrumentation.count('late_activities')
+            if late_activities is not None:
+                late_activities.append((trace_id, activity))
+            continue
+        if trace_id in open_traces:
+            # Move the trace to the end, i.e. open_traces is ordered from the longest to the shortest idle trace.
+            open_traces[trace_id] = open_traces.pop(trace_id)
+        else:
+            open_traces[trace_id] = []
+        open_traces[trace_id].append(activity)
+
+        block_number = activity["instance_id_block_no"]
+        time_stamp = activity["instance_id_time_stamp"]
+        while open_traces:
+            idle_trace_id = next(iter(open_traces))
+            last_activity = open_traces[idle_trace_id][-1]
+            if not (
+                (idle_blocks is not None and block_number - last_activity["instance_id_block_no"] > idle_blocks)
+                or (idle_seconds is not None
+                    and (time_stamp - last_activity["instance_id_time_stamp"]).total_seconds() > idle_seconds)
+                or (max_open_traces is not None and len(open_traces) > max_open_traces)):
+                break
+            completed_trace_ids.add(idle_trace_id)
+            yield idle_trace_id, _sort_activities(open_traces.pop(idle_trace_id))
+
+    for trace_id, trace_activities in open_traces.items():
+        yield trace_id, _sort_activities(trace_activities)
+
+
+def _sort_activities(activities):
+    return sorted(activities, key=lambda activity: (activity["instance_id_time_stamp"], activity["instance_id_block_no"]))
+
+
+def stream_xes_log_from_block_numbers(
+    activities_dictionary,
+    block_numbers,
+    http_provider,
+    path='./',
+    file_name='automatic_incident_management',
+    process_name="Incident Management Process",
+    idle_blocks=None,
+    idle_seconds=None,
+    max_open_traces=MAX_OPEN_TRACES,
+    late_activities=None,
+    compress=False,
+    **fetch_kwargs):
+    '''
+        stream_xes_log_from_block_numbers is the streaming version of the whole pipeline from
+        get_activity_transactions_from_block_numbers to write_xes_log_to_disc. The blocks are retrieved,
+        decoded, and assembled into traces one after the other, and every complete trace (see
+        assemble_traces) is written to the file immediately. The memory therefore depends on the number of
+        open traces, not on the length of the block range.
+
+        Arguments:
+            activities_dictionary (dictionary): A dictionary where the keys are function selectors.
+            block_numbers (iterable): The block numbers in ascending order, e.g. a range.
+            http_provider (w3 object): A w3 object that has established a connection to a blockchain node.
+            path (string): The path to the storing location.
+            file_name (string): The file name of the .xes file.
+            process_name (string): The name of the process.
+            idle_blocks, idle_seconds, max_open_traces, late_activities: The trace completion policy and
+                the activities of completed traces (see assemble_traces).
+            compress (bool): Whether the file is compressed with gzip, i.e. written as .xes.gz.
+            fetch_kwargs: chunk_size, receipts, block_receipts, max_in_flight, batch_size, errors, and
+                block_cache (see iter_activity_transactions).
+
+        Returns:
+            The number of written traces.
+    '''
+    activity_transactions = iter_activity_transactions(
+        activities_dictionary, block_numbers, http_provider, **fetch_kwargs)
+    activities = iter_activities(activity_transactions, activities_dictionary)
+    traces = assemble_traces(activities, idle_blocks, idle_seconds, max_open_traces, late_activities)
+
+    file_path = f'{path}{file_name}.xes' + ('.gz' if compress else '')
+    with open_xes_file(file_path) as file, XesWriter(file, process_name) as writer:
+        for trace_id, trace_activities in traces:
+            writer.write_trace(trace_id, trace_activities)
+            file.flush()
+
+    return writer.traces
+
+
+def stream_event_logs_from_block_numbers(
+    activities_dictionary,
+    block_numbers,
+    http_provider,
+    file_paths,
+    process_name="Incident Management Process",
+    idle_blocks=None,
+    idle_seconds=None,
+    max_open_traces=MAX_OPEN_TRACES,
+    late_activities=None,
+    **fetch_kwargs):
+    '''
+        stream_event_logs_from_block_numbers is stream_xes_log_from_block_numbers for several files and formats,
+        e.g. XES, CSV, Parquet, and OCEL 2.0 (see exporters.EventLogExporter). Every complete trace is written to
+        all files, i.e. one extraction produces all formats without building the log first.
+
+        Arguments:
+            file_paths (list): The paths of the files. The format of every file is chosen by its extension.
+            The other arguments are the ones of stream_xes_log_from_block_numbers.
+
+        Returns:
+            The number of written traces.
+    '''
+    from .exporters import EventLogExporter
+
+    activity_transactions = iter_activity_transactions(
+        activities_dictionary, block_numbers, http_provider, **fetch_kwargs)
+    activities = iter_activities(activity_transactions, activities_dictionary)
+    traces = assemble_traces(activities, idle_blocks, idle_seconds, max_open_traces, late_activities)
+
+    with EventLogExporter(file_paths, process_name) as exporter:
+        for trace_id, trace_activities in traces:
+            exporter.write_trace(trace_id, trace_activities)
+
+    return exporter.traces
@@ -0,0 +1,515 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3.providers.base import JSONBaseProvider
+
+from . import instrumentation
+from .formatters import format_block, format_receipt, format_transaction
+
+
+class JsonRpcError(Exception):
+    '''
+        JsonRpcError describes the failure of a single call in a JSON-RPC batch. Instead of raising it,
+        RpcBatchClient returns it in place of the result, so that the other calls of the batch are kept.
+    '''
+
+    def __init__(self, message, code=None, method=None, params=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.method = method
+        self.params = params
+
+    def __repr__(self):
+        return f'JsonRpcError({self.message!r}, code={self.code}, method={self.method}, params={self.params})'
+
+
+logger = logging.getLogger(__name__)
+
+# The JSON-RPC error codes with which providers signal that a request was throttled.
+THROTTLING_ERROR_CODES = {-32005, 429}
+
+
+class RateLimiter(object):
+    '''
+        RateLimiter is a token bucket that adapts its rate to throttling responses of a provider. A throttled
+        request halves the rate and pauses all requests for the time the provider asks for (Retry-After).
+        Every successful request increases the rate again by increase requests per second, up to max_rate.
+
+        Without a rate, requests are not limited until the provider throttles them for the first time. The
+        rate then starts at half of the rate of the recent requests.
+    '''
+
+    def __init__(self, rate=None, burst=10, min_rate=1.0, max_rate=None, increase=0.1):
+        '''
+            Arguments:
+                rate (float): The number of requests per second. None does not limit the requests.
+                burst (int): The maximum number of requests that are sent without waiting.
+                min_rate (float): The rate is never decreased below min_rate.
+                max_rate (float): The rate is never increased above max_rate. None uses rate.
+                increase (float): The number of requests per second the rate increases with every success.
+        '''
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate
+        self.increase = increase
+        self.throttled = 0
+
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._recent = deque(maxlen=100)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''
+            Blocks until a request may be sent.
+        '''
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    if self.rate is None:
+                        self._recent.append(now)
+                        return
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self._recent.append(now)
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = self._paused_until - now
+            time.sleep(wait)
+
+    def succeed(self):
+        with self._lock:
+            if self.rate is not None and self.max_rate is not None:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+            elif self.rate is not None:
+                self.rate += self.increase
+
+    def throttle(self, retry_after=None):
+        '''
+            Halves the rate, and pauses the requests for retry_after seconds.
+        '''
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if self.rate is None:
+                recent_rate = len(self._recent) / max(now - self._recent[0], 1e-3) if self._recent else 2 * self.min_rate
+                self.rate = recent_rate
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 1)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            logger.info(f'Request throttled, the rate is decreased to {self.rate:.1f} requests per second.')
+
+
+class RpcClient(object):
+    '''
+        RpcClient sends JSON-RPC payloads to one or several endpoints over a pooled keep-alive session. The
+        requests are distributed round-robin over the endpoints, and an endpoint that fails max_failures times
+        in a row is skipped for cooldown seconds (failover). Every endpoint has its own adaptive RateLimiter.
+        Failed requests are retried with exponential backoff and random jitter, and throttled requests (HTTP 429
+        or a throttling error code) honour the Retry-After header.
+
+        One RpcClient can be shared by all fetch functions, either directly as argument of RpcBatchClient or
+        through a web3 object created with connect_to_http_provider.
+
+        Example:
+            >> rpc_client = RpcClient(["https://mainnet.infura.io/v3/...", "http://localhost:8545"],
+            ..                        requests_per_second=10, retries=5)
+            >> http_provider = utils.connect_to_http_provider(rpc_client)
+    '''
+
+    def __init__(
+        self,
+        endpoint_uris,
+        timeout=60,
+        retries=3,
+        backoff=0.5,
+        max_backoff=30,
+        requests_per_second=None,
+        pool_size=10,
+        max_failures=3,
+        cooldown=30):
+        '''
+            Arguments:
+                endpoint_uris (list): The unified ressource locators (URL) of the blockchain nodes, or one URL.
+                timeout (int): The number of seconds to wait for a response.
+                retries (int): How often a failed request is sent again, to the next endpoint.
+                backoff (float): The delay before the first retry in seconds. It doubles with every retry.
+                max_backoff (float): The maximum delay before a retry in seconds.
+                requests_per_second (float): The initial rate limit of every endpoint (see RateLimiter).
+                pool_size (int): The number of keep-alive connections per endpoint.
+                max_failures (int): The number of consecutive failures after which an endpoint is skipped.
+                cooldown (float): The number of seconds a failed endpoint is skipped.
+        '''
+        if isinstance(endpoint_uris, str):
+            endpoint_uris = [endpoint_uris]
+        self.endpoint_uris = list(endpoint_uris)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+
+        self.rate_limiters = {uri: RateLimiter(requests_per_second) for uri in self.endpoint_uris}
+        self.failures = {uri: 0 for uri in self.endpoint_uris}
+        self.requests = 0
+        self.retried = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoint_uris), pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._skipped_until = {uri: 0.0 for uri in self.endpoint_uris}
+        self._next_endpoint = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def endpoint_uri(self):
+        return self.endpoint_uris[0]
+
+    def post(self, payload):
+        '''
+            Sends payload (a JSON-RPC request or batch) and returns the decoded response.
+
+            Raises:
+                The exception of the last attempt (requests.RequestException or ValueError), if every
+                attempt failed.
+        '''
+        for attempt in range(self.retries + 1):
+            endpoint_uri = self._select_endpoint()
+            rate_limiter = self.rate_limiters[endpoint_uri]
+            rate_limiter.acquire()
+            with self._lock:
+                self.requests += 1
+            instrumentation.count('rpc_requests')
+
+            try:
+                response = self.session.post(endpoint_uri, json=payload, timeout=self.timeout)
+                instrumentation.count('rpc_bytes_sent', len(response.request.body or b''))
+                instrumentation.count('rpc_bytes_received', len(response.content))
+                if response.status_code == 429:
+                    instrumentation.count('rpc_throttled')
+                    rate_limiter.throttle(_retry_after(response))
+                    raise requests.HTTPError(f'429 Too Many Requests for url: {endpoint_uri}', response=response)
+                response.raise_for_status()
+                result = response.json()
+            except (requests.RequestException, ValueError) as exception:
+                # A payload that is too large fails at every endpoint, so it is not sent again.
+                if _is_payload_too_large(exception):
+                    raise
+                self._fail(endpoint_uri, exception)
+                if attempt == self.retries:
+                    raise
+                with self._lock:
+                    self.retried += 1
+                instrumentation.count('rpc_retries')
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+                continue
+
+            with self._lock:
+                self.failures[endpoint_uri] = 0
+            if _is_throttled(result):
+                instrumentation.count('rpc_throttled')
+                rate_limiter.throttle(_retry_after(response))
+            else:
+                rate_limiter.succeed()
+            return result
+
+    def _select_endpoint(self):
+        with self._lock:
+            now = time.monotonic()
+            for _ in range(len(self.endpoint_uris)):
+                endpoint_uri = self.endpoint_uris[next(self._next_endpoint) % len(self.endpoint_uris)]
+                if self._skipped_until[endpoint_uri] <= now:
+                    return endpoint_uri
+            # Every endpoint failed recently, so the one that recovers first is used.
+            return min(self.endpoint_uris, key=self._skipped_until.get)
+
+    def _fail(self, endpoint_uri, exception):
+        with self._lock:
+            self.failures[endpoint_uri] += 1
+            if self.failures[endpoint_uri] >= self.max_failures and len(self.endpoint_uris) > 1:
+                self._skipped_until[endpoint_uri] = time.monotonic() + self.cooldown
+                logger.warning(f'{endpoint_uri} failed {self.failures[endpoint_uri]} times ({exception}), '
+                               f'it is skipped for {self.cooldown} seconds.')
+
+
+def _is_payload_too_large(exception):
+    response = getattr(exception, 'response', None)
+    return response is not None and response.status_code == 413
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_throttled(result):
+    responses = result if isinstance(result, list) else [result]
+    return any(
+        isinstance(response, dict) and isinstance(response.get('error'), dict)
+        and response['error'].get('code') in THROTTLING_ERROR_CODES
+        for response in responses)
+
+
+class RpcClientProvider(JSONBaseProvider):
+    '''
+        RpcClientProvider is a web3 provider that sends the requests of a web3 object through an RpcClient,
+        i.e. the calls of web3 (e.g. eth.getBlock) and the batches of RpcBatchClient share the connection pool,
+        the rate limits, and the endpoints (see connect_to_http_provider).
+    '''
+
+    def __init__(self, rpc_client):
+        super().__init__()
+        self.rpc_client = rpc_client
+
+    @property
+    def endpoint_uri(self):
+        return self.rpc_client.endpoint_uri
+
+    def make_request(self, method, params):
+        try:
+            return self.rpc_client.post({
+                'jsonrpc': '2.0', 'method': method, 'params': params or [], 'id': next(self.request_counter)})
+        except requests.RequestException as exception:
+            raise IOError(str(exception)) from exception
+
+    def __str__(self):
+        return f'RPC connection {", ".join(self.rpc_client.endpoint_uris)}'
+
+
+class RpcBatchClient(object):
+    '''
+        RpcBatchClient packs many JSON-RPC calls into batch payloads, i.e. one HTTP round trip retrieves
+        up to batch_size blocks or transactions.
+
+        Example:
+            >> rpc_client = RpcBatchClient("https://mainnet.infura.io/v3/...", batch_size=50)
+            >> rpc_client.get_blocks_by_number([1196605, 1196607])
+            [AttributeDict({'number': 1196605, ...}), AttributeDict({'number': 1196607, ...})]
+    '''
+
+    def __init__(self, endpoint_uri, batch_size=100, timeout=60, retries=1):
+        '''
+            Arguments:
+                endpoint_uri (string): A unified ressource locator (URL) to a blockchain node, or an RpcClient
+                    that is shared with other clients.
+                batch_size (int): The maximum number of calls that are sent in one HTTP request.
+                timeout (int): The number of seconds to wait for the response of a batch. Ignored for an RpcClient.
+                retries (int): How often the calls of a batch that failed are sent again.
+        '''
+        if isinstance(endpoint_uri, RpcClient):
+            self.rpc_client = endpoint_uri
+        else:
+            self.rpc_client = RpcClient(endpoint_uri, timeout=timeout, retries=0)
+        self.endpoint_uri = self.rpc_client.endpoint_uri
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.retries = retries
+        # The methods the node answered with method not found (-32601) for every call, e.g. eth_getBlockReceipts.
+        self.unsupported_methods = set()
+        self._ids = itertools.count()
+
+    def batch_call(self, method, params_list):
+        '''
+            batch_call calls method once for every entry of params_list, using as few HTTP requests as
+            possible. A batch that the node rejects as too large (HTTP 413 or an error object instead of a
+            list of responses) is split in halves; calls that fail individually are retried in a later batch.
+            If a request fails (e.g. a timeout, HTTP 500, or HTTP 429 after the retries of the RpcClient), the
+            batch is not split, the remaining batches wait for the next attempt, and batch_call backs off
+            before it. A node that is down therefore receives only retries + 1 requests.
+
+            Arguments:
+                method (string): The JSON-RPC method, e.g. eth_getBlockByNumber.
+                params_list (list): A list of parameter lists, one for each call.
+
+            Returns:
+                A list with the result of each call in the order of params_list. A call that failed
+                is represented by a JsonRpcError instance.
+        '''
+        instrumentation.count('rpc_calls', len(params_list))
+        results = [None] * len(params_list)
+        pending = list(range(len(params_list)))
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(random.uniform(
+                    0, min(self.rpc_client.max_backoff, self.rpc_client.backoff * 2 ** (attempt - 1))))
+            failed = []
+            for start in range(0, len(pending), self.batch_size):
+                indices = pending[start:start + self.batch_size]
+                try:
+                    batch_results = self._send_batch(method, [params_list[index] for index in indices])
+                except (requests.RequestException, ValueError) as exception:
+                    for index in pending[start:]:
+                        results[index] = JsonRpcError(str(exception), method=method, params=params_list[index])
+                        failed.append(index)
+                    break
+                for index, result in zip(indices, batch_results):
+                    results[index] = result
+                    # Calls of a method that the node does not provide (-32601) are not retried.
+                    if isinstance(result, JsonRpcError) and result.code != -32601:
+                        failed.append(index)
+            pending = failed
+            if not pending:
+                break
+
+        if results and all(isinstance(result, JsonRpcError) and result.code == -32601 for result in results):
+            self.unsupported_methods.add(method)
+        return results
+
+    def get_blocks_by_number(self, block_numbers, full_transactions=True):
+        '''
+            get_blocks_by_number retrieves the given blocks with eth_getBlockByNumber batches.
+
+            Arguments:
+                block_numbers (list): A list of integers that specify the blocks to retrieve.
+                full_transactions (bool): Whether the blocks contain full transactions or only their hashes.
+
+            Returns:
+                A list of blocks (see format_block) in the order of block_numbers. A block that could
+                not be retrieved is represented by a JsonRpcError instance.
+        '''
+        results = self.batch_call(
+            'eth_getBlockByNumber',
+            [[hex(block_number), full_transactions] for block_number in block_numbers])
+        return [
+            self._format_result(result, format_block, 'eth_getBlockByNumber', block_number)
+            for result, block_number in zip(results, block_numbers)]
+
+    def get_transactions_by_hash(self, transaction_hashes):
+        '''
+            get_transactions_by_hash retrieves the given transactions with eth_getTransactionByHash batches.
+
+            Argument:
+                transaction_hashes (list): A list of transaction hashes as hex strings.
+
+            Returns:
+                A list of transactions (see format_transaction) in the order of transaction_hashes.
+                A transaction that could not be retrieved is represented by a JsonRpcError instance.
+        '''
+        results = self.batch_call(
+            'eth_getTransactionByHash',
+            [[transaction_hash] for transaction_hash in transaction_hashes])
+        return [
+            self._format_result(result, format_transaction, 'eth_getTransactionByHash', transaction_hash)
+            for result, transaction_hash in zip(results, transaction_hashes)]
+
+    def get_transaction_receipts(self, transaction_hashes):
+        '''
+            get_transaction_receipts retrieves the receipts of the given transactions with
+            eth_getTransactionReceipt batches.
+
+            Argument:
+                transaction_hashes (list): A list of transaction hashes as hex strings.
+
+            Returns:
+                A list of receipts (see format_receipt) in the order of transaction_hashes. A receipt that
+                could not be retrieved is represented by a JsonRpcError instance.
+        '''
+        results = self.batch_call(
+            'eth_getTransactionReceipt',
+            [[transaction_hash] for transaction_hash in transaction_hashes])
+        return [
+            self._format_result(result, format_receipt, 'eth_getTransactionReceipt', transaction_hash)
+            for result, transaction_hash in zip(results, transaction_hashes)]
+
+    def get_block_receipts(self, block_numbers):
+        '''
+            get_block_receipts retrieves the receipts of all transactions of the given blocks with
+            eth_getBlockReceipts batches. Not every node supports eth_getBlockReceipts; in that case every
+            result is a JsonRpcError with code -32601 (method not found), and the method is added to
+            unsupported_methods.
+
+            Argument:
+                block_numbers (list): A list of integers that specify the blocks.
+
+            Returns:
+                A list with the list of receipts (see format_receipt) of every block in the order of
+                block_numbers. A block whose receipts could not be retrieved is represented by a JsonRpcError instance.
+        '''
+        results = self.batch_call('eth_getBlockReceipts', [[hex(block_number)] for block_number in block_numbers])
+        return [
+            self._format_result(
+                result, lambda receipts: [format_receipt(receipt) for receipt in receipts],
+                'eth_getBlockReceipts', block_number)
+            for result, block_number in zip(results, block_numbers)]
+
+    def _format_result(self, result, formatter, method, param):
+        if isinstance(result, JsonRpcError):
+            return result
+        if result is None:
+            return JsonRpcError(f'{method} returned no result for {param}', method=method, params=[param])
+        return formatter(result)
+
+    def _send_batch(self, method, params_list):
+        '''
+            Sends the calls of params_list in one batch, and splits it in halves if the node rejects it as too
+            large.
+
+            Raises:
+                requests.RequestException or ValueError, if the request failed.
+        '''
+        payload = [
+            {'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': params}
+            for params in params_list]
+
+        try:
+            responses = self.rpc_client.post(payload)
+        except requests.HTTPError as exception:
+            if not _is_payload_too_large(exception) or len(params_list) == 1:
+                raise
+            return self._split_batch(method, params_list)
+
+        if not isinstance(responses, list):
+            error = responses.get('error') if isinstance(responses, dict) else None
+            if not isinstance(error, dict):
+                raise ValueError(f'{method} batch returned {responses!r}')
+            if error.get('code') in THROTTLING_ERROR_CODES:
+                raise ValueError(error.get('message', json.dumps(error)))
+            # The node rejected the batch as a whole, e.g. because it has more calls than the node allows.
+            if len(params_list) > 1:
+                return self._split_batch(method, params_list)
+            return [JsonRpcError(
+                error.get('message', json.dumps(error)), code=error.get('code'), method=method, params=params_list[0])]
+
+        responses = {response.get('id'): response for response in responses}
+        results = []
+        for request in payload:
+            response = responses.get(request['id'])
+            if response is None:
+                results.append(JsonRpcError('no response', method=method, params=request['params']))
+            elif 'error' in response:
+                error = response['error']
+                results.append(JsonRpcError(
+                    error.get('message', json.dumps(error)), code=error.get('code'),
+                    method=method, params=request['params']))
+            else:
+                results.append(response.get('result'))
+        return results
+
+    def _split_batch(self, method, params_list):
+        middle = len(params_list) // 2
+        logger.info(f'The node rejected a batch of {len(params_list)} calls, it is split in halves.')
+        return self._send_batch(method, params_list[:middle]) + self._send_batch(method, params_list[middle:])
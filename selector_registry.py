@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+from collections.abc import Mapping
+
+# pycryptodome and eth_abi are imported when a selector is created or arguments are decoded, so that a
+# registry can be unpickled and matched without them.
+
+
+Selector = namedtuple('Selector', [
+    'function_selector', 'function_signature', 'activity_name', 'resource', 'argument_names', 'argument_types'])
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+# The prefix of the keys of the decoded call arguments, e.g. arg:ticket. The arguments have their own namespace,
+# so that an argument called from, id, or blockNo does not overwrite the attribute of the event.
+ARGUMENT_PREFIX = 'arg:'
+
+
+class SelectorRegistry(Mapping):
+    '''
+        SelectorRegistry holds the activities of a process, i.e. their function selectors, names, resources, and
+        argument types. The keccak hashes are computed once when the registry is created, and the selectors
+        are stored as 4-byte integers, so match works on hex strings and raw bytes alike.
+
+        A SelectorRegistry can be used wherever an activities dictionary is expected, because it is a mapping
+        from the function selector (e.g. '0xefe73dcb') to the same dictionary that create_activities_dictionary
+        creates. In addition, the activities created with a registry (e.g. by
+        create_log_dictionary_from_activity_transactions) carry the decoded call arguments, which are written
+        as typed XES attributes with the prefix arg: (see ARGUMENT_PREFIX). A registry can be pickled, e.g. to
+        send it to worker processes.
+
+        Example:
+            >> selector_registry = SelectorRegistry.from_signatures(activity_names, function_signatures, activity_resources)
+            >> selector_registry.decode_arguments('0x7c9f3a19' + '00' * 31 + '2a')
+            [('arg:0', 'int', 42)]
+            >> log_dic = create_log_dictionary_from_activity_transactions(activity_transactions, selector_registry)
+    '''
+
+    def __init__(self, selectors=()):
+        '''
+            Argument:
+                selectors (iterable): Selector tuples. Use the from_* class methods to create them.
+        '''
+        self._selectors = {}
+        self._activities = {}
+        self._decoders = {}
+        for selector in selectors:
+            self.add(selector)
+
+    @classmethod
+    def from_signatures(cls, activity_names, function_signatures, activity_resources):
+        '''
+            Creates a registry from the same lists as create_activities_dictionary. The argument types are
+            parsed from the function signatures, e.g. Get_problem_description(int32).
+        '''
+        assert len(activity_names) == len(function_signatures) == len(activity_resources)
+
+        return cls(
+            create_selector(function_signature, activity_name, resource)
+            for activity_name, function_signature, resource in zip(activity_names, function_signatures, activity_resources))
+
+    @classmethod
+    def from_activities_dictionary(cls, activities_dictionary):
+        '''
+            Creates a registry from an activities dictionary as it is created by create_activities_dictionary.
+        '''
+        return cls(
+            create_selector(activity['function_signature'], activity['activity_name'], activity['resource'])
+            for activity in activities_dictionary.values())
+
+    @classmethod
+    def from_abi(cls, abi, activity_names=None, activity_resources=None):
+        '''
+            Creates a registry from the functions of a contract ABI. Unlike signatures, the ABI also provides the
+            argument names, which become the keys of the XES attributes, e.g. arg:ticket.
+
+            Arguments:
+                abi (list): The ABI of the contract as a list of dictionaries, e.g. loaded with json.load.
+                activity_names (dictionary): Maps function names to activity names. By default the activity name
+                    is the function name with spaces instead of underscores.
+                activity_resources (dictionary): Maps function names to resources. By default the resource is empty.
+        '''
+        activity_names = activity_names or {}
+        activity_resources = activity_resources or {}
+
+        selectors = []
+        for entry in abi:
+            if entry.get('type', 'function') != 'function':
+                continue
+
+            name = entry['name']
+            argument_types = [_canonical_type(argument) for argument in entry.get('inputs', [])]
+            argument_names = [
+                argument.get('name') or str(index) for index, argument in enumerate(entry.get('inputs', []))]
+            selectors.append(create_selector(
+                f'{name}({",".join(argument_types)})',
+                activity_names.get(name, name.replace('_', ' ')),
+                activity_resources.get(name, ''),
+                argument_names))
+        return cls(selectors)
+
+    def add(self, selector):
+        key = int(selector.function_selector[2:], 16)
+        self._selectors[key] = selector
+        self._activities[selector.function_selector] = {
+            'activity_name': selector.activity_name,
+            'function_signature': selector.function_signature,
+            'resource': selector.resource
+        }
+        self._decoders.pop(key, None)
+
+    def __getitem__(self, function_selector):
+        return self._activities[function_selector]
+
+    def __iter__(self):
+        return iter(self._activities)
+
+    def __len__(self):
+        return len(self._activities)
+
+    def __getstate__(self):
+        # The decoders are created again on demand, because they are not guaranteed to be picklable.
+        return {'_selectors': self._selectors, '_activities': self._activities}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._decoders = {}
+
+    def match(self, input_data):
+        '''
+            Returns the Selector of the transaction input input_data (a hex string or bytes), or None if the
+            transaction is not associated to an activity.
+        '''
+        return self._selectors.get(selector_key(input_data))
+
+    def decode_arguments(self, input_data):
+        '''
+            Decodes the call arguments of one transaction input.
+
+            Argument:
+                input_data (string or bytes): The input of the transaction, as a hex string or bytes.
+
+            Returns:
+                A list of (key, XES type, value) tuples, where the key is the argument name with the prefix arg:
+                and the XES type is int, float, boolean, or string. The list is empty if the selector is unknown
+                or the arguments cannot be decoded.
+        '''
+        return self.decode_arguments_batch([input_data])[0]
+
+    def decode_arguments_batch(self, inputs):
+        '''
+            Decodes the call arguments of many transaction inputs (see decode_arguments). The inputs are grouped
+            by function selector, and the inputs of one selector are decoded together, i.e. the decoder, the
+            argument names, and the argument types are looked up once per selector instead of once per input.
+
+            Returns:
+                A list with the decoded arguments of every input, in the order of inputs.
+        '''
+        inputs = list(inputs)
+        indices_by_key = {}
+        for index, input_data in enumerate(inputs):
+            indices_by_key.setdefault(selector_key(input_data), []).append(index)
+
+        decoded_arguments = [[] for _ in inputs]
+        for key, indices in indices_by_key.items():
+            selector = self._selectors.get(key)
+            if selector is None or not selector.argument_types:
+                continue
+
+            decoder = self._decoders.get(key)
+            if decoder is None:
+                decoder = self._decoders[key] = _create_decoder(selector.argument_types)
+            arguments = list(zip(selector.argument_names, selector.argument_types))
+
+            for index in indices:
+                values = decoder(_argument_data(inputs[index]))
+                if values is not None:
+                    decoded_arguments[index] = [
+                        _to_xes_attribute(name, argument_type, value)
+                        for (name, argument_type), value in zip(arguments, values)]
+        return decoded_arguments
+
+
+def create_matcher(activities_dictionary):
+    '''
+        create_matcher returns SelectorRegistry.match for activities_dictionary, i.e. a function that returns the
+        Selector of a transaction input (a hex string or bytes) or None if the transaction is not associated to
+        an activity. The function selectors are compared as 4-byte integers. A plain activities dictionary is
+        converted into a registry without argument types. The function can be pickled, e.g. to send it to
+        worker processes.
+    '''
+    if isinstance(activities_dictionary, SelectorRegistry):
+        return activities_dictionary.match
+
+    return SelectorRegistry(
+        Selector(function_selector, activity.get('function_signature'), activity.get('activity_name'),
+                 activity.get('resource'), (), ())
+        for function_selector, activity in activities_dictionary.items()).match
+
+
+def create_selector(function_signature, activity_name, resource, argument_names=None):
+    '''
+        create_selector computes the function selector of function_signature and parses its argument types.
+
+        Returns:
+            A Selector.
+    '''
+    from Crypto.Hash import keccak
+
+    keccak_hash = keccak.new(digest_bits=256)
+    keccak_hash.update(function_signature.encode())
+
+    argument_types = split_argument_types(function_signature[function_signature.index('(') + 1:-1])
+    if argument_names is None:
+        argument_names = [str(index) for index in range(len(argument_types))]
+
+    return Selector(
+        '0x' + keccak_hash.hexdigest()[:8], function_signature, activity_name, resource,
+        tuple(argument_names), tuple(argument_types))
+
+
+def selector_key(input_data):
+    '''
+        selector_key returns the first 4 bytes of the transaction input input_data (a hex string or bytes)
+        as integer, or None if the input is shorter than 4 bytes.
+    '''
+    if isinstance(input_data, str):
+        if len(input_data) < 10:
+            return None
+        return int(input_data[2:10], 16)
+    if len(input_data) < 4:
+        return None
+    return int.from_bytes(input_data[:4], 'big')
+
+
+def split_argument_types(argument_types):
+    '''
+        split_argument_types splits the comma separated argument types of a function signature, e.g.
+        'uint256,(address,bool)[]' into ['uint256', '(address,bool)[]'].
+    '''
+    types, depth, start = [], 0, 0
+    for index, character in enumerate(argument_types):
+        if character == '(':
+            depth += 1
+        elif character == ')':
+            depth -= 1
+        elif character == ',' and depth == 0:
+            types.append(argument_types[start:index])
+            start = index + 1
+    if argument_types:
+        types.append(argument_types[start:])
+    return types
+
+
+def _argument_data(input_data):
+    if not isinstance(input_data, str):
+        return bytes(input_data[4:])
+    try:
+        return bytes.fromhex(input_data[10:])
+    except ValueError:
+        # An odd number of hex digits or other characters, i.e. the input is not ABI encoded.
+        return None
+
+
+def _create_decoder(argument_types):
+    from eth_abi.decoding import ContextFramesBytesIO, TupleDecoder
+    from eth_abi.exceptions import DecodingError
+    from eth_abi.registry import registry
+
+    tuple_decoder = TupleDecoder(decoders=[registry.get_decoder(argument_type) for argument_type in argument_types])
+
+    def decode(data):
+        if data is None:
+            return None
+        try:
+            return tuple_decoder(ContextFramesBytesIO(data))
+        except DecodingError:
+            return None
+    return decode
+
+
+def _canonical_type(argument):
+    if argument['type'].startswith('tuple'):
+        components = ','.join(_canonical_type(component) for component in argument['components'])
+        return f'({components}){argument["type"][5:]}'
+    return argument['type']
+
+
+def _to_xes_attribute(name, argument_type, value):
+    key = ARGUMENT_PREFIX + name
+    if argument_type == 'bool':
+        return key, 'boolean', value
+    if argument_type.startswith(('int', 'uint')) and argument_type[-1] != ']' and _INT64_MIN <= value <= _INT64_MAX:
+        return key, 'int', value
+    if argument_type.startswith(('fixed', 'ufixed')) and argument_type[-1] != ']':
+        return key, 'float', float(value)
+    return key, 'string', _to_text(value)
+
+
+def _to_text(value):
+    if isinstance(value, bytes):
+        return '0x' + value.hex()
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(_to_text(item) for item in value) + ']'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from . import utils
+from .pipeline import iter_activities, iter_activity_transactions
+from .xes_writer import XesWriter, open_xes_file
+
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ['pending', 'running', 'done', 'failed']
+
+
+def create_shard_jobs(directory, from_block, to_block, shard_size=10000):
+    '''
+        create_shard_jobs splits the block range from from_block to to_block into shards of shard_size blocks,
+        and creates one job file per shard in directory/pending. The directory is the job queue that the workers
+        share, e.g. on a network file system (see run_shard_worker). Shards that already have a job in any state
+        are not created again, i.e. the range can be extended by calling create_shard_jobs again.
+
+        Arguments:
+            directory (string): The job queue directory. It is created if it does not exist.
+            from_block (int): The first block of the range.
+            to_block (int): The last block of the range.
+            shard_size (int): The number of blocks per shard.
+
+        Returns:
+            The number of created jobs.
+    '''
+    for state in JOB_STATES + ['partials']:
+        os.makedirs(os.path.join(directory, state), exist_ok=True)
+
+    created = 0
+    for shard_from_block in range(from_block, to_block + 1, shard_size):
+        job = {'from_block': shard_from_block, 'to_block': min(shard_from_block + shard_size - 1, to_block)}
+        job_name = _job_name(job)
+        if any(os.path.exists(os.path.join(directory, state, job_name)) for state in JOB_STATES):
+            continue
+
+        _write_atomically(os.path.join(directory, 'pending', job_name), json.dumps(job).encode())
+        created += 1
+    return created
+
+
+def claim_shard_job(directory):
+    '''
+        claim_shard_job moves the first pending job to directory/running and returns it. Because the move is an
+        atomic rename, every job is claimed by exactly one worker, even if several processes or machines share
+        the directory.
+
+        Returns:
+            The job as dictionary with the keys from_block and to_block, or None if no job is pending.
+    '''
+    for job_name in sorted(os.listdir(os.path.join(directory, 'pending'))):
+        pending_path = os.path.join(directory, 'pending', job_name)
+        running_path = os.path.join(directory, 'running', job_name)
+        try:
+            # The modification time of a running job tells when it was claimed (see requeue_stale_shard_jobs).
+            # It is set before the rename, so that the job never appears in directory/running with the time
+            # at which it was created or requeued.
+            os.utime(pending_path)
+            os.rename(pending_path, running_path)
+        except FileNotFoundError:
+            # Another worker claimed the job first.
+            continue
+
+        with open(running_path) as file:
+            return json.load(file)
+    return None
+
+
+def requeue_stale_shard_jobs(directory, timeout=3600):
+    '''
+        requeue_stale_shard_jobs moves the running jobs that were claimed, or last signalled progress (see
+        run_shard_job), more than timeout seconds ago back to directory/pending, e.g. the jobs of a worker that
+        crashed.
+
+        Returns:
+            The number of requeued jobs.
+    '''
+    requeued = 0
+    for job_name in os.listdir(os.path.join(directory, 'running')):
+        running_path = os.path.join(directory, 'running', job_name)
+        try:
+            if time.time() - os.path.getmtime(running_path) > timeout:
+                os.rename(running_path, os.path.join(directory, 'pending', job_name))
+                requeued += 1
+        except FileNotFoundError:
+            continue
+    return requeued
+
+
+def requeue_failed_shard_jobs(directory):
+    '''
+        requeue_failed_shard_jobs moves the jobs in directory/failed back to directory/pending, e.g. after the
+        node that failed to deliver some of their blocks is available again.
+
+        Returns:
+            The number of requeued jobs.
+    '''
+    requeued = 0
+    for job_name in os.listdir(os.path.join(directory, 'failed')):
+        try:
+            os.rename(os.path.join(directory, 'failed', job_name), os.path.join(directory, 'pending', job_name))
+            requeued += 1
+        except FileNotFoundError:
+            continue
+    return requeued
+
+
+def run_shard_job(directory, job, activities_dictionary, http_provider, heartbeat=60, **fetch_kwargs):
+    '''
+        run_shard_job extracts the activities of the blocks of job, and writes them as partial log to
+        directory/partials. The partial log is sorted, so running a shard again writes the same file, and it
+        replaces the previous file atomically. Afterwards, the job is moved to directory/done.
+
+        While the shard runs, the modification time of the running job is updated every heartbeat seconds, so
+        that requeue_stale_shard_jobs does not requeue a long shard that is still making progress.
+
+        If fetch_kwargs contains an errors list, blocks that could not be retrieved are appended to it, no
+        partial log is written, and the job is moved to directory/failed together with the failed blocks (see
+        requeue_failed_shard_jobs). Without an errors list, the first failed block raises its exception, and
+        the job stays in directory/running.
+
+        Arguments:
+            directory (string): The job queue directory.
+            job (dictionary): A job as returned by claim_shard_job.
+            activities_dictionary (dictionary): A dictionary where the keys are function selectors.
+            http_provider (w3 object): A w3 object that has established a connection to a blockchain node.
+            heartbeat (float): The seconds between two updates of the modification time of the running job.
+            fetch_kwargs: chunk_size, receipts, max_in_flight, batch_size, errors, and block_cache
+                (see pipeline.iter_activity_transactions).
+
+        Returns:
+            The number of activities of the shard, or None if the job failed.
+    '''
+    job_name = _job_name(job)
+    running_path = os.path.join(directory, 'running', job_name)
+
+    errors = fetch_kwargs.pop('errors', None)
+    shard_errors = None if errors is None else []
+    with _Heartbeat(running_path, heartbeat):
+        activity_transactions = iter_activity_transactions(
+            activities_dictionary, range(job['from_block'], job['to_block'] + 1), http_provider,
+            errors=shard_errors, **fetch_kwargs)
+        lines = sorted(
+            json.dumps([trace_id, utils.activity_to_json(activity)], sort_keys=True)
+            for trace_id, activity in iter_activities(activity_transactions, activities_dictionary))
+
+    if shard_errors:
+        errors.extend(shard_errors)
+        failed_job = dict(job, errors=[[str(parameter), str(exception)] for parameter, exception in shard_errors])
+        _write_atomically(os.path.join(directory, 'failed', job_name), json.dumps(failed_job).encode())
+        if os.path.exists(running_path):
+            os.remove(running_path)
+        logger.warning(f'{len(shard_errors)} blocks or receipts of the shard from block {job["from_block"]} to '
+                       f'{job["to_block"]} could not be retrieved, e.g. {shard_errors[0][0]}: {shard_errors[0][1]}')
+        return None
+
+    partial_path = os.path.join(directory, 'partials', job_name.replace('.json', '.jsonl.gz'))
+    # mtime=0 keeps the gzip header, and therefore the file, identical for every run of the shard.
+    _write_atomically(partial_path, gzip.compress("".join(line + "\n" for line in lines).encode(), mtime=0))
+
+    if os.path.exists(running_path):
+        os.replace(running_path, os.path.join(directory, 'done', job_name))
+    return len(lines)
+
+
+def run_shard_worker(directory, activities_dictionary, http_provider, max_jobs=None, **fetch_kwargs):
+    '''
+        run_shard_worker claims and runs pending jobs (see claim_shard_job and run_shard_job) until no job is
+        pending. Start one worker per process or machine that shares the directory. A job that raises stays in
+        directory/running, and can be requeued with requeue_stale_shard_jobs. A job whose failed blocks were
+        collected in an errors list (see run_shard_job) is moved to directory/failed, and can be requeued with
+        requeue_failed_shard_jobs.
+
+        Returns:
+            The number of jobs that the worker ran.
+    '''
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    jobs = 0
+    while max_jobs is None or jobs < max_jobs:
+        job = claim_shard_job(directory)
+        if job is None:
+            break
+
+        start = time.perf_counter()
+        activities = run_shard_job(directory, job, activities_dictionary, http_provider, **fetch_kwargs)
+        jobs += 1
+        if activities is None:
+            continue
+        logger.info(f'{worker} extracted {activities} activities from blocks {job["from_block"]} to '
+                    f'{job["to_block"]} in {time.perf_counter() - start:.1f}s.')
+    return jobs
+
+
+def load_partial_logs(directory):
+    '''
+        load_partial_logs combines the partial logs in directory/partials into one log dictionary. Traces whose
+        activities fall into several shards are stitched together, and an activity (i.e. a transaction) that is
+        in several partial logs is kept once. The traces are ordered by their first activity, and the activities
+        of a trace by timestamp, block number, and transaction hash, i.e. the result does not depend on the order
+        in which the shards ran.
+
+        Returns:
+            A dictionary where the keys are the trace ids and the value is a list of activities.
+    '''
+    traces = {}
+    partials_directory = os.path.join(directory, 'partials')
+    for partial_name in sorted(os.listdir(partials_directory)):
+        if not partial_name.endswith('.jsonl.gz'):
+            continue
+        with gzip.open(os.path.join(partials_directory, partial_name), 'rt') as file:
+            for line in file:
+                trace_id, activity = json.loads(line)
+                traces.setdefault(trace_id, {})[activity["instance_id"]] = activity
+
+    log_dic = {
+        trace_id: [utils.activity_from_json(activity) for activity in sorted(activities.values(), key=_activity_key)]
+        for trace_id, activities in traces.items()}
+    return dict(sorted(log_dic.items(), key=lambda trace: (_activity_key(trace[1][0]), trace[0])))
+
+
+def merge_partial_logs(
+    directory,
+    path='./',
+    file_name='automatic_incident_management',
+    process_name="Incident Management Process",
+    compress=False,
+    allow_incomplete=False):
+    '''
+        merge_partial_logs writes the partial logs in directory/partials as one time-ordered XES log
+        (see load_partial_logs).
+
+        Arguments:
+            directory (string): The job queue directory.
+            path (string): The path to the storing location.
+            file_name (string): The file name of the .xes file.
+            process_name (string): The name of the process.
+            compress (bool): Whether the file is compressed with gzip, i.e. written as .xes.gz.
+            allow_incomplete (bool): Whether the log is written although some jobs are not done.
+
+        Returns:
+            The path of the written file.
+    '''
+    unfinished = [
+        job_name for state in ('pending', 'running', 'failed') for job_name in os.listdir(os.path.join(directory, state))]
+    if unfinished and not allow_incomplete:
+        raise Exception(f'{len(unfinished)} shard jobs are not done, e.g. {sorted(unfinished)[0]}!')
+
+    file_path = f'{path}{file_name}.xes' + ('.gz' if compress else '')
+    with open_xes_file(file_path) as file, XesWriter(file, process_name) as writer:
+        writer.write_log_dic(load_partial_logs(directory))
+    return file_path
+
+
+def _activity_key(activity):
+    return activity["instance_id_time_stamp"], activity["instance_id_block_no"], activity["instance_id"]
+
+
+def _job_name(job):
+    return f'{job["from_block"]:012d}-{job["to_block"]:012d}.json'
+
+
+def _write_atomically(path, data):
+    temporary_path = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(data)
+    os.replace(temporary_path, path)
+
+
+class _Heartbeat(object):
+    '''
+        _Heartbeat updates the modification time of path every interval seconds in a background thread, as long
+        as the path exists.
+    '''
+
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                # The job was requeued or finished by another worker.
+                return
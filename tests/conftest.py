@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import importlib.machinery
+import importlib.util
+import os
+import sys
+
+import pytest
+
+
+PACKAGE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The checkout is imported as the package extracting_event_logs_blockchain, whatever the name of its directory.
+# The module extracting_event_logs_blockchain.py in the checkout would otherwise shadow the package.
+_spec = importlib.machinery.ModuleSpec('extracting_event_logs_blockchain', None, is_package=True)
+_spec.submodule_search_locations = [PACKAGE_DIRECTORY]
+sys.modules['extracting_event_logs_blockchain'] = importlib.util.module_from_spec(_spec)
+
+from extracting_event_logs_blockchain import utils  # noqa: E402
+
+
+ACTIVITY_NAMES = [
+    "Customer has a problem", "Get problem description", "Ask 1st level support", "Explain solution",
+    "Ask 2nd level support", "Provide feedback for account manager", "Ask developer",
+    "Provide feedback for 1st level support", "Provide feedback for 2nd level support"]
+FUNCTION_SIGNATURES = [
+    "Customer_Has_a_Problem()", "Get_problem_description(int32)", "Ask_1st_level_support(int32)",
+    "Explain_solution()", "Ask_2nd_level_support()", "Provide_feedback_for_account_manager()", "Ask_developer()",
+    "Provide_feedback_for_1st_level_support()", "Provide_feedback_for_2nd_level_support()"]
+ACTIVITY_RESOURCES = [
+    "Key Account Manager", "Key Account Manager", "Key Account Manager", "Key Account Manager",
+    "1st Level Support", "1st Level Support", "2nd Level Support", "2nd Level Support", "Software Developer"]
+
+
+@pytest.fixture(scope='session')
+def activity_transactions():
+    return utils.load_activity_transactions_from_pickle(os.path.join(PACKAGE_DIRECTORY, 'activity_transactions.pickle'))
+
+
+@pytest.fixture(scope='session')
+def activities_dictionary():
+    return utils.create_activities_dictionary(ACTIVITY_NAMES, FUNCTION_SIGNATURES, ACTIVITY_RESOURCES)
+
+
+@pytest.fixture(scope='session')
+def log_dic(activity_transactions, activities_dictionary):
+    return utils.sort_log_dic_by_time(
+        utils.create_log_dictionary_from_activity_transactions(activity_transactions, activities_dictionary))
+
+
+@pytest.fixture(scope='session')
+def blocks(activity_transactions):
+    from extracting_event_logs_blockchain.mock_node import load_blocks_from_activity_transactions
+
+    return load_blocks_from_activity_transactions(activity_transactions)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+from web3 import Web3
+
+from extracting_event_logs_blockchain import utils
+from extracting_event_logs_blockchain.mock_node import MockEthereumNode
+
+
+@pytest.mark.parametrize('candidate_source', ['trace_filter', 'eth_getLogs'])
+def test_the_contract_address_path_yields_the_log_of_the_block_number_path(
+        activity_transactions, activities_dictionary, blocks, candidate_source):
+    block_numbers = sorted(blocks)
+    contract_addresses = sorted({
+        activity_transaction["transaction"]["to"] for activity_transaction in activity_transactions})
+
+    with MockEthereumNode(blocks) as node:
+        http_provider = utils.connect_to_http_provider(node.url)
+        by_block_number = utils.get_activity_transactions_from_block_numbers(
+            activities_dictionary, block_numbers, http_provider, batch_size=100)
+        node.reset_counters()
+        by_contract_address = utils.get_activity_transactions_from_contract_addresses(
+            activities_dictionary, contract_addresses, block_numbers[0], block_numbers[-1], http_provider,
+            candidate_source=candidate_source, block_range=100)
+
+    assert len(by_contract_address) == len(by_block_number) > 0
+    assert node.calls[candidate_source] == len(range(block_numbers[0], block_numbers[-1] + 1, 100))
+    assert 'eth_getBlockByNumber' in node.calls
+    assert utils.create_log_dictionary_from_activity_transactions(by_contract_address, activities_dictionary) == \
+        utils.create_log_dictionary_from_activity_transactions(by_block_number, activities_dictionary)
+
+
+def test_the_contracts_created_by_a_factory_are_found(blocks):
+    factory_address = '0x' + 'fa' * 20
+    block_number = max(blocks) + 1
+    block = dict(blocks[max(blocks)], number=hex(block_number), hash='0x' + 'b1' * 32)
+    block['transactions'] = [
+        dict(block['transactions'][0], hash=f'0x{index:064x}', blockNumber=hex(block_number),
+             blockHash=block['hash'], transactionIndex=hex(index), **{'from': factory_address, 'to': None})
+        for index in range(1, 3)]
+
+    with MockEthereumNode({**blocks, block_number: block}) as node:
+        contract_addresses = utils.get_contract_addresses_created_by_factory(
+            factory_address, min(blocks), block_number, utils.connect_to_http_provider(node.url))
+
+    assert contract_addresses == [Web3.toChecksumAddress(f'0x{index:040x}') for index in range(1, 3)]
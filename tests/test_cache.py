@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from extracting_event_logs_blockchain import utils
+from extracting_event_logs_blockchain.cache import BlockCache
+from extracting_event_logs_blockchain.formatters import format_block
+from extracting_event_logs_blockchain.mock_node import MockEthereumNode
+
+
+@pytest.fixture
+def block_cache(tmp_path):
+    block_cache = BlockCache(str(tmp_path / 'block_cache.sqlite'), confirmation_depth=0)
+    yield block_cache
+    block_cache.close()
+
+
+def stored_size(block_cache, block):
+    # The size of a block in the cache, i.e. of its compressed JSON.
+    block_cache.put(block, block["number"])
+    size = block_cache.size
+    block_cache.clear()
+    return size
+
+
+def test_a_warm_cache_serves_a_rerun_without_requests(activities_dictionary, blocks, block_cache):
+    block_numbers = sorted(blocks)[:30]
+    with MockEthereumNode(blocks) as node:
+        http_provider = utils.connect_to_http_provider(node.url)
+        cold = utils.get_activity_transactions_from_block_numbers(
+            activities_dictionary, block_numbers, http_provider, block_cache=block_cache)
+        node.reset_counters()
+        warm = utils.get_activity_transactions_from_block_numbers(
+            activities_dictionary, block_numbers, http_provider, block_cache=block_cache)
+
+    assert node.requests == 0
+    assert block_cache.hits == len(block_numbers)
+    assert [activity_transaction["transaction"]["hash"] for activity_transaction in warm] == [
+        activity_transaction["transaction"]["hash"] for activity_transaction in cold]
+
+
+def test_unconfirmed_blocks_are_not_cached(activities_dictionary, blocks, tmp_path):
+    block_numbers = sorted(blocks)[:10] + sorted(blocks)[-10:]
+    block_cache = BlockCache(str(tmp_path / 'block_cache.sqlite'), confirmation_depth=64)
+    with MockEthereumNode(blocks) as node:
+        utils.get_activity_transactions_from_block_numbers(
+            activities_dictionary, block_numbers, utils.connect_to_http_provider(node.url), block_cache=block_cache)
+
+    # The head of the mock node is its latest block.
+    confirmed = {block_number for block_number in block_numbers if block_number <= max(blocks) - 64}
+    assert confirmed and len(confirmed) < len(block_numbers)
+    assert block_cache.cached_block_numbers(block_numbers) == confirmed
+    block_cache.close()
+
+
+def test_the_least_recently_used_blocks_are_evicted(blocks, block_cache):
+    first, second, third = [format_block(blocks[block_number]) for block_number in sorted(blocks)[:3]]
+    block_cache.max_bytes = stored_size(block_cache, first) + stored_size(block_cache, second) + stored_size(
+        block_cache, third) - 1
+
+    block_cache.put(first, first["number"])
+    time.sleep(0.01)
+    block_cache.put(second, second["number"])
+    time.sleep(0.01)
+    # Reading the first block makes the second block the least recently used one.
+    assert block_cache.get(first["number"])["hash"] == first["hash"]
+    time.sleep(0.01)
+    block_cache.put(third, third["number"])
+
+    assert block_cache.cached_block_numbers([first["number"], second["number"], third["number"]]) == {
+        first["number"], third["number"]}
+    assert block_cache.size <= block_cache.max_bytes
+
+
+def test_caches_that_share_a_file_respect_the_maximum_size(blocks, tmp_path):
+    path = str(tmp_path / 'block_cache.sqlite')
+    stored_blocks = [format_block(blocks[block_number]) for block_number in sorted(blocks)[:8]]
+    first_cache = BlockCache(path, confirmation_depth=0)
+    second_cache = BlockCache(path, confirmation_depth=0)
+    max_bytes = 3 * max(stored_size(first_cache, block) for block in stored_blocks)
+    first_cache.max_bytes = second_cache.max_bytes = max_bytes
+
+    for index, block in enumerate(stored_blocks):
+        (first_cache if index % 2 else second_cache).put(block, block["number"])
+
+    assert first_cache.size == second_cache.size <= max_bytes
+    first_cache.close()
+    second_cache.close()
+
+
+def test_clear(blocks, block_cache):
+    block = format_block(blocks[min(blocks)])
+    block_cache.put(block, block["number"])
+    assert len(block_cache) == 1
+
+    block_cache.clear()
+
+    assert len(block_cache) == 0
+    assert block_cache.size == 0
+    assert block_cache.get(block["number"]) is None
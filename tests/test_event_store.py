@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+
+from extracting_event_logs_blockchain import event_store, utils
+
+from conftest import PACKAGE_DIRECTORY
+
+
+def test_a_memory_mapped_store_reproduces_the_log(tmp_path, activity_transactions, activities_dictionary):
+    path = str(tmp_path / 'activity_transactions.events')
+
+    migrated = event_store.migrate_activity_transactions_pickle(
+        os.path.join(PACKAGE_DIRECTORY, 'activity_transactions.pickle'), path)
+    loaded = event_store.load_event_store(path, mmap_mode='r')
+
+    assert len(loaded) == len(migrated) == len(activity_transactions)
+    assert all(isinstance(column, np.memmap) for column in loaded.columns.values())
+    for name, column in migrated.columns.items():
+        assert np.array_equal(loaded.columns[name], column)
+    assert event_store.create_log_dictionary_from_event_store(loaded, activities_dictionary) == \
+        utils.create_log_dictionary_from_activity_transactions(activity_transactions, activities_dictionary)
+
+
+def events_in_the_same_second(activity_transactions):
+    # Two activities of one trace in consecutive blocks with the same timestamp, the later block first.
+    first, second = [
+        activity_transaction for activity_transaction in activity_transactions
+        if activity_transaction["transaction"]["to"] == activity_transactions[0]["transaction"]["to"]][:2]
+    return [
+        {"block": dict(activity_transaction["block"], number=block_number, timestamp=1500000000),
+         "transaction": dict(activity_transaction["transaction"], blockNumber=block_number, transactionIndex=0)}
+        for block_number, activity_transaction in ((5000001, second), (5000000, first))]
+
+
+def instance_ids(log_dic):
+    return {trace_id: [activity["instance_id"] for activity in activities] for trace_id, activities in log_dic.items()}
+
+
+def test_events_in_the_same_second_are_ordered_by_block(activity_transactions, activities_dictionary):
+    same_second = events_in_the_same_second(activity_transactions)
+    store = event_store.EventStore.from_activity_transactions(same_second)
+
+    sorted_by_store = event_store.create_log_dictionary_from_event_store(store, activities_dictionary, sort=True)
+    sorted_by_time = utils.sort_log_dic_by_time(
+        utils.create_log_dictionary_from_activity_transactions(same_second, activities_dictionary))
+
+    assert [activity["instance_id_block_no"] for activity in list(sorted_by_store.values())[0]] == [5000000, 5000001]
+    assert instance_ids(sorted_by_store) == instance_ids(sorted_by_time)
+
+
+def test_both_sorts_order_the_log_identically(activity_transactions, activities_dictionary):
+    store = event_store.EventStore.from_activity_transactions(activity_transactions)
+
+    assert instance_ids(event_store.create_log_dictionary_from_event_store(
+        store, activities_dictionary, sort=True)) == instance_ids(utils.sort_log_dic_by_time(
+            utils.create_log_dictionary_from_activity_transactions(activity_transactions, activities_dictionary)))
+
+
+def test_the_unsorted_store_keeps_the_input_order(activity_transactions, activities_dictionary):
+    # The traces are interleaved in the input, and the later block comes first within the first trace.
+    interleaved = events_in_the_same_second(activity_transactions) + list(activity_transactions)
+    store = event_store.EventStore.from_activity_transactions(interleaved)
+
+    in_input_order = event_store.create_log_dictionary_from_event_store(store, activities_dictionary)
+
+    assert len(in_input_order) > 1
+    assert instance_ids(in_input_order) == instance_ids(
+        utils.create_log_dictionary_from_activity_transactions(interleaved, activities_dictionary))
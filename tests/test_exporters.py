@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+import sys
+
+import pytest
+
+from extracting_event_logs_blockchain.exporters import EVENT_COLUMNS, event_row, write_event_logs_from_log_dic
+
+
+def event_rows(log_dic):
+    return [event_row(trace_id, activity) for trace_id, activities in log_dic.items() for activity in activities]
+
+
+def test_csv_round_trip(tmp_path, log_dic):
+    path = str(tmp_path / 'log.csv')
+
+    assert write_event_logs_from_log_dic(log_dic, [path]) == len(log_dic)
+
+    with open(path, newline="") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == EVENT_COLUMNS
+    assert [(row[0], row[1]) for row in rows[1:]] == [(row[0], row[1]) for row in event_rows(log_dic)]
+
+
+def test_parquet_round_trip(tmp_path, log_dic):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+
+    path = str(tmp_path / 'log.parquet')
+
+    assert write_event_logs_from_log_dic(log_dic, [path]) == len(log_dic)
+
+    table = pyarrow.parquet.read_table(path)
+    assert table.column_names == EVENT_COLUMNS
+    expected_rows = event_rows(log_dic)
+    assert table.num_rows == len(expected_rows)
+    assert table.column("case:concept:name").to_pylist() == [row[0] for row in expected_rows]
+    assert table.column("id").to_pylist() == [row[1] for row in expected_rows]
+    assert table.column("blockNo").to_pylist() == [row[7] for row in expected_rows]
+    assert table.column("time:timestamp").to_pylist() == [row[4] for row in expected_rows]
+
+
+def test_an_unknown_format_opens_no_file(tmp_path, log_dic):
+    xes_path = tmp_path / 'log.xes'
+    xes_path.write_text('previous log')
+
+    with pytest.raises(Exception, match='Unknown export format'):
+        write_event_logs_from_log_dic(log_dic, [str(xes_path), str(tmp_path / 'log.unknown')])
+
+    assert xes_path.read_text() == 'previous log'
+
+
+def test_a_missing_dependency_opens_no_file(tmp_path, log_dic, monkeypatch):
+    # None in sys.modules makes the import of pyarrow fail, whether it is installed or not.
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    xes_path = tmp_path / 'log.xes'
+    xes_path.write_text('previous log')
+
+    with pytest.raises(ImportError, match='pyarrow'):
+        write_event_logs_from_log_dic(log_dic, [str(xes_path), str(tmp_path / 'log.parquet')])
+
+    assert xes_path.read_text() == 'previous log'
+    assert not (tmp_path / 'log.parquet').exists()
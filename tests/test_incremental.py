@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from extracting_event_logs_blockchain import utils
+from extracting_event_logs_blockchain.incremental import CheckpointedExtractor
+from extracting_event_logs_blockchain.mock_node import MockEthereumNode
+
+
+@pytest.fixture
+def chain(blocks):
+    # The blocks of the pickle with empty blocks in between, i.e. a chain without gaps.
+    empty_block = dict(blocks[min(blocks)], transactions=[])
+    return {
+        block_number: blocks.get(block_number) or dict(
+            empty_block, number=hex(block_number), hash=f'0x{block_number:064x}')
+        for block_number in range(min(blocks), max(blocks) + 1)}
+
+
+def instance_ids(log_dic):
+    return {
+        trace_id: sorted(activity["instance_id"] for activity in activities)
+        for trace_id, activities in log_dic.items()}
+
+
+def extract(activities_dictionary, http_provider, checkpoint_path, from_block, to_block):
+    extractor = CheckpointedExtractor(
+        activities_dictionary, http_provider, checkpoint_path, chunk_size=100, batch_size=100)
+    extractor.run(from_block, to_block)
+    return extractor
+
+
+def test_a_resumed_extraction_equals_a_single_run(tmp_path, activities_dictionary, chain):
+    from_block, to_block = min(chain), max(chain)
+    with MockEthereumNode(chain) as node:
+        http_provider = utils.connect_to_http_provider(node.url)
+        single_run = extract(activities_dictionary, http_provider, str(tmp_path / 'single.json'), from_block, to_block)
+
+        checkpoint_path = str(tmp_path / 'resumed.json')
+        extract(activities_dictionary, http_provider, checkpoint_path, from_block, from_block + 250)
+        resumed = extract(activities_dictionary, http_provider, checkpoint_path, from_block, to_block)
+
+    assert resumed.next_block == single_run.next_block == to_block + 1
+    assert single_run.log_dic
+    assert instance_ids(resumed.log_dic) == instance_ids(single_run.log_dic)
+    assert resumed.activities_size == single_run.activities_size
+    assert resumed.block_hashes == single_run.block_hashes
+    assert resumed.block_offsets == single_run.block_offsets
+
+
+def test_a_changed_block_hash_rolls_back_and_extracts_again(tmp_path, activities_dictionary, chain):
+    from_block, to_block = min(chain), max(chain)
+    # A block with activities among the most recent blocks, i.e. within the reorganisation depth.
+    fork_block = max(block_number for block_number, block in chain.items() if block['transactions']
+                     and block_number < to_block)
+    assert fork_block > to_block - 64
+
+    with MockEthereumNode(dict(chain)) as node:
+        http_provider = utils.connect_to_http_provider(node.url)
+        checkpoint_path = str(tmp_path / 'extraction.json')
+        extractor = extract(activities_dictionary, http_provider, checkpoint_path, from_block, to_block)
+        assert extractor.find_fork_block() is None
+
+        # The fork block is replaced by a block without its first transaction.
+        orphaned = node.blocks[fork_block]
+        dropped_hash = orphaned['transactions'][0]['hash']
+        node.blocks[fork_block] = dict(orphaned, hash='0x' + 'ff' * 32, transactions=orphaned['transactions'][1:])
+
+        rollbacks = []
+        extractor.follow(poll_interval=0, max_polls=1, on_rollback=rollbacks.append)
+        reloaded = CheckpointedExtractor(activities_dictionary, http_provider, checkpoint_path, batch_size=100)
+        expected = extract(activities_dictionary, http_provider, str(tmp_path / 'expected.json'), from_block, to_block)
+
+    assert rollbacks == [fork_block]
+    assert extractor.block_hashes[fork_block] == '0x' + 'ff' * 32
+    assert 'i' + dropped_hash not in {
+        activity["instance_id"] for activities in extractor.log_dic.values() for activity in activities}
+    assert instance_ids(extractor.log_dic) == instance_ids(expected.log_dic)
+    assert instance_ids(reloaded.log_dic) == instance_ids(expected.log_dic)
+    assert extractor.activities_size == expected.activities_size
+
+
+def test_activities_appended_after_the_checkpoint_are_ignored(tmp_path, activities_dictionary, chain):
+    from_block, to_block = min(chain), max(chain)
+    with MockEthereumNode(chain) as node:
+        http_provider = utils.connect_to_http_provider(node.url)
+        checkpoint_path = str(tmp_path / 'extraction.json')
+        extractor = extract(activities_dictionary, http_provider, checkpoint_path, from_block, from_block + 250)
+        # A crash after the activities of the next chunk were written, but before the checkpoint was saved.
+        with open(extractor.activities_path, 'ab') as file:
+            file.write(b'["i0x00", {"instance_id": "i0x01"}]\n["i0x00", {"inst')
+
+        crashed = CheckpointedExtractor(
+            activities_dictionary, http_provider, checkpoint_path, chunk_size=100, batch_size=100)
+        assert instance_ids(crashed.log_dic) == instance_ids(extractor.log_dic)
+        crashed.run(from_block, to_block)
+        reloaded = CheckpointedExtractor(activities_dictionary, http_provider, checkpoint_path, batch_size=100)
+        expected = extract(activities_dictionary, http_provider, str(tmp_path / 'expected.json'), from_block, to_block)
+
+    assert instance_ids(reloaded.log_dic) == instance_ids(crashed.log_dic) == instance_ids(expected.log_dic)
+    with open(crashed.activities_path, 'rb') as file:
+        assert len(file.read()) == crashed.activities_size == expected.activities_size
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import threading
+
+from extracting_event_logs_blockchain import instrumentation, utils
+from extracting_event_logs_blockchain.benchmarks import STAGES
+
+
+def test_stop_profile_while_the_stage_runs(tmp_path):
+    profile_path = str(tmp_path / 'stage.prof')
+    settings = instrumentation.capture_profile('profiled', profile_path, trace_memory=True)
+
+    with instrumentation.stage('profiled'):
+        instrumentation.stop_profile('profiled')
+        [bytes(1000) for _ in range(100)]
+
+    assert (tmp_path / 'stage.prof').exists()
+    assert settings['memory_peak'] > 0
+
+
+def test_progress_reporter_counts_from_several_threads():
+    progress_reporter = instrumentation.add_listener(
+        instrumentation.ProgressReporter(interval=0, file=io.StringIO()))
+    try:
+        threads = [threading.Thread(target=lambda: [instrumentation.count('blocks_scanned') for _ in range(2000)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        instrumentation.remove_listener(progress_reporter)
+
+    assert progress_reporter.counters['blocks_scanned'] == 8000
+
+
+def test_the_stages_have_the_names_of_the_benchmarks(activity_transactions, activities_dictionary):
+    metrics = instrumentation.add_listener(instrumentation.Metrics())
+    try:
+        utils.sort_log_dic_by_time(
+            utils.create_log_dictionary_from_activity_transactions(activity_transactions, activities_dictionary))
+    finally:
+        instrumentation.remove_listener(metrics)
+
+    assert set(metrics.timings) == {'create_log_dictionary', 'sort_log_dic_by_time'}
+    assert set(metrics.timings) <= set(STAGES)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from extracting_event_logs_blockchain.log_index import LogIndex
+
+
+def test_two_handles_on_the_same_database(tmp_path, log_dic):
+    path = str(tmp_path / 'log.index.sqlite')
+    trace_ids = list(log_dic)
+    first_half = {trace_id: log_dic[trace_id] for trace_id in trace_ids[:len(trace_ids) // 2]}
+    second_half = {trace_id: log_dic[trace_id] for trace_id in trace_ids[len(trace_ids) // 2:]}
+    first_index, second_index = LogIndex(path), LogIndex(path)
+
+    try:
+        first_index.add_log_dic(first_half)
+        # The same activities, senders, and variants appear in both halves.
+        second_index.add_log_dic(second_half)
+        # Adding the same log through the other handle adds nothing.
+        assert first_index.add_log_dic(second_half) == 0
+
+        events = sum(len(activities) for activities in log_dic.values())
+        assert len(first_index) == len(second_index) == events
+        assert second_index.query_traces(trace_ids=trace_ids[:1]) == trace_ids[:1]
+        assert first_index.query_traces(trace_ids=trace_ids[-1:]) == trace_ids[-1:]
+
+        activity = log_dic[trace_ids[0]][0]
+        for log_index in (first_index, second_index):
+            assert trace_ids[0] in log_index.query_traces(activities=[activity["name"]])
+            assert trace_ids[0] in log_index.query_traces(resources=[activity["name_resource"]])
+            assert trace_ids[0] in log_index.query_traces(senders=[activity["instance_id_from"]])
+        assert first_index.variants() == second_index.variants()
+        assert sum(traces for _, traces in second_index.variants()) == len(log_dic)
+    finally:
+        first_index.close()
+        second_index.close()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import socket
+import time
+
+from extracting_event_logs_blockchain import utils
+from extracting_event_logs_blockchain.mock_node import MockEthereumNode
+from extracting_event_logs_blockchain.rpc import JsonRpcError, RpcBatchClient, RpcClient
+
+
+def unused_url():
+    with socket.socket() as unused_socket:
+        unused_socket.bind(('127.0.0.1', 0))
+        return f'http://127.0.0.1:{unused_socket.getsockname()[1]}'
+
+
+def block_number_request(block_number):
+    return {'jsonrpc': '2.0', 'id': block_number, 'method': 'eth_getBlockByNumber', 'params': [hex(block_number), False]}
+
+
+def test_failover_skips_an_endpoint_that_is_down(blocks):
+    block_numbers = sorted(blocks)[:10]
+    with MockEthereumNode(blocks) as node:
+        down_url = unused_url()
+        rpc_client = RpcClient([down_url, node.url], retries=2, backoff=0.001, max_failures=1, cooldown=60)
+
+        results = [rpc_client.post(block_number_request(block_number)) for block_number in block_numbers]
+
+    assert [int(result['result']['number'], 16) for result in results] == block_numbers
+    assert rpc_client.failures[down_url] == 1
+    assert node.requests == len(block_numbers)
+
+
+def test_failed_requests_are_retried(blocks):
+    block_numbers = sorted(blocks)[:30]
+    with MockEthereumNode(blocks, error_rate=0.3, seed=1) as node:
+        rpc_client = RpcClient(node.url, retries=10, backoff=0.001)
+
+        results = [rpc_client.post(block_number_request(block_number)) for block_number in block_numbers]
+
+    assert [int(result['result']['number'], 16) for result in results] == block_numbers
+    assert node.failed_requests > 0
+    assert rpc_client.retried == node.failed_requests
+
+
+def test_throttled_requests_back_off(blocks):
+    block_numbers = sorted(blocks)[:12]
+    with MockEthereumNode(blocks, rate_limit=5) as node:
+        rpc_client = RpcClient(node.url, retries=5, backoff=0.001)
+
+        start = time.monotonic()
+        results = [rpc_client.post(block_number_request(block_number)) for block_number in block_numbers]
+        seconds = time.monotonic() - start
+
+    assert [int(result['result']['number'], 16) for result in results] == block_numbers
+    assert node.throttled_requests > 0
+    rate_limiter = rpc_client.rate_limiters[node.url]
+    assert rate_limiter.throttled == node.throttled_requests
+    # The node asks for a pause of one second (Retry-After), and the client honours it.
+    assert seconds >= 1
+    assert rate_limiter.rate is not None
+
+
+def test_concurrent_fetching_keeps_the_order_with_latency_jitter(activities_dictionary, blocks):
+    with MockEthereumNode(blocks, latency=0.005, latency_jitter=0.02, seed=1) as node:
+        http_provider = utils.connect_to_http_provider(RpcClient(node.url))
+        sequential = utils.get_activity_transactions_from_block_numbers(
+            activities_dictionary, sorted(blocks), http_provider)
+        concurrent = utils.get_activity_transactions_from_block_numbers(
+            activities_dictionary, sorted(blocks), http_provider, max_in_flight=8)
+
+    assert len(concurrent) == len(sequential) > 0
+    assert [activity_transaction["transaction"]["hash"] for activity_transaction in concurrent] == [
+        activity_transaction["transaction"]["hash"] for activity_transaction in sequential]
+
+
+def test_failing_batches_are_not_split(blocks):
+    block_numbers = sorted(blocks)[:100]
+    with MockEthereumNode(blocks, error_rate=1.0) as node:
+        rpc_batch_client = RpcBatchClient(node.url, batch_size=100, retries=1)
+        rpc_batch_client.rpc_client.backoff = 0.001
+
+        results = rpc_batch_client.get_blocks_by_number(block_numbers)
+
+    assert all(isinstance(result, JsonRpcError) for result in results)
+    # One request per attempt, i.e. the batch is neither split nor sent again in halves.
+    assert node.failed_requests == 2
+
+
+def test_batches_that_are_too_large_are_split(blocks):
+    block_numbers = sorted(blocks)[:100]
+    with MockEthereumNode(blocks) as node:
+        handle = node.handle
+
+        def handle_at_most_30_calls(body):
+            if len(json.loads(body)) > 30:
+                return json.dumps({'jsonrpc': '2.0', 'id': None, 'error': {
+                    'code': -32600, 'message': 'batch size too large'}}).encode()
+            return handle(body)
+        node.handle = handle_at_most_30_calls
+
+        results = RpcBatchClient(node.url, batch_size=100).get_blocks_by_number(block_numbers)
+
+    assert [result["number"] for result in results] == block_numbers
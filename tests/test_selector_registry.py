@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pickle
+
+from extracting_event_logs_blockchain import utils
+from extracting_event_logs_blockchain.exporters import event_attributes
+from extracting_event_logs_blockchain.selector_registry import SelectorRegistry, create_matcher
+
+from conftest import ACTIVITY_NAMES, ACTIVITY_RESOURCES, FUNCTION_SIGNATURES
+
+
+ABI = [{
+    'type': 'function', 'name': 'Assign_ticket',
+    'inputs': [{'name': 'from', 'type': 'address'}, {'name': 'id', 'type': 'uint256'}, {'name': '', 'type': 'bool'}]}]
+
+
+def test_matcher_finds_the_activity_transactions(activity_transactions, activities_dictionary):
+    match = pickle.loads(pickle.dumps(create_matcher(activities_dictionary)))
+
+    assert all(match(activity_transaction["transaction"]["input"]) for activity_transaction in activity_transactions)
+    assert match('0xdeadbeef') is None
+    assert match('0x') is None
+
+
+def test_batch_decoding_equals_single_decoding(activity_transactions):
+    selector_registry = SelectorRegistry.from_signatures(ACTIVITY_NAMES, FUNCTION_SIGNATURES, ACTIVITY_RESOURCES)
+    inputs = [activity_transaction["transaction"]["input"] for activity_transaction in activity_transactions]
+
+    decoded_arguments = selector_registry.decode_arguments_batch(inputs)
+
+    assert decoded_arguments == [selector_registry.decode_arguments(input_data) for input_data in inputs]
+    assert any(arguments == [('arg:0', 'int', 2)] for arguments in decoded_arguments)
+
+
+def test_arguments_do_not_overwrite_event_attributes(activity_transactions):
+    selector_registry = SelectorRegistry.from_abi(ABI)
+    function_selector = next(iter(selector_registry))
+    input_data = function_selector + '00' * 12 + '11' * 20 + '00' * 31 + '07' + '00' * 31 + '01'
+    activity_transaction = {
+        "block": activity_transactions[0]["block"],
+        "transaction": dict(activity_transactions[0]["transaction"], input=input_data)}
+
+    _, activity = utils.create_activity_from_activity_transaction(activity_transaction, selector_registry)
+    attributes = dict((key, value) for key, _, value in event_attributes(activity))
+
+    assert attributes["from"] == activity_transactions[0]["transaction"]["from"]
+    assert attributes["arg:from"] == '0x' + '11' * 20
+    assert attributes["arg:id"] == 7
+    assert attributes["arg:2"] is True
+
+
+def test_undecodable_input_has_no_arguments():
+    selector_registry = SelectorRegistry.from_signatures(ACTIVITY_NAMES, FUNCTION_SIGNATURES, ACTIVITY_RESOURCES)
+    function_selector = next(
+        function_selector for function_selector, activity in selector_registry.items()
+        if activity["function_signature"].endswith('(int32)'))
+
+    # An odd number of hex digits, and too few bytes for an int32.
+    assert selector_registry.decode_arguments(function_selector + '123') == []
+    assert selector_registry.decode_arguments(function_selector + '00' * 3) == []
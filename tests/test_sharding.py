@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+
+import pytest
+
+from extracting_event_logs_blockchain import sharding, utils
+from extracting_event_logs_blockchain.mock_node import MockEthereumNode
+from extracting_event_logs_blockchain.rpc import RpcClient
+
+
+def test_a_claimed_job_is_not_stale(tmp_path):
+    directory = str(tmp_path)
+    sharding.create_shard_jobs(directory, 100, 199, shard_size=100)
+    # A job that waited in the queue for a long time.
+    pending_path = os.path.join(directory, 'pending', os.listdir(os.path.join(directory, 'pending'))[0])
+    os.utime(pending_path, (0, 0))
+
+    job = sharding.claim_shard_job(directory)
+
+    assert job == {'from_block': 100, 'to_block': 199}
+    assert sharding.requeue_stale_shard_jobs(directory, timeout=3600) == 0
+
+
+def test_the_heartbeat_keeps_a_running_job_fresh(tmp_path):
+    path = str(tmp_path / 'job.json')
+    open(path, 'w').close()
+    os.utime(path, (0, 0))
+
+    with sharding._Heartbeat(path, 0.01):
+        time.sleep(0.1)
+
+    assert time.time() - os.path.getmtime(path) < 60
+
+
+def test_a_job_with_failed_blocks_is_not_done(tmp_path, activities_dictionary, blocks):
+    directory = str(tmp_path)
+    # The node serves only the blocks of the activity transactions, i.e. the shard is a single block.
+    block_number = min(blocks)
+    sharding.create_shard_jobs(directory, block_number, block_number)
+
+    errors = []
+    with MockEthereumNode(blocks) as node:
+        http_provider = utils.connect_to_http_provider(RpcClient(node.url, retries=0, backoff=0.001))
+        node.error_rate = 1.0
+        assert sharding.run_shard_worker(directory, activities_dictionary, http_provider, errors=errors) == 1
+
+    assert errors
+    assert os.listdir(os.path.join(directory, 'failed'))
+    assert not os.listdir(os.path.join(directory, 'done'))
+    assert not os.listdir(os.path.join(directory, 'partials'))
+    with pytest.raises(Exception):
+        sharding.merge_partial_logs(directory, path=f'{directory}/')
+
+    assert sharding.requeue_failed_shard_jobs(directory) == 1
+    with MockEthereumNode(blocks) as node:
+        http_provider = utils.connect_to_http_provider(node.url)
+        assert sharding.run_shard_worker(directory, activities_dictionary, http_provider, errors=[]) == 1
+
+    assert os.listdir(os.path.join(directory, 'done'))
+    assert os.listdir(os.path.join(directory, 'partials'))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+import time
+
+import pytest
+
+from extracting_event_logs_blockchain import utils
+from extracting_event_logs_blockchain.mock_node import MockEthereumNode
+
+
+def test_map_in_order_keeps_the_order_of_the_items():
+    items = list(range(50))
+    # Later items finish first, e.g. like blocks that a node returns with different latencies.
+    random_generator = random.Random(1)
+    delays = [random_generator.uniform(0, 0.01) for _ in items]
+
+    def double_after_a_delay(item):
+        time.sleep(delays[item])
+        return item * 2
+
+    assert list(utils.map_in_order(double_after_a_delay, items, max_in_flight=8)) == [item * 2 for item in items]
+
+
+def test_map_in_order_bounds_the_calls_in_flight():
+    lock = threading.Lock()
+    running, most_running = [0], [0]
+
+    def count_running(item):
+        with lock:
+            running[0] += 1
+            most_running[0] = max(most_running[0], running[0])
+        time.sleep(0.005)
+        with lock:
+            running[0] -= 1
+        return item
+
+    assert list(utils.map_in_order(count_running, range(40), max_in_flight=4)) == list(range(40))
+    assert 1 < most_running[0] <= 4
+
+
+@pytest.mark.parametrize('max_in_flight', [1, 4])
+def test_map_in_order_raises_the_exception_of_a_call(max_in_flight):
+    def fail_on_three(item):
+        if item == 3:
+            raise ValueError(item)
+        return item
+
+    results = utils.map_in_order(fail_on_three, range(10), max_in_flight=max_in_flight)
+
+    assert [next(results) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(ValueError):
+        next(results)
+
+
+def test_plan_block_fetches_counts_the_saved_fetches():
+    plan = utils.plan_block_fetches([1196607, 1196605, 1196607, '1196606', 1196605, 1196607])
+
+    assert plan.block_numbers == [1196605, 1196606, 1196607]
+    assert plan.requested == 6
+    assert plan.saved_fetches == 3
+
+
+@pytest.mark.parametrize('max_in_flight', [1, 4])
+def test_blocks_are_retrieved_once_and_in_ascending_order(activities_dictionary, blocks, max_in_flight):
+    block_numbers = sorted(blocks)[:30]
+    requested = list(reversed(block_numbers)) + block_numbers[:5]
+
+    with MockEthereumNode(blocks) as node:
+        http_provider = utils.connect_to_http_provider(node.url)
+        node.reset_counters()
+        activity_transactions = utils.get_activity_transactions_from_block_numbers(
+            activities_dictionary, requested, http_provider, max_in_flight=max_in_flight)
+
+    assert node.calls['eth_getBlockByNumber'] == len(block_numbers)
+    fetched_block_numbers = [activity_transaction["block"]["number"] for activity_transaction in activity_transactions]
+    assert fetched_block_numbers == sorted(fetched_block_numbers)
+    assert set(fetched_block_numbers) == set(block_numbers)
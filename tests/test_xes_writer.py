@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+
+from extracting_event_logs_blockchain import utils
+from extracting_event_logs_blockchain.xes_writer import write_xes_log_from_log_dic
+
+
+def read_xes(file_path, open_function=open):
+    '''
+        read_xes returns the lines of the XES file, with the extensions sorted, because opyenxes keeps them in a set.
+    '''
+    with open_function(file_path, 'rt') as file:
+        lines = file.readlines()
+    extensions = sorted(line for line in lines if line.startswith('\t<extension '))
+    return extensions + [line for line in lines if not line.startswith('\t<extension ')]
+
+
+def write_both(log_dic, tmp_path):
+    path = f'{tmp_path}/'
+    utils.write_xes_log_to_disc(utils.create_xes_log_from_log_dic(log_dic), path=path, file_name='opyenxes')
+    write_xes_log_from_log_dic(log_dic, path=path, file_name='xes_writer')
+    return read_xes(tmp_path / 'opyenxes.xes'), read_xes(tmp_path / 'xes_writer.xes')
+
+
+def test_xes_writer_matches_opyenxes(log_dic, tmp_path):
+    opyenxes_lines, xes_writer_lines = write_both(log_dic, tmp_path)
+
+    assert xes_writer_lines == opyenxes_lines
+    assert sum(line.startswith('\t<trace>') for line in xes_writer_lines) == len(log_dic)
+
+
+def test_xes_writer_matches_opyenxes_with_receipts_and_arguments(log_dic, tmp_path):
+    trace_id, activities = next(iter(log_dic.items()))
+    activities = [dict(activity) for activity in activities]
+    activities[0].update({
+        "name": 'Ask <2nd> level & "support"',
+        "instance_id_gas_used": 21316,
+        "instance_id_cost": 21316 * 20 * 10 ** 9,
+        "instance_id_reverted": True,
+        "arguments": [
+            ("arg:ticket", "int", 42), ("arg:note", "string", 'a < b & "c"'), ("arg:urgent", "boolean", True),
+            ("arg:ratio", "float", 0.25)]})
+    activities[1].update({"instance_id_gas_used": 21000, "instance_id_cost": 21000 * 10 ** 9})
+
+    opyenxes_lines, xes_writer_lines = write_both({trace_id: activities}, tmp_path)
+
+    assert xes_writer_lines == opyenxes_lines
+    assert any('ate_abort' in line for line in xes_writer_lines)
+
+
+def test_xes_writer_matches_opyenxes_with_a_zero_cost(log_dic, tmp_path):
+    trace_id, activities = next(iter(log_dic.items()))
+    activities = [dict(activity, instance_id_gas_used=21000, instance_id_cost=0) for activity in activities]
+
+    opyenxes_lines, xes_writer_lines = write_both({trace_id: activities}, tmp_path)
+
+    assert xes_writer_lines == opyenxes_lines
+    assert sum('key="cost:total" value="0.0"' in line for line in xes_writer_lines) == len(activities)
+
+
+def test_compressed_xes_log_has_the_same_content(log_dic, tmp_path):
+    path = f'{tmp_path}/'
+    write_xes_log_from_log_dic(log_dic, path=path, file_name='plain')
+    write_xes_log_from_log_dic(log_dic, path=path, file_name='compressed', compress=True)
+
+    assert read_xes(tmp_path / 'compressed.xes.gz', gzip.open) == read_xes(tmp_path / 'plain.xes')
@@ -2,28 +2,22 @@
 # -*- coding: utf-8 -*-
 
 import glob
+import gzip
+import json
+import logging
 import pickle
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain, islice
 
-from Crypto.Hash import keccak
-from web3.auto.infura import w3
-from web3 import Web3
-
-# OpyenXES
-## XES Serializer
-from opyenxes.data_out.XesXmlSerializer import XesXmlSerializer
-## XES Log
-from opyenxes.factory.XFactory import XFactory
-from opyenxes.factory.XFactoryRegistry import XFactoryRegistry
-## XES Log extensions
-from opyenxes.extension.XExtension import XExtension
-from opyenxes.extension.XExtensionManager import XExtensionManager
-from opyenxes.extension.std.XConceptExtension import XConceptExtension
-from opyenxes.extension.std.XTimeExtension import XTimeExtension
-from opyenxes.extension.std.XOrganizationalExtension import XOrganizationalExtension
-from opyenxes.extension.std.XLifecycleExtension import XLifecycleExtension
-from opyenxes.extension.std.XCostExtension import XCostExtension
-from opyenxes.extension.std.XIdentityExtension import XIdentityExtension
+# web3, pycryptodome, OpyenXES, and the RPC client (requests) are imported by the functions that use them,
+# so that building a log offline, e.g. from a pickle, neither loads them nor needs a node.
+from . import instrumentation
+from .selector_registry import SelectorRegistry, create_matcher
+
+
+logger = logging.getLogger(__name__)
 
 
 def connect_to_http_provider(
@@ -37,19 +31,54 @@ def connect_to_http_provider(
 
         Arguments:
             http_provider (string): A unified ressource locator (URL) to a blockchain service, e.g. Infura.
+                A list of URLs or an RpcClient distributes the requests over several nodes (see create_http_provider).
             timeout (int): An integer determining the time period for which the client is alive.
 
         Returns:
             A web3 http provider object.
     '''
-    http_provider = Web3(
-        Web3.HTTPProvider(http_provider,
-                          request_kwargs={'timeout': timeout}))
+    http_provider = create_http_provider(http_provider, timeout)
 
     if http_provider.isConnected():
         return http_provider
     else:
-        raise Exception(f'Connection to {http_provider} failed!')
+        raise Exception(f'Connection to {http_provider.provider} failed!')
+
+
+def create_http_provider(http_provider, timeout=60):
+    '''
+        create_http_provider creates a w3 object without checking the connection.
+
+        Arguments:
+            http_provider (string, list, or RpcClient): A URL creates a plain Web3.HTTPProvider. A list of URLs
+                or an RpcClient creates a provider that sends all requests through one RpcClient, i.e. with a
+                pooled session, rate limiting, retries, and failover (see rpc.RpcClient). The fetch functions
+                of this module send their JSON-RPC batches through the same RpcClient.
+            timeout (int): The number of seconds to wait for a response.
+
+        Returns:
+            A web3 http provider object.
+    '''
+    from web3 import Web3
+    from .rpc import RpcClient, RpcClientProvider
+
+    if isinstance(http_provider, str):
+        return Web3(Web3.HTTPProvider(http_provider, request_kwargs={'timeout': timeout}))
+    if not isinstance(http_provider, RpcClient):
+        http_provider = RpcClient(http_provider, timeout=timeout)
+    return Web3(RpcClientProvider(http_provider))
+
+
+def create_rpc_batch_client(http_provider, batch_size=100):
+    '''
+        create_rpc_batch_client creates an RpcBatchClient for the node of the w3 object http_provider. If the w3
+        object was created with an RpcClient (see create_http_provider), the batches share it.
+    '''
+    from .rpc import RpcBatchClient
+
+    return RpcBatchClient(
+        getattr(http_provider.provider, 'rpc_client', None) or http_provider.provider.endpoint_uri,
+        batch_size=batch_size)
 
 
 def create_function_selector_for_function_signature(function_signature):
@@ -72,6 +101,8 @@ def create_function_selector_for_function_signature(function_signature):
             >> create_function_selector_for_function_signature('Customer_Has_a_Problem()')
             '0xefe73dcb'
     '''
+    from Crypto.Hash import keccak
+
     keccak_hash = keccak.new(digest_bits=256)
 
     function_signature = str.encode(function_signature)
@@ -132,7 +163,7 @@ def create_activities_dictionary(activity_names, function_signatures, activity_r
     return activities_dictionary
 
 
-def get_activity_transactions_from_block_number(activities_dictionary, block_number, http_provider):
+def get_activity_transactions_from_block_number(activities_dictionary, block_number, http_provider, block_cache=None):
     '''
         get_activity_transactions_from_block_number retrieves the given block number and
         searches in the transactions of the retrieved block for transactions that are associated to an activity.
@@ -145,52 +176,605 @@ def get_activity_transactions_from_block_number(activities_dictionary, block_num
             block_number (int): An integer that specifies the block that should be retrieved.
             http_provider (w3 object): A w3 object that has established a connection to a blockchain node.
                 Idially, the object is created with connect_to_http_provider.
+            block_cache (BlockCache): If given, the block is read from the cache, and stored in the cache
+                after it has been retrieved (see cache.BlockCache).
 
         Returns:
             activity_transactions (list): The activity_transactions as a list. Each entry in the list is an
                 unprocessed transaction from the blockchain.
     '''
+    _, block = next(iter_blocks([block_number], http_provider, block_cache=block_cache))
+    return get_activity_transactions_from_block(activities_dictionary, block)
+
+
+def get_activity_transactions_from_block(activities_dictionary, block, match=None):
+    '''
+        get_activity_transactions_from_block searches in the transactions of the given block for
+        transactions that are associated to an activity (see get_activity_transactions_from_block_number).
+
+        Arguments:
+            activities_dictionary (dictionary): A dictionary where the keys are function selectors (see above).
+            block (AttributeDict): A block with full transactions.
+            match (callable): The matcher of activities_dictionary (see selector_registry.create_matcher). Pass it
+                when many blocks are searched, so that it is created once.
+
+        Returns:
+            activity_transactions (list): The activity_transactions as a list.
+    '''
+    match = match or create_matcher(activities_dictionary)
     activity_transactions = []
 
-    block = http_provider.eth.getBlock(block_number, full_transactions=True)
     for transaction in block["transactions"]:
-        input_data = transaction["input"]
-        function_selector = input_data[:10]
-        if function_selector in activities_dictionary:
+        if match(transaction["input"]):
             # The first 4 bytes are equal to one key in activites. Therefore, the transaction is
             # associated to an activity.
             activity_transactions.append({"block": block, "transaction": transaction})
 
+    instrumentation.count('blocks_scanned')
+    instrumentation.count('transactions_scanned', len(block["transactions"]))
+    instrumentation.count('transactions_matched', len(activity_transactions))
     return activity_transactions
 
 
-def get_activity_transactions_from_block_numbers(activities_dictionary, block_numbers, http_provider):
+@instrumentation.staged('fetch')
+def get_activity_transactions_from_block_numbers(
+    activities_dictionary,
+    block_numbers,
+    http_provider,
+    max_in_flight=1,
+    batch_size=None,
+    errors=None,
+    block_cache=None,
+    receipts=False,
+    block_receipts=False):
     '''
 
         Arguments
             activities_dictionary (dictionary): A dictionary where the keys are function selectors (see above).
                 Idially, the dictionary is created with the function create_activities_dictionary from above.
             block_number (list): A list of integers that specify the blocks that should be searched for activity
-                transactions, i.e. transactions that are associated to activity executions.
+                transactions, i.e. transactions that are associated to activity executions. Block numbers that
+                occur more than once are retrieved only once, and the blocks are retrieved in ascending order,
+                whatever the order of block_numbers (see plan_block_fetches).
             http_provider (w3 object): A w3 object that has established a connection to a blockchain node.
                 Idially, the object is created with connect_to_http_provider.
+            max_in_flight (int): The maximum number of blocks that are requested from the node at the same time.
+                With the default of 1 the blocks are retrieved one after the other. Larger values retrieve the
+                blocks concurrently in a thread pool.
+            batch_size (int): If set, the blocks are retrieved in JSON-RPC batches of batch_size blocks, i.e. one
+                HTTP request retrieves batch_size blocks. With max_in_flight, several batches are in flight.
+            errors (list): If a list is given, the blocks that could not be retrieved are appended as
+                (block_number, exception) tuples and the remaining blocks are processed.
+                Otherwise, the first error is raised.
+            block_cache (BlockCache): If given, cached blocks are read from the cache instead of the node, and
+                retrieved blocks are stored in the cache once they are confirmed (see cache.BlockCache).
+                A warm cache serves a re-run without any calls to the node.
+            receipts (bool): Whether the transaction receipts are retrieved as well (see
+                iter_activity_transactions_with_receipts). The receipts are retrieved in batches while the
+                next blocks are retrieved. Receipts that could not be retrieved are reported like blocks (see errors).
+            block_receipts (bool): Whether the receipts are retrieved with eth_getBlockReceipts instead of
+                eth_getTransactionReceipt, if the node supports it.
 
         Returns:
-            activity_transactions (list): The activity_transactions as a list. Each entry in the list is an
-                unprocessed transaction from the blockchain.
+            activity_transactions (list): The activity_transactions as a list, ordered by ascending block number
+                and by position within the block, not by the order of block_numbers. Each entry in the list is
+                an unprocessed transaction from the blockchain.
 
     '''
-    activity_transactions = []
+    plan = plan_block_fetches(block_numbers)
+    logger.info(
+        f'Retrieving {len(plan.block_numbers)} blocks for {plan.requested} block numbers '
+        f'({plan.saved_fetches} fetches saved).')
+
+    match = create_matcher(activities_dictionary)
+    activity_transactions = (
+        activity_transaction
+        for _, block in iter_blocks(plan.block_numbers, http_provider, max_in_flight, batch_size, errors, block_cache)
+        for activity_transaction in get_activity_transactions_from_block(activities_dictionary, block, match))
+
+    if receipts:
+        activity_transactions = iter_activity_transactions_with_receipts(
+            activity_transactions, http_provider, batch_size or 100, block_receipts, errors)
+
+    return list(activity_transactions)
+
+
+def get_activity_transactions_by_block_number(
+    activities_dictionary,
+    block_numbers,
+    http_provider,
+    max_in_flight=1,
+    batch_size=None,
+    errors=None,
+    block_cache=None):
+    '''
+        get_activity_transactions_by_block_number retrieves every distinct block of block_numbers once and
+        maps the activity transactions of each block back to its block number. The arguments are the same as
+        for get_activity_transactions_from_block_numbers.
+
+        Returns:
+            A dictionary where the key is a block number of block_numbers and the value is the list of
+            activity transactions in that block. Blocks that could not be retrieved (see errors) are missing.
+    '''
+    plan = plan_block_fetches(block_numbers)
+    match = create_matcher(activities_dictionary)
 
-    for block_number in block_numbers:
-        activity_transactions_from_block = get_activity_transactions_from_block_number(
-            activities_dictionary, block_number, http_provider)
+    return {
+        block_number: get_activity_transactions_from_block(activities_dictionary, block, match)
+        for block_number, block in iter_blocks(plan.block_numbers, http_provider, max_in_flight, batch_size, errors, block_cache)}
 
-        activity_transactions.extend(activity_transactions_from_block)
+
+def get_receipts_for_activity_transactions(
+    activity_transactions,
+    http_provider,
+    batch_size=100,
+    block_receipts=False,
+    errors=None,
+    rpc_client=None):
+    '''
+        get_receipts_for_activity_transactions retrieves the transaction receipts of activity_transactions in
+        JSON-RPC batches, and adds every receipt to its activity transaction with the key receipt. The receipt
+        tells the gas that was actually used and, from the Byzantium fork on, whether the call succeeded
+        (see is_reverted).
+
+        Arguments:
+            activity_transactions (list): A list of activity transactions.
+            http_provider (w3 object): A w3 object that has established a connection to a blockchain node.
+            batch_size (int): The number of receipts that are retrieved with one HTTP request.
+            block_receipts (bool): Whether all receipts of a block are retrieved with one eth_getBlockReceipts
+                call instead of one eth_getTransactionReceipt call per transaction. If the node does not
+                support eth_getBlockReceipts, eth_getTransactionReceipt is used.
+            errors (list): If a list is given, the receipts that could not be retrieved are appended as
+                (transaction_hash, exception) tuples and the activity transaction is kept without receipt.
+                Otherwise, the first error is raised.
+            rpc_client (RpcBatchClient): The client that retrieves the receipts. It remembers whether the node
+                supports eth_getBlockReceipts (see RpcBatchClient.unsupported_methods), so pass the same client
+                to many calls. By default, a new client is created.
+
+        Returns:
+            activity_transactions (list): The same list.
+    '''
+    from .rpc import JsonRpcError
+
+    if not activity_transactions:
+        return activity_transactions
+
+    rpc_client = rpc_client or create_rpc_batch_client(http_provider, batch_size)
+    transaction_hashes = [
+        '0x' + bytes(activity_transaction["transaction"]["hash"]).hex() for activity_transaction in activity_transactions]
+
+    receipts = None
+    if block_receipts and 'eth_getBlockReceipts' not in rpc_client.unsupported_methods:
+        block_numbers = sorted({
+            activity_transaction["transaction"]["blockNumber"] for activity_transaction in activity_transactions})
+        results = rpc_client.get_block_receipts(block_numbers)
+
+        if all(isinstance(result, JsonRpcError) and result.code == -32601 for result in results):
+            logger.info('eth_getBlockReceipts is not available, using eth_getTransactionReceipt instead.')
+        else:
+            receipts_by_hash, block_errors = {}, {}
+            for block_number, result in zip(block_numbers, results):
+                if isinstance(result, Exception):
+                    block_errors[block_number] = result
+                    continue
+                for receipt in result:
+                    receipts_by_hash['0x' + bytes(receipt["transactionHash"]).hex()] = receipt
+
+            receipts = [
+                receipts_by_hash.get(transaction_hash) or block_errors.get(
+                    activity_transaction["transaction"]["blockNumber"],
+                    JsonRpcError(f'eth_getBlockReceipts returned no receipt for {transaction_hash}'))
+                for transaction_hash, activity_transaction in zip(transaction_hashes, activity_transactions)]
+
+    if receipts is None:
+        receipts = rpc_client.get_transaction_receipts(transaction_hashes)
+
+    for transaction_hash, activity_transaction, receipt in zip(transaction_hashes, activity_transactions, receipts):
+        if isinstance(receipt, Exception):
+            if errors is None:
+                raise receipt
+            errors.append((transaction_hash, receipt))
+            continue
+        activity_transaction["receipt"] = receipt
 
     return activity_transactions
 
 
+def iter_activity_transactions_with_receipts(
+    activity_transactions,
+    http_provider,
+    batch_size=100,
+    block_receipts=False,
+    errors=None):
+    '''
+        iter_activity_transactions_with_receipts adds the receipts to a stream of activity transactions
+        (see get_receipts_for_activity_transactions). The receipts of one batch are retrieved in a background
+        thread while the next batch is taken from activity_transactions, i.e. while the next blocks are
+        retrieved, so the receipts do not add a round trip per activity transaction or per block.
+
+        Returns:
+            A generator over the activity transactions in the order of activity_transactions.
+    '''
+    activity_transactions = iter(activity_transactions)
+    batches = iter(lambda: list(islice(activity_transactions, batch_size)), [])
+    rpc_client = create_rpc_batch_client(http_provider, batch_size)
+
+    in_flight = None
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for batch in batches:
+            future = executor.submit(
+                get_receipts_for_activity_transactions, batch, http_provider, batch_size, block_receipts, errors,
+                rpc_client)
+            if in_flight is not None:
+                yield from in_flight.result()
+            in_flight = future
+
+        if in_flight is not None:
+            yield from in_flight.result()
+
+
+def is_reverted(activity_transaction):
+    '''
+        is_reverted tells whether the call of an activity transaction with receipt failed, i.e. it was reverted
+        and changed nothing but the balance of the sender. From the Byzantium fork (block 4,370,000 on the main
+        network) on, the receipt has a status. Before, a failed call used all its gas, which is used instead.
+
+        Returns:
+            True if the call failed, False if it succeeded or there is no receipt.
+    '''
+    receipt = activity_transaction.get("receipt")
+    if receipt is None:
+        return False
+    if receipt.get("status") is not None:
+        return receipt["status"] == 0
+    return receipt["gasUsed"] == activity_transaction["transaction"]["gas"]
+
+
+def remove_reverted_activity_transactions(activity_transactions):
+    '''
+        remove_reverted_activity_transactions returns the activity transactions whose call did not fail
+        (see is_reverted).
+    '''
+    return [
+        activity_transaction for activity_transaction in activity_transactions
+        if not is_reverted(activity_transaction)]
+
+
+def get_activity_transactions_from_transaction_hashes(
+    activities_dictionary,
+    transaction_hashes,
+    http_provider,
+    batch_size=100,
+    max_in_flight=1,
+    errors=None):
+    '''
+        get_activity_transactions_from_transaction_hashes retrieves only the given transactions, e.g. the Txhash
+        column of the Etherscan exports, instead of searching full blocks. The header of every block that
+        contains one of the transactions is retrieved once, without its transactions, for the timestamp.
+        Both are retrieved in JSON-RPC batches of batch_size calls.
+
+        Arguments:
+            activities_dictionary (dictionary): A dictionary where the keys are function selectors (see above).
+            transaction_hashes (list): A list of transaction hashes as hex strings.
+            http_provider (w3 object): A w3 object that has established a connection to a blockchain node.
+            batch_size (int): The number of calls that are sent in one HTTP request.
+            max_in_flight (int): The maximum number of batches that are in flight at the same time.
+            errors (list): If a list is given, the transactions and blocks that could not be retrieved are
+                appended as (transaction hash or block number, JsonRpcError) tuples. Otherwise, the first
+                error is raised. Pending transactions, i.e. transactions that are not in a block yet, are
+                reported in the same way.
+
+        Returns:
+            activity_transactions (list): The activity_transactions in the order of transaction_hashes. Each
+                entry has the same keys as the entries returned by get_activity_transactions_from_block_numbers,
+                but "block" is the block header without transactions. Transactions whose function selector is
+                not in activities_dictionary are left out.
+    '''
+    from .rpc import JsonRpcError
+
+    rpc_client = create_rpc_batch_client(http_provider, batch_size)
+    match = create_matcher(activities_dictionary)
+
+    transaction_hashes = list(dict.fromkeys(transaction_hashes))
+    transactions = _batch_map_in_order(rpc_client.get_transactions_by_hash, transaction_hashes, batch_size, max_in_flight)
+
+    activity_transactions = []
+    for transaction_hash, transaction in zip(transaction_hashes, transactions):
+        if not isinstance(transaction, Exception) and transaction["blockNumber"] is None:
+            transaction = JsonRpcError(
+                f'the transaction {transaction_hash} is pending', method='eth_getTransactionByHash',
+                params=[transaction_hash])
+        if isinstance(transaction, Exception):
+            if errors is None:
+                raise transaction
+            errors.append((transaction_hash, transaction))
+        elif match(transaction["input"]):
+            activity_transactions.append({"block": None, "transaction": transaction})
+
+    plan = plan_block_fetches(
+        activity_transaction["transaction"]["blockNumber"] for activity_transaction in activity_transactions)
+    headers = _batch_map_in_order(
+        lambda block_numbers: rpc_client.get_blocks_by_number(block_numbers, full_transactions=False),
+        plan.block_numbers, batch_size, max_in_flight)
+
+    blocks = {}
+    for block_number, header in zip(plan.block_numbers, headers):
+        if isinstance(header, Exception):
+            if errors is None:
+                raise header
+            errors.append((block_number, header))
+        else:
+            blocks[block_number] = header
+
+    for activity_transaction in activity_transactions:
+        activity_transaction["block"] = blocks.get(activity_transaction["transaction"]["blockNumber"])
+
+    return [activity_transaction for activity_transaction in activity_transactions if activity_transaction["block"]]
+
+
+def get_activity_transactions_from_contract_addresses(
+    activities_dictionary,
+    contract_addresses,
+    from_block,
+    to_block,
+    http_provider,
+    candidate_source='trace_filter',
+    block_range=10000,
+    batch_size=100,
+    max_in_flight=1,
+    errors=None):
+    '''
+        get_activity_transactions_from_contract_addresses searches the blocks from_block to to_block for activity
+        transactions sent to one of contract_addresses (the process instance contracts), without downloading the
+        blocks. First, the candidate transactions are narrowed down with address filtered queries, then only the
+        candidates are retrieved (see get_activity_transactions_from_transaction_hashes).
+
+        The candidates are found with one of the following sources:
+            trace_filter: The trace_filter method of OpenEthereum/Erigon style nodes returns the calls to the
+                contracts. Only top level calls whose function selector is in activities_dictionary are kept,
+                i.e. even the transactions themselves are only retrieved if they are activity transactions.
+            eth_getLogs: The transactions that emitted an event from one of the contracts. This method is
+                supported by every node, but misses activity transactions that do not emit an event.
+
+        Arguments:
+            activities_dictionary (dictionary): A dictionary where the keys are function selectors (see above).
+            contract_addresses (list): The addresses of the contracts, e.g. from
+                get_contract_addresses_created_by_factory.
+            from_block (int): The first block of the range.
+            to_block (int): The last block of the range.
+            http_provider (w3 object): A w3 object that has established a connection to a blockchain node.
+            candidate_source (string): Either trace_filter or eth_getLogs.
+            block_range (int): The number of blocks that are covered by one filter query.
+            batch_size (int): The number of calls that are sent in one HTTP request.
+            max_in_flight (int): The maximum number of batches that are in flight at the same time.
+            errors (list): If a list is given, failed calls are appended as (parameter, JsonRpcError)
+                tuples. Otherwise, the first error is raised.
+
+        Returns:
+            activity_transactions (list): The activity_transactions ordered by block number and position in
+                the block (see get_activity_transactions_from_transaction_hashes).
+    '''
+    addresses = [address.lower() for address in contract_addresses]
+    match = create_matcher(activities_dictionary)
+    address_filters = [
+        {'fromBlock': hex(start), 'toBlock': hex(min(start + block_range - 1, to_block))}
+        for start in range(from_block, to_block + 1, block_range)]
+
+    if candidate_source == 'trace_filter':
+        for address_filter in address_filters:
+            address_filter['toAddress'] = addresses
+        candidates = [
+            (trace['blockNumber'], trace['transactionPosition'], trace['transactionHash'])
+            for trace in _filter_addresses('trace_filter', address_filters, http_provider, batch_size,
+                                           max_in_flight, errors)
+            if trace['type'] == 'call' and not trace['traceAddress']
+            and match(trace['action']['input'])]
+    elif candidate_source == 'eth_getLogs':
+        for address_filter in address_filters:
+            address_filter['address'] = addresses
+        candidates = [
+            (int(log['blockNumber'], 16), int(log['transactionIndex'], 16), log['transactionHash'])
+            for log in _filter_addresses('eth_getLogs', address_filters, http_provider, batch_size,
+                                         max_in_flight, errors)
+            if not log.get('removed')]
+    else:
+        raise ValueError(f'Unknown candidate source {candidate_source}.')
+
+    transaction_hashes = [transaction_hash for _, _, transaction_hash in sorted(set(candidates))]
+    return get_activity_transactions_from_transaction_hashes(
+        activities_dictionary, transaction_hashes, http_provider,
+        batch_size=batch_size, max_in_flight=max_in_flight, errors=errors)
+
+
+def get_contract_addresses_created_by_factory(factory_address, from_block, to_block, http_provider, block_range=10000):
+    '''
+        get_contract_addresses_created_by_factory returns the addresses of the contracts that factory_address
+        created between from_block and to_block, e.g. the process instance contracts of a process engine.
+        It requires a node that supports trace_filter.
+
+        Arguments:
+            factory_address (string): The address of the factory contract.
+            from_block (int): The first block of the range.
+            to_block (int): The last block of the range.
+            http_provider (w3 object): A w3 object that has established a connection to a blockchain node.
+            block_range (int): The number of blocks that are covered by one filter query.
+
+        Returns:
+            A list of checksummed contract addresses in the order of their creation.
+    '''
+    from web3 import Web3
+
+    address_filters = [
+        {'fromBlock': hex(start), 'toBlock': hex(min(start + block_range - 1, to_block)),
+         'fromAddress': [factory_address.lower()]}
+        for start in range(from_block, to_block + 1, block_range)]
+
+    return [
+        Web3.toChecksumAddress(trace['result']['address'])
+        for trace in _filter_addresses('trace_filter', address_filters, http_provider, batch_size=100,
+                                       max_in_flight=1, errors=None)
+        if trace['type'] == 'create' and trace.get('result')]
+
+
+def _filter_addresses(method, address_filters, http_provider, batch_size, max_in_flight, errors):
+    rpc_client = create_rpc_batch_client(http_provider, batch_size)
+    results = _batch_map_in_order(
+        lambda filters: rpc_client.batch_call(method, [[address_filter] for address_filter in filters]),
+        address_filters, batch_size, max_in_flight)
+
+    for address_filter, result in zip(address_filters, results):
+        if isinstance(result, Exception):
+            if errors is None:
+                raise result
+            errors.append((address_filter, result))
+            continue
+        yield from result or []
+
+
+def _batch_map_in_order(function, items, batch_size, max_in_flight):
+    batches = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+    return chain.from_iterable(map_in_order(function, batches, max_in_flight=max_in_flight))
+
+
+BlockFetchPlan = namedtuple('BlockFetchPlan', ['block_numbers', 'requested', 'saved_fetches'])
+
+
+def plan_block_fetches(block_numbers):
+    '''
+        plan_block_fetches removes duplicates from block_numbers and sorts them, so that every block is
+        retrieved exactly once, e.g. when several activity transactions of the Etherscan exports share a block.
+
+        Argument:
+            block_numbers (iterable): The block numbers that should be retrieved.
+
+        Returns:
+            A BlockFetchPlan with the sorted distinct block_numbers, the number of requested block numbers,
+            and the number of fetches that are saved.
+
+        Example:
+            >> plan_block_fetches([1196607, 1196605, 1196607])
+            BlockFetchPlan(block_numbers=[1196605, 1196607], requested=3, saved_fetches=1)
+    '''
+    block_numbers = [int(block_number) for block_number in block_numbers]
+    distinct_block_numbers = sorted(set(block_numbers))
+
+    return BlockFetchPlan(
+        block_numbers=distinct_block_numbers,
+        requested=len(block_numbers),
+        saved_fetches=len(block_numbers) - len(distinct_block_numbers))
+
+
+def iter_blocks(block_numbers, http_provider, max_in_flight=1, batch_size=None, errors=None, block_cache=None):
+    '''
+        iter_blocks retrieves the given blocks with full transactions and yields them in the order of
+        block_numbers. See get_activity_transactions_from_block_numbers for the arguments.
+
+        Returns:
+            A generator over (block_number, block) tuples.
+    '''
+    block_numbers = list(block_numbers)
+
+    if block_cache is None:
+        yield from _iter_blocks_from_node(block_numbers, http_provider, max_in_flight, batch_size, errors)
+        return
+
+    cached_block_numbers = block_cache.cached_block_numbers(block_numbers)
+    missing_block_numbers = [
+        block_number for block_number in block_numbers if block_number not in cached_block_numbers]
+
+    head_block_number = http_provider.eth.blockNumber if missing_block_numbers else None
+    missing_blocks = _iter_blocks_from_node(missing_block_numbers, http_provider, max_in_flight, batch_size, errors)
+
+    def cached_blocks_until(stop_position):
+        for block_number in block_numbers[position:stop_position]:
+            if block_number not in cached_block_numbers:
+                # The block could not be retrieved from the node (see errors).
+                continue
+            block = block_cache.get(block_number)
+            if block is None:
+                # The block was evicted since cached_block_numbers was called.
+                for _, block in _iter_blocks_from_node([block_number], http_provider, errors=errors):
+                    yield block_number, block
+                continue
+            yield block_number, block
+
+    position = 0
+    for block_number, block in missing_blocks:
+        stop_position = block_numbers.index(block_number, position)
+        yield from cached_blocks_until(stop_position)
+        block_cache.put(block, head_block_number)
+        yield block_number, block
+        position = stop_position + 1
+
+    yield from cached_blocks_until(len(block_numbers))
+
+
+def _iter_blocks_from_node(block_numbers, http_provider, max_in_flight=1, batch_size=None, errors=None):
+    if batch_size:
+        rpc_client = create_rpc_batch_client(http_provider, batch_size)
+        blocks = _batch_map_in_order(rpc_client.get_blocks_by_number, block_numbers, batch_size, max_in_flight)
+    else:
+        blocks = map_in_order(
+            lambda block_number: _get_block_or_exception(http_provider, block_number),
+            block_numbers,
+            max_in_flight=max_in_flight)
+
+    for block_number, block in zip(block_numbers, blocks):
+        if isinstance(block, Exception):
+            if errors is None:
+                raise block
+            errors.append((block_number, block))
+            continue
+
+        yield block_number, block
+
+
+def _get_block_or_exception(http_provider, block_number):
+    instrumentation.count('rpc_calls')
+    if getattr(http_provider.provider, 'rpc_client', None) is None:
+        # Requests of an RpcClientProvider are counted by its RpcClient.
+        instrumentation.count('rpc_requests')
+    try:
+        return http_provider.eth.getBlock(block_number, full_transactions=True)
+    except Exception as exception:
+        return exception
+
+
+def map_in_order(function, items, max_in_flight=1):
+    '''
+        map_in_order applies function to every item and yields the results in the order of items.
+        At most max_in_flight calls run at the same time in a thread pool, and at most max_in_flight
+        results are buffered, i.e. the memory stays bounded for arbitrarily long sequences of items.
+
+        Arguments:
+            function (callable): A function that takes one item, e.g. a block number.
+            items (iterable): The items function is applied to.
+            max_in_flight (int): The maximum number of concurrent calls. 1 calls function sequentially.
+
+        Returns:
+            A generator over the results of function.
+
+        Example:
+            >> list(map_in_order(lambda block_number: block_number * 2, [3, 1, 2], max_in_flight=2))
+            [6, 2, 4]
+    '''
+    if max_in_flight <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        in_flight = deque()
+        for item in items:
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+            in_flight.append(executor.submit(function, item))
+
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+@instrumentation.staged('create_log_dictionary')
 def create_log_dictionary_from_activity_transactions(activity_transactions, activities_dictionary):
     '''
 
@@ -203,47 +787,119 @@ def create_log_dictionary_from_activity_transactions(activity_transactions, acti
             A dictionary where the keys are the trace ids and the value is a list. The list is a sequence of dictionaries that describe an activity.
     '''
     log_dic = {}
+    activities = []
 
     for activity_transaction in activity_transactions:
-        trace_id = "i" + activity_transaction["transaction"]["to"]
-        function_selector = activity_transaction["transaction"]["input"][:10]
-
-        activity = activities_dictionary[function_selector]
-        activity_name = activity["activity_name"]
-        activity_name_resource = activity["resource"]
-
-        activity_instance_id = activity_transaction["transaction"]["hash"].hex()
-        activity_instance_id_time_stamp = activity_transaction["block"]["timestamp"]
-        activity_instance_id_block_no = activity_transaction["transaction"]["blockNumber"]
-        activity_instance_id_from = activity_transaction["transaction"]["from"]
-        activity_instance_id_txh_gas = activity_transaction["transaction"]["gas"]
-        activity_instance_id_txh_gas_price = activity_transaction["transaction"]["gasPrice"]
-        activity_instance_id_transaction_data = activity_transaction["transaction"]["input"]
-
-        activity = {}
-        activity["id"] = function_selector
-        activity["name"] = activity_name
-        activity["name_resource"] = activity_name_resource
-        activity["instance_id"] = "i" + activity_instance_id
-        activity["instance_id_time_stamp"] = datetime.fromtimestamp(activity_instance_id_time_stamp)
-        activity["instance_id_block_no"] = activity_instance_id_block_no
-        activity["instance_id_from"] = activity_instance_id_from
-        activity["instance_id_txh_gas"] = activity_instance_id_txh_gas
-        activity["instance_id_txh_gas_price"] = activity_instance_id_txh_gas_price
-        activity["instance_id_transaction_data"] = activity_instance_id_transaction_data
+        trace_id, activity = create_activity_from_activity_transaction(
+            activity_transaction, activities_dictionary, decode_arguments=False)
 
         if trace_id not in log_dic:
             log_dic[trace_id] = []
 
         log_dic[trace_id].append(activity)
+        activities.append(activity)
 
+    add_decoded_arguments(activities, activities_dictionary)
     return log_dic
 
 
+def add_decoded_arguments(activities, activities_dictionary):
+    '''
+        add_decoded_arguments adds the decoded call arguments to activities, if activities_dictionary is a
+        SelectorRegistry. The inputs are decoded in batches (see SelectorRegistry.decode_arguments_batch).
+
+        Returns:
+            activities.
+    '''
+    if isinstance(activities_dictionary, SelectorRegistry):
+        decoded_arguments = activities_dictionary.decode_arguments_batch(
+            activity["instance_id_transaction_data"] for activity in activities)
+        for activity, arguments in zip(activities, decoded_arguments):
+            activity["arguments"] = arguments
+    return activities
+
+
+def create_activity_from_activity_transaction(activity_transaction, activities_dictionary, decode_arguments=True):
+    '''
+        create_activity_from_activity_transaction creates the dictionary that describes the activity of
+        one activity transaction (see create_log_dictionary_from_activity_transactions).
+
+        Arguments:
+            activity_transaction (dictionary): A dictionary with the keys block and transaction, and optionally
+                receipt. With a receipt, the activity also contains the gas used, the cost, and whether it failed.
+            activities_dictionary (dictionary): A dictionary where the keys are function selectors (see above).
+                If it is a SelectorRegistry, the activity also contains the decoded call arguments.
+            decode_arguments (bool): Whether the call arguments are decoded. False leaves them to
+                add_decoded_arguments, which decodes many activities in batches.
+
+        Returns:
+            A tuple of the trace id, i.e. "i" followed by the address of the process instance contract,
+            and the activity.
+    '''
+    trace_id = "i" + activity_transaction["transaction"]["to"]
+    function_selector = activity_transaction["transaction"]["input"][:10]
+
+    activity = activities_dictionary[function_selector]
+    activity_name = activity["activity_name"]
+    activity_name_resource = activity["resource"]
+
+    activity_instance_id = activity_transaction["transaction"]["hash"].hex()
+    activity_instance_id_time_stamp = activity_transaction["block"]["timestamp"]
+    activity_instance_id_block_no = activity_transaction["transaction"]["blockNumber"]
+    activity_instance_id_from = activity_transaction["transaction"]["from"]
+    activity_instance_id_txh_gas = activity_transaction["transaction"]["gas"]
+    activity_instance_id_txh_gas_price = activity_transaction["transaction"]["gasPrice"]
+    activity_instance_id_transaction_data = activity_transaction["transaction"]["input"]
+
+    activity = {}
+    activity["id"] = function_selector
+    activity["name"] = activity_name
+    activity["name_resource"] = activity_name_resource
+    activity["instance_id"] = "i" + activity_instance_id
+    activity["instance_id_time_stamp"] = datetime.fromtimestamp(activity_instance_id_time_stamp)
+    activity["instance_id_block_no"] = activity_instance_id_block_no
+    activity["instance_id_from"] = activity_instance_id_from
+    activity["instance_id_txh_gas"] = activity_instance_id_txh_gas
+    activity["instance_id_txh_gas_price"] = activity_instance_id_txh_gas_price
+    activity["instance_id_transaction_data"] = activity_instance_id_transaction_data
+
+    if "receipt" in activity_transaction:
+        # The gas that was actually used, its cost in wei, and whether the call failed.
+        receipt = activity_transaction["receipt"]
+        gas_price = receipt.get("effectiveGasPrice") or activity_instance_id_txh_gas_price
+        activity["instance_id_gas_used"] = receipt["gasUsed"]
+        activity["instance_id_cost"] = receipt["gasUsed"] * gas_price
+        activity["instance_id_reverted"] = is_reverted(activity_transaction)
+
+    if decode_arguments and isinstance(activities_dictionary, SelectorRegistry):
+        # The call arguments as (key, XES type, value) tuples.
+        activity["arguments"] = activities_dictionary.decode_arguments(activity_instance_id_transaction_data)
+
+    return trace_id, activity
+
+
+def activity_to_json(activity):
+    '''
+        activity_to_json returns a copy of activity that can be serialized as JSON, i.e. the timestamp is
+        a POSIX timestamp instead of a datetime. activity_from_json reverses it.
+    '''
+    activity = dict(activity)
+    activity["instance_id_time_stamp"] = activity["instance_id_time_stamp"].timestamp()
+    return activity
+
+
+def activity_from_json(activity):
+    activity["instance_id_time_stamp"] = datetime.fromtimestamp(activity["instance_id_time_stamp"])
+    return activity
+
+
+@instrumentation.staged('sort_log_dic_by_time')
 def sort_log_dic_by_time(log_dic):
     '''
         sort_log_dic_by_time sorts the log dictionary by time. Specifically, it uses the key
-        instance_id_time_stamp created by create_log_dictionary_from_activity_transactions (see above).
+        instance_id_time_stamp created by create_log_dictionary_from_activity_transactions (see above), and
+        the block number for activities within the same second. For a complete chain order, see
+        event_store.sort_event_store.
 
         Argument:
             log_dic (dictionary): A dictionary as it is created by
@@ -254,10 +910,11 @@ def sort_log_dic_by_time(log_dic):
     '''
     for process_instance, process_instance_activities in log_dic.items():
         log_dic[process_instance] = sorted(
-            process_instance_activities, key=lambda k: k["instance_id_time_stamp"])
+            process_instance_activities, key=lambda k: (k["instance_id_time_stamp"], k["instance_id_block_no"]))
     return log_dic
 
 
+@instrumentation.staged('create_xes_log')
 def create_xes_log_from_log_dic(log_dic, process_name="Incident Management Process"):
     '''
         create_xes_log_from_log_dic creates and returns a XES log of type <class 'opyenxes.model.XLog.XLog'> from log_dic.
@@ -270,6 +927,15 @@ def create_xes_log_from_log_dic(log_dic, process_name="Incident Management Proce
         Returns:
             A log object of type <class 'opyenxes.model.XLog.XLog'>.
     '''
+    from opyenxes.factory.XFactory import XFactory
+    from opyenxes.extension.XExtensionManager import XExtensionManager
+    from opyenxes.extension.std.XConceptExtension import XConceptExtension
+    from opyenxes.extension.std.XTimeExtension import XTimeExtension
+    from opyenxes.extension.std.XOrganizationalExtension import XOrganizationalExtension
+    from opyenxes.extension.std.XLifecycleExtension import XLifecycleExtension
+    from opyenxes.extension.std.XCostExtension import XCostExtension
+    from opyenxes.extension.std.XIdentityExtension import XIdentityExtension
+
     concept_name = XConceptExtension()
     time_extension = XTimeExtension()
     organizational_extension = XOrganizationalExtension()
@@ -322,8 +988,9 @@ def create_xes_log_from_log_dic(log_dic, process_name="Incident Management Proce
             # Organisation attribute
             organizational_extension.assign_resource(event=event, instance=activity["name_resource"])
 
-            # State of the activity
-            lifecycle_extension.assign_transition(event=event, transition="complete")
+            # State of the activity, a failed call is aborted
+            lifecycle_extension.assign_transition(
+                event=event, transition="ate_abort" if activity.get("instance_id_reverted") else "complete")
 
 
             # Block number
@@ -338,6 +1005,30 @@ def create_xes_log_from_log_dic(log_dic, process_name="Incident Management Proce
             activity_instance_id_transaction_data = XFactory.create_attribute_literal("transactionData", activity["instance_id_transaction_data"])
             event.get_attributes()["transactionData"] =  activity_instance_id_transaction_data
 
+            # Gas used and cost in ether, if the activity transactions had receipts
+            if "instance_id_gas_used" in activity:
+                activity_instance_id_gas_used = XFactory.create_attribute_discrete("gasUsed", activity["instance_id_gas_used"])
+                event.get_attributes()["gasUsed"] = activity_instance_id_gas_used
+                # Not assign_total, because it skips a total of zero, e.g. of a transaction with a gas price of zero
+                cost_total = XFactory.create_attribute_continuous("cost:total", activity["instance_id_cost"] / 10 ** 18,
+                                                                  cost_extension)
+                event.get_attributes()["cost:total"] = cost_total
+                # Not assign_currency, because it stores the currency under concept:name
+                cost_currency = XFactory.create_attribute_literal("cost:currency", "ETH", cost_extension)
+                event.get_attributes()["cost:currency"] = cost_currency
+
+            # Call arguments, if the log dictionary was created with a SelectorRegistry
+            for key, attribute_type, value in activity.get("arguments", ()):
+                if attribute_type == "int":
+                    attribute = XFactory.create_attribute_discrete(key, value)
+                elif attribute_type == "float":
+                    attribute = XFactory.create_attribute_continuous(key, value)
+                elif attribute_type == "boolean":
+                    attribute = XFactory.create_attribute_boolean(key, value)
+                else:
+                    attribute = XFactory.create_attribute_literal(key, value)
+                event.get_attributes()[key] = attribute
+
 
             trace.append(event)
 
@@ -346,6 +1037,7 @@ def create_xes_log_from_log_dic(log_dic, process_name="Incident Management Proce
     return log_xes
 
 
+@instrumentation.staged('write_xes_log')
 def write_xes_log_to_disc(log_xes, path='./', file_name='automatic_incident_management'):
     '''
         write_xes_log_to_disc writes the xes_log dictionary to a file in XES format.
@@ -355,20 +1047,91 @@ def write_xes_log_to_disc(log_xes, path='./', file_name='automatic_incident_mana
             path (string): The path to the storing location.
             file_name (string): The file name of thex .xes file.
     '''
+    from opyenxes.data_out.XesXmlSerializer import XesXmlSerializer
+
     with open(f'{path}{file_name}.xes', "w") as file:
         XesXmlSerializer().serialize(log_xes, file)
+    instrumentation.count('events_serialized', sum(len(trace) for trace in log_xes))
 
 
-def load_activity_transactions_from_pickle(path='activity_transactions.pickle'):
+def load_activity_transactions_from_pickle(path='activity_transactions.pickle', web3_types=True):
     '''
         load_activity_transactions_from_pickle loads the list activity_transactions from the pickle file specified in path.
 
         Argument:
             path (string): The path to the directory of the pickle file to be loaded.
+            web3_types (bool): Whether the blocks and transactions are loaded as web3 AttributeDicts. Otherwise,
+                they are loaded as dictionaries that also allow attribute access, which does not import web3,
+                e.g. to build a log offline.
 
         Returns:
             A list of activity_transactions.
     '''
     with open(file=path, mode='rb') as handle:
-        activity_transactions = pickle.load(handle)
+        if web3_types:
+            activity_transactions = pickle.load(handle)
+        else:
+            activity_transactions = _Web3FreeUnpickler(handle).load()
     return activity_transactions
+
+
+def save_activity_transactions_to_pickle(activity_transactions, path='activity_transactions.pickle'):
+    '''
+        save_activity_transactions_to_pickle stores the list activity_transactions in the pickle file path
+        (see load_activity_transactions_from_pickle).
+    '''
+    with open(file=path, mode='wb') as handle:
+        pickle.dump(activity_transactions, handle)
+
+
+class PickledAttributeDict(dict):
+    '''
+        PickledAttributeDict replaces web3.datastructures.AttributeDict when activity transactions are loaded
+        with web3_types=False (see load_activity_transactions_from_pickle).
+    '''
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setstate__(self, state):
+        self.update(state)
+
+
+class _Web3FreeUnpickler(pickle.Unpickler):
+
+    def find_class(self, module, name):
+        if module == 'web3.datastructures' and name == 'AttributeDict':
+            return PickledAttributeDict
+        return super().find_class(module, name)
+
+
+def write_log_dic_to_json_lines(log_dic, path='automatic_incident_management.jsonl.gz'):
+    '''
+        write_log_dic_to_json_lines writes log_dic with one [trace id, activity] JSON array per line, i.e. in
+        the format of the partial logs of sharding.run_shard_job. Files ending with .gz are compressed with gzip.
+        The file is read back with load_log_dic_from_json_lines much faster than the activity transactions are
+        processed again.
+    '''
+    with (gzip.open(path, 'wt') if path.endswith('.gz') else open(path, 'w')) as file:
+        for trace_id, activities in log_dic.items():
+            for activity in activities:
+                file.write(json.dumps([trace_id, activity_to_json(activity)]) + "\n")
+
+
+def load_log_dic_from_json_lines(path='automatic_incident_management.jsonl.gz'):
+    '''
+        load_log_dic_from_json_lines reads a log dictionary written by write_log_dic_to_json_lines. The traces
+        and their activities keep the order of the file.
+
+        Returns:
+            A dictionary where the keys are the trace ids and the value is a list of activities.
+    '''
+    log_dic = {}
+    with (gzip.open(path, 'rt') if path.endswith('.gz') else open(path)) as file:
+        for line in file:
+            trace_id, activity = json.loads(line)
+            log_dic.setdefault(trace_id, []).append(activity_from_json(activity))
+    return log_dic
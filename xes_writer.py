@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+from xml.sax.saxutils import escape
+
+from . import instrumentation
+
+
+XES_EXTENSIONS = [
+    ("Cost", "cost", "http://www.xes-standard.org/cost.xesext"),
+    ("Identity", "identity", "http://www.xes-standard.org/identity.xesext"),
+    ("Lifecycle", "lifecycle", "http://www.xes-standard.org/lifecycle.xesext"),
+    ("Time", "time", "http://www.xes-standard.org/time.xesext"),
+    ("Organizational", "org", "http://www.xes-standard.org/org.xesext"),
+    ("Concept", "concept", "http://www.xes-standard.org/concept.xesext"),
+]
+
+XES_HEADER = (
+    '<?xml version="1.0" ?>\n'
+    '<!--This file has been generated with the OpenXES library. It conforms-->\n'
+    '<!--to the XML serialization of the XES standard for log storage and-->\n'
+    '<!--management.-->\n'
+    '<!--XES standard version: 1.0-->\n'
+    '<!--OpenXES library version: 1.0RC7-->\n'
+    '<!--OpenXES is available from http://www.openxes.org/-->\n'
+    '<log xes.version="1.0" xes.features="nested-attributes" openxes.version="1.0RC7">\n'
+)
+
+_ATTRIBUTE_ENTITIES = {'"': "&quot;"}
+
+
+class XesWriter(object):
+    '''
+        XesWriter writes a XES log directly from the activities of create_log_dictionary_from_activity_transactions,
+        without building the opyenxes object model. The output has the same schema (extensions, attributes,
+        and layout) as create_xes_log_from_log_dic serialized with write_xes_log_to_disc, but the traces are
+        written one after the other, i.e. the writer can also be fed from a stream of traces.
+
+        Example:
+            >> with open_xes_file('log.xes.gz') as file, XesWriter(file) as writer:
+            ..     for trace_id, activities in log_dic.items():
+            ..         writer.write_trace(trace_id, activities)
+    '''
+
+    def __init__(self, file, process_name="Incident Management Process"):
+        '''
+            Arguments:
+                file (file object): A file opened for writing text, e.g. with open_xes_file.
+                process_name (string): The name of the process.
+        '''
+        self.file = file
+        self.process_name = process_name
+        self.traces = 0
+        self.events = 0
+
+    def __enter__(self):
+        self.write_header()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write_header(self):
+        lines = [XES_HEADER]
+        for name, prefix, uri in XES_EXTENSIONS:
+            lines.append(f'\t<extension name="{name}" prefix="{prefix}" uri="{uri}"/>\n')
+        lines.append(f'\t<string key="concept:name" value="{_escape(self.process_name)}"/>\n')
+        lines.append('\t<string key="lifecycle:model" value="standard"/>\n')
+        self.file.write("".join(lines))
+
+    def write_trace(self, trace_id, activities):
+        '''
+            Writes one trace.
+
+            Arguments:
+                trace_id (string): The trace id, i.e. a key of log_dic.
+                activities (list): The activities of the trace, i.e. a value of log_dic.
+        '''
+        trace_id = _escape(trace_id)
+        lines = [
+            '\t<trace>\n',
+            f'\t\t<string key="concept:name" value="{trace_id}"/>\n',
+            f'\t\t<string key="id" value="{trace_id}"/>\n']
+
+        for activity in activities:
+            lines.append(
+                '\t\t<event>\n'
+                f'\t\t\t<string key="id" value="{_escape(activity["instance_id"])}"/>\n'
+                f'\t\t\t<string key="activity_id" value="{_escape(activity["id"])}"/>\n'
+                f'\t\t\t<string key="concept:name" value="{_escape(activity["name"])}"/>\n'
+                f'\t\t\t<date key="time:timestamp" value="{format_timestamp(activity["instance_id_time_stamp"])}"/>\n'
+                f'\t\t\t<string key="org:resource" value="{_escape(activity["name_resource"])}"/>\n'
+                f'\t\t\t<string key="lifecycle:transition" value="{_lifecycle_transition(activity)}"/>\n'
+                f'\t\t\t<int key="blockNo" value="{int(activity["instance_id_block_no"])}"/>\n'
+                f'\t\t\t<string key="from" value="{_escape(activity["instance_id_from"])}"/>\n'
+                f'\t\t\t<string key="transactionData" value="{_escape(activity["instance_id_transaction_data"])}"/>\n')
+            if "instance_id_gas_used" in activity:
+                lines.append(f'\t\t\t<int key="gasUsed" value="{int(activity["instance_id_gas_used"])}"/>\n')
+                lines.append(f'\t\t\t<float key="cost:total" value="{activity["instance_id_cost"] / 10 ** 18}"/>\n')
+                lines.append('\t\t\t<string key="cost:currency" value="ETH"/>\n')
+            for key, attribute_type, value in activity.get("arguments", ()):
+                lines.append(
+                    f'\t\t\t<{attribute_type} key="{_escape(key)}" value="{_format_attribute_value(attribute_type, value)}"/>\n')
+            lines.append('\t\t</event>\n')
+
+        lines.append('\t</trace>\n')
+        self.file.write("".join(lines))
+        self.traces += 1
+        self.events += len(activities)
+        instrumentation.count('events_serialized', len(activities))
+
+    def write_log_dic(self, log_dic):
+        for trace_id, activities in log_dic.items():
+            self.write_trace(trace_id, activities)
+
+    def close(self):
+        self.file.write('</log>\n')
+        self.file.flush()
+
+
+def format_timestamp(time_stamp):
+    '''
+        format_timestamp formats a datetime like opyenxes formats a time:timestamp attribute, e.g.
+        2016-03-22T13:06:22.000Z for a naive datetime.
+    '''
+    if time_stamp.tzinfo is None:
+        time_zone = "Z"
+    else:
+        time_zone = time_stamp.tzname().replace("UTC", "").replace("+00:00", "Z").replace("-00:00", "Z")
+    return (f"{time_stamp.year:04}-{time_stamp.month:02}-{time_stamp.day:02}T{time_stamp.hour:02}:"
+            f"{time_stamp.minute:02}:{time_stamp.second:02}.{time_stamp.microsecond // 1000:03}{time_zone}")
+
+
+def open_xes_file(file_path):
+    '''
+        open_xes_file opens file_path for writing text. Files ending with .gz are compressed with gzip.
+    '''
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'wt')
+    return open(file_path, 'w')
+
+
+def write_xes_log_from_log_dic(
+    log_dic,
+    path='./',
+    file_name='automatic_incident_management',
+    process_name="Incident Management Process",
+    compress=False):
+    '''
+        write_xes_log_from_log_dic is the fast equivalent of create_xes_log_from_log_dic followed by
+        write_xes_log_to_disc.
+
+        Arguments:
+            log_dic (dictionary): A dictionary as it is created by create_log_dictionary_from_activity_transactions.
+            path (string): The path to the storing location.
+            file_name (string): The file name of the .xes file.
+            process_name (string): The name of the process.
+            compress (bool): Whether the file is compressed with gzip, i.e. written as .xes.gz.
+
+        Returns:
+            The path of the written file.
+    '''
+    file_path = f'{path}{file_name}.xes' + ('.gz' if compress else '')
+    with open_xes_file(file_path) as file, XesWriter(file, process_name) as writer:
+        writer.write_log_dic(log_dic)
+    return file_path
+
+
+def _lifecycle_transition(activity):
+    return "ate_abort" if activity.get("instance_id_reverted") else "complete"
+
+
+def _format_attribute_value(attribute_type, value):
+    if attribute_type == "boolean":
+        return "true" if value else "false"
+    return _escape(value)
+
+
+def _escape(value):
+    return escape(str(value), _ATTRIBUTE_ENTITIES)